@@ -0,0 +1,391 @@
+"""
+Микробенчмарки разбора ответов API и записи CSV.
+
+Меряются функции, через которые проходит каждый отель каждого прогона:
+
+    tvil_columns.hotel_row                            - строка ТВИЛ для офлайн-конвертера и живого обхода
+    TvilHotelsParser._extract_hotels_from_response    - разбор страницы живого обхода ТВИЛ (по 20 отелей)
+    OstrovokRoomsParser.extract_room_data             - тарифы Ostrovok
+    yandex_json_to_csv.extract_hotel_info             - выдача Яндекса
+    csv.*                                             - запись строк в CSV с настройками писателя каждого модуля
+
+Входные данные синтезируются из реальных форм ответов (выгрузки в репозитории,
+те же, что отдаёт common/standin_server.py) и размножаются до 10k / 100k / 1M
+отелей. Отели генерируются пачками по --chunk, генерация в замер не входит.
+
+По каждой функции и размеру печатаются пропускная способность, память,
+удерживаемая результатом (байты и блоки на отель, по tracemalloc и
+sys.getallocatedblocks), и пик памяти на пачку. Результаты пишутся в JSON
+(benchmarks/results/), а --compare сравнивает с прошлым файлом и отмечает
+просадки:
+
+    python benchmarks/bench_extractors.py --sizes 10000 100000
+    python benchmarks/bench_extractors.py --compare benchmarks/results/extractors_<...>.json
+"""
+import argparse
+import csv
+import gc
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from itertools import islice
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/;
+# каталоги парсеров - чтобы их модули импортировались так же, как при запуске скриптов
+sys.path.insert(0, str(REPO_ROOT))
+for parser_dir in ("tvil_parser", "yandex_parser", "ostrovok_parser_refactoring"):
+    sys.path.insert(1, str(REPO_ROOT / parser_dir))
+
+from common.standin_server import build_ostrovok_hotels, build_tvil_entities, build_yandex_hotels
+import tvil_columns
+import tvil_json_to_csv
+import yandex_json_to_csv
+from ostrovok_rooms import OstrovokRoomsParser
+from tvil_hotels import TvilHotelsParser
+
+# Настройка stdout для корректного вывода Юникода
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+DEFAULT_CHUNK = 10_000
+# Память меряется под tracemalloc, который замедляет код в разы, поэтому только на начале прогона
+DEFAULT_MEMORY_RECORDS = 50_000
+# Во сколько раз упавшая пропускная способность считается просадкой при --compare
+REGRESSION_THRESHOLD = 0.9
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+TVIL_PAGE_LIMIT = 20
+
+
+# --- Генераторы входных данных ---
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def tvil_entities(count):
+    """Сущности ТВИЛ по образцу выгрузки, у каждой свой id; атрибуты общие с образцом"""
+    templates = build_tvil_entities()
+    for index in range(count):
+        template = templates[index % len(templates)]
+        yield {"id": str(9000000 + index), "type": template["type"], "attributes": template["attributes"]}
+
+
+def tvil_pages(count):
+    """Ответы /api/entities по TVIL_PAGE_LIMIT сущностей"""
+    for offset, entities in enumerate(_batched(tvil_entities(count), TVIL_PAGE_LIMIT)):
+        yield {"data": entities, "meta": {"total": count, "offset": offset * TVIL_PAGE_LIMIT}}
+
+
+def ostrovok_responses(count):
+    """Ответы hp/search по образцу hotels_rooms.csv, у каждого свой ota_hotel_id"""
+    templates = list(build_ostrovok_hotels().values())
+    for index in range(count):
+        yield dict(templates[index % len(templates)], ota_hotel_id=f"bench_hotel_{index}")
+
+
+def yandex_hotels(count):
+    """Элементы data.hotels выдачи Яндекса по образцу сохранённых страниц, у каждого свой permalink"""
+    templates = build_yandex_hotels()
+    for index in range(count):
+        template = templates[index % len(templates)]
+        yield dict(template, hotel=dict(template["hotel"], permalink=str(900000000000 + index)))
+
+
+# --- Замеряемые случаи ---
+
+class Case:
+    """
+    Замеряемая функция: inputs(size) даёт по одной единице входа на отель
+    (для постраничных ответов - на страницу), prepare готовит пачку вне замера,
+    run - то, что меряется.
+    """
+    records_per_input = 1
+
+    def __init__(self, name, inputs, run):
+        self.name = name
+        self.inputs = inputs
+        self._run = run
+
+    def start(self):
+        pass
+
+    def finish(self):
+        pass
+
+    def prepare(self, batch):
+        return batch
+
+    def run(self, batch):
+        return self._run(batch)
+
+    def rows(self, batch, output):
+        return len(output)
+
+
+class TvilPagesCase(Case):
+    records_per_input = TVIL_PAGE_LIMIT
+
+
+class CsvWriterCase(Case):
+    """
+    Запись строк, полученных extract (вне замера), с настройками писателя модуля:
+    словари через csv.DictWriter, кортежи (dict_rows=False) через csv.writer.
+    """
+
+    def __init__(self, name, inputs, extract, fieldnames, encoding="utf-8", per_row=False, dict_rows=True,
+                 **writer_options):
+        super().__init__(name, inputs, None)
+        self.extract = extract
+        self.fieldnames = fieldnames
+        self.encoding = encoding
+        self.per_row = per_row
+        self.dict_rows = dict_rows
+        self.writer_options = writer_options
+        self._tmp_dir = None
+        self._file = None
+        self._writer = None
+
+    def start(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._file = open(Path(self._tmp_dir.name) / "bench.csv", "w", encoding=self.encoding, newline="")
+        if self.dict_rows:
+            self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, **self.writer_options)
+            self._writer.writeheader()
+        else:
+            self._writer = csv.writer(self._file, **self.writer_options)
+            self._writer.writerow(self.fieldnames)
+
+    def finish(self):
+        self._file.close()
+        self._tmp_dir.cleanup()
+
+    def prepare(self, batch):
+        return self.extract(batch)
+
+    def run(self, rows):
+        # Модули, которые пишут построчно, - построчно и здесь
+        if self.per_row:
+            for row in rows:
+                self._writer.writerow(row)
+        else:
+            self._writer.writerows(rows)
+        self._file.flush()
+
+    def rows(self, rows, output):
+        return len(rows)
+
+
+def build_cases():
+    tvil_parser = TvilHotelsParser()
+    ostrovok_parser = OstrovokRoomsParser()
+
+    def tvil_rows(entities):
+        return [tvil_columns.hotel_row(entity) for entity in entities]
+
+    def tvil_crawl(pages):
+        hotels = []
+        for page in pages:
+            hotels.extend(tvil_parser._extract_hotels_from_response(page))
+        return hotels
+
+    def ostrovok_rooms(responses):
+        rooms = []
+        for response in responses:
+            rooms.extend(ostrovok_parser.extract_room_data(response))
+        return rooms
+
+    def yandex_convert(hotels):
+        return [yandex_json_to_csv.extract_hotel_info(hotel) for hotel in hotels]
+
+    return [
+        Case("tvil_columns.hotel_row", tvil_entities, tvil_rows),
+        TvilPagesCase("TvilHotelsParser._extract_hotels_from_response", tvil_pages, tvil_crawl),
+        Case("OstrovokRoomsParser.extract_room_data", ostrovok_responses, ostrovok_rooms),
+        Case("yandex_json_to_csv.extract_hotel_info", yandex_hotels, yandex_convert),
+        CsvWriterCase(
+            "csv.tvil_json_to_csv", tvil_entities, tvil_rows,
+            tvil_json_to_csv.get_csv_columns(), dict_rows=False,
+        ),
+        CsvWriterCase(
+            "csv.TvilHotelsParser", tvil_pages, tvil_crawl, tvil_parser.fieldnames,
+            encoding="utf-8-sig", dict_rows=False, delimiter=",", quoting=csv.QUOTE_MINIMAL,
+        ),
+        CsvWriterCase(
+            "csv.OstrovokRoomsParser", ostrovok_responses, ostrovok_rooms, ostrovok_parser.fieldnames,
+            encoding="utf-8-sig",
+        ),
+        CsvWriterCase(
+            "csv.yandex_json_to_csv", yandex_hotels, yandex_convert, yandex_json_to_csv.FIELDNAMES,
+            per_row=True,
+        ),
+    ]
+
+
+# --- Замер ---
+
+def _input_batches(case, size, chunk):
+    return _batched(case.inputs(size), max(1, chunk // case.records_per_input))
+
+
+def measure_speed(case, size, chunk):
+    """Время run по всем пачкам (без генерации и prepare) и число выданных строк"""
+    seconds = 0.0
+    rows = 0
+    case.start()
+    try:
+        for batch in _input_batches(case, size, chunk):
+            prepared = case.prepare(batch)
+            started_at = time.perf_counter()
+            output = case.run(prepared)
+            seconds += time.perf_counter() - started_at
+            rows += case.rows(prepared, output)
+    finally:
+        case.finish()
+    return seconds, rows
+
+
+def measure_memory(case, size, chunk):
+    """
+    Под tracemalloc на первых size отелях: байты и блоки, которые удерживает
+    результат run, и наибольший пик памяти внутри run на одну пачку.
+    """
+    retained_bytes = 0
+    retained_blocks = 0
+    peak_bytes = 0
+    gc.collect()
+    tracemalloc.start()
+    case.start()
+    try:
+        for batch in _input_batches(case, size, chunk):
+            prepared = case.prepare(batch)
+            tracemalloc.reset_peak()
+            base_bytes = tracemalloc.get_traced_memory()[0]
+            base_blocks = sys.getallocatedblocks()
+            output = case.run(prepared)
+            current_bytes, batch_peak = tracemalloc.get_traced_memory()
+            retained_bytes += current_bytes - base_bytes
+            retained_blocks += sys.getallocatedblocks() - base_blocks
+            peak_bytes = max(peak_bytes, batch_peak - base_bytes)
+            del output, prepared
+    finally:
+        case.finish()
+        tracemalloc.stop()
+    return retained_bytes, retained_blocks, peak_bytes
+
+
+def run_case(case, size, chunk, memory_records, repeat=1):
+    # На общей машине время скачет, поэтому из repeat прогонов берётся лучший
+    seconds, rows = min(measure_speed(case, size, chunk) for _ in range(repeat))
+    memory_sample = min(size, memory_records)
+    retained_bytes, retained_blocks, peak_bytes = measure_memory(case, memory_sample, chunk)
+    return {
+        "case": case.name,
+        "size": size,
+        "rows": rows,
+        "seconds": seconds,
+        "hotels_per_sec": size / seconds if seconds > 0 else None,
+        "memory_sample": memory_sample,
+        "retained_bytes_per_hotel": retained_bytes / memory_sample,
+        "retained_blocks_per_hotel": retained_blocks / memory_sample,
+        "peak_bytes_per_chunk": peak_bytes,
+    }
+
+
+def print_result(result):
+    print(
+        f"{result['case']:<48} {result['size']:>9,} отелей: {result['hotels_per_sec']:>12,.0f} отелей/с, "
+        f"{result['retained_bytes_per_hotel']:>7,.0f} Б и {result['retained_blocks_per_hotel']:>5.1f} блоков на отель, "
+        f"пик {result['peak_bytes_per_chunk'] / 1e6:.1f} МБ на пачку"
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path):
+    """Печатает отношение пропускной способности к прошлому прогону; возвращает число просадок"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(item["case"], item["size"]): item for item in baseline["results"]}
+    print(f"\nСравнение с {baseline_path} (коммит {baseline.get('commit')}):")
+    regressions = 0
+    for result in results:
+        old = previous.get((result["case"], result["size"]))
+        if not old or not old.get("hotels_per_sec") or not result["hotels_per_sec"]:
+            continue
+        ratio = result["hotels_per_sec"] / old["hotels_per_sec"]
+        mark = ""
+        if ratio < REGRESSION_THRESHOLD:
+            mark = "  <- просадка"
+            regressions += 1
+        print(f"{result['case']:<48} {result['size']:>9,}: x{ratio:.2f} по скорости, "
+              f"{result['retained_bytes_per_hotel'] - old['retained_bytes_per_hotel']:+,.0f} Б на отель{mark}")
+    return regressions
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, chunk=DEFAULT_CHUNK, memory_records=DEFAULT_MEMORY_RECORDS,
+                  only=None, output=None, baseline=None, repeat=1):
+    cases = [case for case in build_cases() if not only or any(part in case.name for part in only)]
+    results = []
+    for case in cases:
+        for size in sizes:
+            result = run_case(case, size, chunk, memory_records, repeat)
+            print_result(result)
+            results.append(result)
+
+    commit = git_commit()
+    created_at = datetime.now()
+    if output is None:
+        output = RESULTS_DIR / f"extractors_{created_at:%Y-%m-%dT%H%M%S}_{commit or 'nogit'}.json"
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created_at": created_at.isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "chunk": chunk,
+            "repeat": repeat,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output}")
+
+    if baseline:
+        return compare(results, baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Микробенчмарки разбора ответов и записи CSV")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="Число отелей")
+    parser.add_argument("--chunk", type=int, default=DEFAULT_CHUNK, help="Отелей в пачке")
+    parser.add_argument("--memory-records", type=int, default=DEFAULT_MEMORY_RECORDS,
+                        help="На скольких первых отелях мерить память")
+    parser.add_argument("--repeat", type=int, default=1, help="Прогонов на замер скорости, берётся лучший")
+    parser.add_argument("--only", nargs="+", help="Только случаи, в имени которых есть одна из подстрок")
+    parser.add_argument("--output", help="Файл результатов (по умолчанию benchmarks/results/extractors_<время>_<коммит>.json)")
+    parser.add_argument("--compare", help="Файл результатов прошлого прогона")
+    args = parser.parse_args()
+    regressions = run_benchmark(
+        args.sizes, args.chunk, args.memory_records, args.only, args.output, args.compare, args.repeat
+    )
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1 @@
+"""Общие модули, которые используют парсеры всех источников."""
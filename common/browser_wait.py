@@ -0,0 +1,141 @@
+"""
+Ожидания в браузерных сценариях по конкретным сигналам вместо фиксированных пауз.
+
+Каждое ожидание завершается, как только страница готова (пришёл нужный XHR,
+отрисовалось ожидаемое число карточек, появилась кука антибота, сеть
+затихла), и не дольше таймаута. Фактическая длительность каждого ожидания
+записывается, поэтому задержка на страницу видна в отчёте и ограничена
+сайтом, а не нашими константами.
+"""
+import time
+
+from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+DEFAULT_TIMEOUT_MS = 15000
+
+# Число элементов считается установившимся, если не менялось settle_ms
+STABLE_COUNT_JS = """
+([selector, minCount, expectedCount, settleMs]) => {
+    const count = document.querySelectorAll(selector).length;
+    if (expectedCount && count >= expectedCount) {
+        return true;
+    }
+    const state = window.__stableCount || (window.__stableCount = {});
+    const now = performance.now();
+    if (!state[selector] || state[selector].count !== count) {
+        state[selector] = {count, since: now};
+        return false;
+    }
+    return count >= minCount && now - state[selector].since >= settleMs;
+}
+"""
+
+
+class PageWaiter:
+    def __init__(self, page, timeout=DEFAULT_TIMEOUT_MS):
+        """
+        Args:
+            page: Страница Playwright (sync API)
+            timeout: Таймаут ожидания по умолчанию, миллисекунды
+        """
+        self.page = page
+        self.timeout = timeout
+        self.timings = []
+
+    def _record(self, name, started_at, ok):
+        seconds = time.perf_counter() - started_at
+        self.timings.append({"name": name, "seconds": seconds, "ok": ok})
+        if not ok:
+            print(f"Ожидание {name} не дождалось сигнала за {seconds:.2f} с")
+        return ok
+
+    def for_response(self, name, url_part, action, timeout=None):
+        """
+        Выполняет action() и ждёт завершения XHR, в URL которого есть url_part.
+        Возвращает ответ Playwright или None по таймауту.
+        """
+        started_at = time.perf_counter()
+        try:
+            with self.page.expect_response(
+                lambda response: url_part in response.url,
+                timeout=timeout or self.timeout
+            ) as response_info:
+                action()
+            response = response_info.value
+        except PlaywrightTimeoutError:
+            self._record(name, started_at, False)
+            return None
+        self._record(name, started_at, True)
+        return response
+
+    def for_count(self, name, selector, min_count=1, expected_count=None, settle_ms=300, timeout=None):
+        """
+        Ждёт, пока элементов selector станет expected_count, либо (если их меньше,
+        например на последней странице) пока их число не перестанет меняться.
+        """
+        started_at = time.perf_counter()
+        try:
+            self.page.wait_for_function(
+                STABLE_COUNT_JS,
+                arg=[selector, min_count, expected_count or 0, settle_ms],
+                polling=100,
+                timeout=timeout or self.timeout
+            )
+        except PlaywrightTimeoutError:
+            return self._record(name, started_at, False)
+        return self._record(name, started_at, True)
+
+    def for_cookie(self, name, cookie_names, timeout=None, interval=0.2):
+        """Ждёт появления в контексте страницы любой из кук cookie_names"""
+        cookie_names = set(cookie_names)
+        return self.for_condition(
+            name,
+            lambda: any(cookie["name"] in cookie_names for cookie in self.page.context.cookies()),
+            timeout=timeout,
+            interval=interval
+        )
+
+    def for_network_idle(self, name, timeout=None):
+        """Ждёт, пока у страницы не останется сетевых запросов"""
+        started_at = time.perf_counter()
+        try:
+            self.page.wait_for_load_state("networkidle", timeout=timeout or self.timeout)
+        except PlaywrightTimeoutError:
+            return self._record(name, started_at, False)
+        return self._record(name, started_at, True)
+
+    def for_condition(self, name, predicate, timeout=None, interval=0.5):
+        """Опрашивает predicate() из Python, пока он не вернёт True"""
+        started_at = time.perf_counter()
+        deadline = started_at + (timeout or self.timeout) / 1000
+        while True:
+            try:
+                ready = predicate()
+            except Exception as e:
+                # Например, страница перезагрузилась во время проверки антибота
+                print(f"Ожидание {name}: ошибка проверки условия: {e}")
+                ready = False
+            if ready:
+                return self._record(name, started_at, True)
+            if time.perf_counter() + interval > deadline:
+                return self._record(name, started_at, False)
+            time.sleep(interval)
+
+    def summary(self):
+        """Сводка по ожиданиям: {name: {count, total, max, timeouts}}"""
+        summary = {}
+        for timing in self.timings:
+            item = summary.setdefault(timing["name"], {"count": 0, "total": 0.0, "max": 0.0, "timeouts": 0})
+            item["count"] += 1
+            item["total"] += timing["seconds"]
+            item["max"] = max(item["max"], timing["seconds"])
+            if not timing["ok"]:
+                item["timeouts"] += 1
+        return summary
+
+    def print_summary(self):
+        for name, item in self.summary().items():
+            print(
+                f"Ожидание {name}: {item['count']} раз, в среднем {item['total'] / item['count']:.2f} с, "
+                f"максимум {item['max']:.2f} с, таймаутов {item['timeouts']}"
+            )
@@ -0,0 +1,171 @@
+"""
+Запись и воспроизведение HTTP-обменов парсеров (кассеты).
+
+В режиме record каждый запрос и ответ сохраняются в локальную кассету, в
+режиме replay те же вызовы получают сохранённые ответы без сети, в том же
+порядке. Так разбор и замеры производительности можно гонять за секунды на
+замороженном реальном прогоне. Через кассету идут запросы SharedHttpClient
+(поиск цен Ostrovok, страницы Яндекса) и fetch из страницы ТВИЛ.
+
+Режим включается переменными окружения:
+
+    CASSETTE=record CASSETTE_NAME=irkutsk python yandex_parser/yandex_hotels_parser.py
+    CASSETTE=replay CASSETTE_NAME=irkutsk python yandex_parser/yandex_hotels_parser.py
+
+Кассета адресуется содержимым: файл записи называется хэшем метода, URL и
+тела запроса. Поля тела, которые меняются от запуска к запуску (IGNORED_BODY_FIELDS),
+в хэш не входят. Если один и тот же запрос повторяется (опросы, повторы),
+ответы воспроизводятся в порядке записи, последний - для всех следующих.
+"""
+import atexit
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+import httpx
+
+DEFAULT_CASSETTE_DIR = Path(__file__).resolve().parents[1] / "cassettes"
+
+# Случайные поля тела запроса, не влияющие на ответ
+IGNORED_BODY_FIELDS = {"search_uuid"}
+
+MODES = ("record", "replay")
+
+
+class CassetteMiss(Exception):
+    """В кассете нет ответа на запрос, который пытаются воспроизвести"""
+
+
+class Cassette:
+    def __init__(self, name, mode, directory=None):
+        """
+        Args:
+            name: Имя кассеты (подкаталог)
+            mode: "record" или "replay"
+            directory: Каталог кассет
+        """
+        if mode not in MODES:
+            raise ValueError(f"Неизвестный режим кассеты: {mode}")
+        self.name = name
+        self.mode = mode
+        self.directory = (Path(directory) if directory else DEFAULT_CASSETTE_DIR) / name
+        self.recording = mode == "record"
+        self.replaying = mode == "replay"
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._served = {}
+        self._cleared = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(kind, method, url, body=None):
+        """Хэш запроса: вид обмена, метод, URL и тело без IGNORED_BODY_FIELDS"""
+        if isinstance(body, dict):
+            body = {name: value for name, value in body.items() if name not in IGNORED_BODY_FIELDS}
+        canonical = json.dumps([kind, method.upper(), url, body], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _read(self, key):
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def record(self, kind, method, url, body, response):
+        """Добавляет ответ к записи запроса; первая запись ключа за прогон заменяет старую"""
+        key = self.key_for(kind, method, url, body)
+        with self._lock:
+            entry = None if key not in self._cleared else self._read(key)
+            self._cleared.add(key)
+            if entry is None:
+                entry = {"request": {"kind": kind, "method": method.upper(), "url": url, "body": body}, "responses": []}
+            entry["responses"].append(response)
+
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self.recorded += 1
+
+    def replay(self, kind, method, url, body):
+        """Следующий записанный ответ на запрос; CassetteMiss, если запроса в кассете нет"""
+        key = self.key_for(kind, method, url, body)
+        with self._lock:
+            entry = self._read(key)
+            if entry is None:
+                self.misses += 1
+                raise CassetteMiss(f"В кассете {self.name} нет ответа на {method.upper()} {url}")
+            index = self._served.get(key, 0)
+            self._served[key] = index + 1
+            self.hits += 1
+        responses = entry["responses"]
+        return responses[min(index, len(responses) - 1)]
+
+    @staticmethod
+    def _httpx_body(kwargs):
+        if "json" in kwargs:
+            return kwargs["json"]
+        content = kwargs.get("content") or kwargs.get("data")
+        return content.decode("utf-8") if isinstance(content, bytes) else content
+
+    def record_httpx(self, method, url, kwargs, response):
+        self.record("http", method, url, self._httpx_body(kwargs), {
+            "status": response.status_code,
+            "content_type": response.headers.get("content-type", ""),
+            "text": response.text,
+        })
+
+    def replay_httpx(self, method, url, kwargs):
+        """Записанный ответ в виде httpx.Response, как его вернул бы клиент"""
+        saved = self.replay("http", method, url, self._httpx_body(kwargs))
+        return httpx.Response(
+            saved["status"],
+            headers={"content-type": saved["content_type"]},
+            content=saved["text"].encode("utf-8"),
+            request=httpx.Request(method, url),
+        )
+
+    def print_report(self):
+        if self.recording:
+            print(f"Кассета {self.name}: записано {self.recorded} ответов в {self.directory}")
+        else:
+            print(f"Кассета {self.name}: воспроизведено {self.hits} ответов, не найдено {self.misses}")
+
+
+_cassette = None
+_cassette_loaded = False
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """
+    Кассета процесса по переменным окружения CASSETTE и CASSETTE_NAME,
+    None - обычная работа с сетью.
+    """
+    global _cassette, _cassette_loaded
+    with _cassette_lock:
+        if not _cassette_loaded:
+            mode = os.environ.get("CASSETTE")
+            if mode:
+                _cassette = Cassette(os.environ.get("CASSETTE_NAME", "default"), mode)
+                print(f"Кассета {_cassette.name}: режим {mode}")
+                atexit.register(_cassette.print_report)
+            _cassette_loaded = True
+    return _cassette
+
+
+def set_cassette(cassette):
+    """Задаёт кассету процесса явно (None - выключить)"""
+    global _cassette, _cassette_loaded
+    with _cassette_lock:
+        _cassette = cassette
+        _cassette_loaded = True
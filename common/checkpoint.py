@@ -0,0 +1,108 @@
+"""
+Контрольные точки для долгих прогонов парсеров.
+
+Для каждой пары (источник, прогон) хранится JSON с последней завершённой
+позицией (offset, токен, страница, индекс отеля) и JSONL с уже собранными
+записями. Перезапущенный прогон продолжает с сохранённой позиции.
+"""
+import json
+import os
+from datetime import date
+from pathlib import Path
+
+DEFAULT_CHECKPOINT_DIR = Path(__file__).resolve().parents[1] / "checkpoints"
+
+
+class CheckpointStore:
+    def __init__(self, source, run_id=None, directory=None):
+        """
+        Args:
+            source: Имя источника, например "tvil_hotels"
+            run_id: Идентификатор прогона (по умолчанию - сегодняшняя дата,
+                    поэтому перезапуск в тот же день продолжает прогон)
+            directory: Каталог для файлов контрольных точек
+        """
+        self.source = source
+        self.run_id = run_id or date.today().isoformat()
+        self.directory = Path(directory) if directory else DEFAULT_CHECKPOINT_DIR
+        self.state_path = self.directory / f"{source}_{self.run_id}.json"
+        self.records_path = self.directory / f"{source}_{self.run_id}.records.jsonl"
+        self._records_count = None
+
+    def load(self):
+        """Возвращает сохранённое состояние или пустой словарь"""
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Не удалось прочитать контрольную точку {self.state_path.name}: {e}")
+            return {}
+        self._records_count = checkpoint.get("records", 0)
+        return checkpoint.get("state", {})
+
+    def load_records(self):
+        """
+        Возвращает записи, подтверждённые последним commit().
+        Хвост, дописанный после него (например, при падении), отбрасывается.
+        """
+        if self._records_count is None:
+            self.load()
+        count = self._records_count or 0
+        records = []
+        if count == 0 or not self.records_path.exists():
+            return records
+        with open(self.records_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if len(records) >= count:
+                    break
+                records.append(json.loads(line))
+        return records
+
+    def commit(self, records=(), **state):
+        """
+        Дописывает records и атомарно сохраняет состояние.
+        Состояние записывается последним, поэтому оно никогда не опережает данные.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if self._records_count is None:
+            self.load()
+        count = self._records_count or 0
+
+        if records:
+            self._truncate_records(count)
+            with open(self.records_path, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                    count += 1
+                f.flush()
+                os.fsync(f.fileno())
+
+        tmp_path = self.state_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"state": state, "records": count}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+        self._records_count = count
+
+    def _truncate_records(self, count):
+        """Обрезает JSONL до count строк, убирая неподтверждённый хвост"""
+        if not self.records_path.exists():
+            return
+        with open(self.records_path, "rb+") as f:
+            position = 0
+            for _ in range(count):
+                line = f.readline()
+                if not line:
+                    return
+                position = f.tell()
+            f.truncate(position)
+
+    def clear(self):
+        """Удаляет контрольную точку после успешного завершения прогона"""
+        for path in (self.state_path, self.records_path):
+            if path.exists():
+                path.unlink()
+        self._records_count = 0
@@ -0,0 +1,238 @@
+"""
+Колоночная выгрузка в Parquet с типизированной схемой по источнику.
+
+CSV отдаёт цены, рейтинги и координаты строками, и любой анализ заново
+разбирает весь файл. Parquet хранит колонки с типами, строки пишутся
+группами (row group) по мере поступления, а читающий код может открыть
+файл через memory mapping и загрузить только нужные колонки:
+
+    read_columns("tvil_hotels.parquet", ["id", "price_min", "rating_overall"])
+
+Нужен pyarrow (pip install pyarrow); без него CSV выгрузка работает как раньше.
+"""
+from datetime import date, datetime
+from pathlib import Path
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+DEFAULT_ROW_GROUP_SIZE = 10000
+
+# Типы колонок по источникам; колонки, которых нет в таблице, пишутся строками
+COLUMN_TYPES = {
+    "tvil": {
+        "id": "int64",
+        "latitude": "float64",
+        "longitude": "float64",
+        "price_min": "float64",
+        "price_max": "float64",
+        "daily_price_min": "float64",
+        "daily_price_max": "float64",
+        "year_price_min": "float64",
+        "year_price_max": "float64",
+        "prepayment": "int64",
+        "rooms_total": "int64",
+        "bedroom_total": "int64",
+        "count_rooms": "int64",
+        "count_reviews": "int64",
+        "count_real_reviews": "int64",
+        "rating_overall": "float64",
+        "entity_rating": "float64",
+        "total_rating": "float64",
+        "user_rating": "float64",
+        "stars": "int64",
+        "country_id": "int64",
+        "region_id": "int64",
+        "city_id": "int64",
+        "aria_id": "int64",
+        "count_photos": "int64",
+        "count_guest": "int64",
+        "count_guest_max": "int64",
+        "categories_count": "int64",
+        "occupied_categories": "int64",
+        "last_reserve": "timestamp",
+        "is_new": "bool",
+        "is_instant_reserve": "bool",
+        "is_searchable_and_has_prices": "bool",
+        "allow_quota": "bool",
+    },
+    "yandex": {
+        "id": "int64",
+        "stars": "int64",
+        "rating": "float64",
+        "review_count": "int64",
+        "image_count": "int64",
+        "latitude": "float64",
+        "longitude": "float64",
+        "has_verified_owner": "bool",
+        "phone_available": "bool",
+    },
+    "ostrovok_rooms": {
+        "master_id": "int64",
+        "allotment": "int64",
+        "main_bed_count": "int64",
+        "extra_bed_count": "int64",
+        "has_breakfast": "bool",
+        "price_rub": "float64",
+        "free_cancellation_before": "date",
+        "cancellation_penalty_percent": "float64",
+        "no_show_penalty": "float64",
+    },
+}
+
+TRUE_VALUES = {"true", "1", "да", "yes"}
+FALSE_VALUES = {"false", "0", "нет", "no"}
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    number = float(value)
+    return int(number) if number.is_integer() else None
+
+
+def _to_float(value):
+    return float(value)
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return bool(value)
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    return None
+
+
+def _to_date(value):
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _to_timestamp(value):
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(str(value))
+
+
+def _to_string(value):
+    return value if isinstance(value, str) else str(value)
+
+
+CONVERTERS = {
+    "int64": _to_int,
+    "float64": _to_float,
+    "bool": _to_bool,
+    "date": _to_date,
+    "timestamp": _to_timestamp,
+    "string": _to_string,
+}
+
+
+def _arrow_type(type_name):
+    return {
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "bool": pa.bool_(),
+        "date": pa.date32(),
+        "timestamp": pa.timestamp("s"),
+        "string": pa.string(),
+    }[type_name]
+
+
+def _convert(value, converter):
+    """Приводит значение к типу колонки; пустые и нераспознанные значения -> null"""
+    if value is None or value == "":
+        return None
+    try:
+        return converter(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def parquet_path_for(path):
+    """Путь к Parquet файлу рядом с CSV: tvil_hotels.csv -> tvil_hotels.parquet"""
+    return Path(path).with_suffix(".parquet")
+
+
+class ParquetWriter:
+    def __init__(self, path, source, columns, row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        if pa is None:
+            raise RuntimeError("Для выгрузки в Parquet нужен pyarrow: pip install pyarrow")
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.row_group_size = row_group_size
+        types = COLUMN_TYPES.get(source, {})
+        self.type_names = [types.get(column, "string") for column in self.columns]
+        self.schema = pa.schema([(column, _arrow_type(type_name)) for column, type_name in zip(self.columns, self.type_names)])
+        self.buffer = {column: [] for column in self.columns}
+        self.buffered = 0
+        self.count = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.writer = pq.ParquetWriter(self.path, self.schema, compression="zstd")
+
+    def write_row(self, row):
+        """Добавляет строку; при накоплении row_group_size строк пишет группу в файл"""
+        for column in self.columns:
+            self.buffer[column].append(row.get(column))
+        self.buffered += 1
+        if self.buffered >= self.row_group_size:
+            self.flush()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write_row(row)
+
+    def write_tuple(self, row):
+        """То же, что write_row, для строки-кортежа со значениями в порядке columns"""
+        for values, value in zip(self.buffer.values(), row):
+            values.append(value)
+        self.buffered += 1
+        if self.buffered >= self.row_group_size:
+            self.flush()
+
+    def write_tuples(self, rows):
+        for row in rows:
+            self.write_tuple(row)
+
+    def flush(self):
+        """Записывает накопленные строки отдельной группой"""
+        if not self.buffered:
+            return
+        arrays = []
+        for column, type_name, field in zip(self.columns, self.type_names, self.schema):
+            converter = CONVERTERS[type_name]
+            values = [_convert(value, converter) for value in self.buffer[column]]
+            arrays.append(pa.array(values, type=field.type))
+            self.buffer[column] = []
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+        self.count += self.buffered
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def read_columns(path, columns=None):
+    """Читает Parquet через memory mapping, загружая только перечисленные колонки"""
+    if pq is None:
+        raise RuntimeError("Для чтения Parquet нужен pyarrow: pip install pyarrow")
+    return pq.read_table(path, columns=columns, memory_map=True)
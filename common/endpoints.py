@@ -0,0 +1,22 @@
+"""
+Базовые адреса источников.
+
+Каждый парсер строит URL от site_url(source), поэтому весь обход можно
+направить на локальную заглушку (common/standin_server.py) или другой стенд
+переменной окружения <SOURCE>_BASE_URL:
+
+    YANDEX_BASE_URL=http://127.0.0.1:8765 python yandex_parser/yandex_hotels_parser.py
+"""
+import os
+
+DEFAULT_SITE_URLS = {
+    "tvil": "https://tvil.ru",
+    "ostrovok": "https://ostrovok.ru",
+    "yandex": "https://travel.yandex.ru",
+}
+
+
+def site_url(source, override=None):
+    """Адрес источника без завершающего /: override, затем <SOURCE>_BASE_URL, затем боевой"""
+    url = override or os.environ.get(f"{source.upper()}_BASE_URL") or DEFAULT_SITE_URLS[source]
+    return url.rstrip("/")
@@ -0,0 +1,194 @@
+"""
+Общий HTTP-клиент для всех парсеров.
+
+Держит по одному пулу keep-alive соединений на хост и единый cookie jar,
+поэтому длинный прогон платит за TCP+TLS рукопожатие один раз на хост,
+а не на каждый запрос. Перед каждым запросом клиент ждёт разрешения у
+общего лимитера хоста (common/rate_limit.py) и сообщает ему, как хост ответил.
+Если включена кассета (common/cassette.py), обмены пишутся в неё или
+воспроизводятся из неё без сети.
+"""
+import asyncio
+import importlib.util
+import threading
+from http.cookiejar import CookieJar
+from urllib.parse import urlparse
+
+import httpx
+
+from common.cassette import get_cassette
+from common.rate_limit import get_host_limiters
+
+
+class SharedHttpClient:
+    def __init__(self, http2=False, timeout=30, max_connections_per_host=10, host_limits=None):
+        """
+        Args:
+            http2: Включить мультиплексирование HTTP/2 (нужен пакет h2)
+            timeout: Таймаут запроса по умолчанию, секунды
+            max_connections_per_host: Размер пула соединений на один хост
+            host_limits: Переопределение размера пула для отдельных хостов {host: N}
+        """
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("Пакет h2 не установлен, HTTP/2 отключён")
+            http2 = False
+
+        self.http2 = http2
+        self.timeout = timeout
+        self.max_connections_per_host = max_connections_per_host
+        self.host_limits = dict(host_limits or {})
+        self.cookie_jar = CookieJar()
+        self._clients = {}
+        self._async_clients = {}
+        self._lock = threading.Lock()
+        self.rate_limiters = get_host_limiters()
+
+    @staticmethod
+    def _host(url):
+        return urlparse(url).netloc
+
+    def _limits_for(self, host):
+        max_connections = self.host_limits.get(host, self.max_connections_per_host)
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=30
+        )
+
+    def _attach_cookie_jar(self, client):
+        # httpx копирует переданные куки, поэтому подменяем jar на общий
+        client.cookies.jar = self.cookie_jar
+        return client
+
+    def set_host_limit(self, host, max_connections):
+        """Задаёт размер пула для хоста. Действует на клиенты, созданные после вызова."""
+        self.host_limits[host] = max_connections
+
+    def update_cookies(self, cookies, domain=""):
+        """Добавляет куки {name: value} в общий jar"""
+        jar = httpx.Cookies()
+        jar.jar = self.cookie_jar
+        for name, value in cookies.items():
+            jar.set(name, value, domain=domain)
+
+    def client_for(self, url):
+        """Синхронный клиент с пулом соединений для хоста из url"""
+        host = self._host(url)
+        with self._lock:
+            client = self._clients.get(host)
+            if client is None:
+                client = self._attach_cookie_jar(httpx.Client(
+                    http2=self.http2,
+                    timeout=self.timeout,
+                    limits=self._limits_for(host)
+                ))
+                self._clients[host] = client
+        return client
+
+    def async_client_for(self, url):
+        """
+        Асинхронный клиент для хоста из url.
+        Клиент привязан к текущему event loop, перед выходом из него нужен aclose().
+        """
+        host = self._host(url)
+        client = self._async_clients.get(host)
+        if client is None:
+            client = self._attach_cookie_jar(httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=self._limits_for(host)
+            ))
+            self._async_clients[host] = client
+        return client
+
+    def _record(self, url, response, kwargs):
+        # HTML вместо JSON на API-запрос - это страница капчи, а не данные
+        headers = {name.lower(): value for name, value in (kwargs.get("headers") or {}).items()}
+        accept = headers.get("accept", "")
+        expects_json = "json" in kwargs or "json" in accept
+        self.rate_limiters.record(url, response.status_code, response.headers.get("content-type", ""), expects_json)
+        return response
+
+    def request(self, method, url, **kwargs):
+        cassette = get_cassette()
+        if cassette and cassette.replaying:
+            return cassette.replay_httpx(method, url, kwargs)
+        self.rate_limiters.acquire(url)
+        try:
+            response = self.client_for(url).request(method, url, **kwargs)
+        except httpx.TimeoutException:
+            self.rate_limiters.record_timeout(url)
+            raise
+        if cassette:
+            cassette.record_httpx(method, url, kwargs, response)
+        return self._record(url, response, kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    async def arequest(self, method, url, **kwargs):
+        cassette = get_cassette()
+        if cassette and cassette.replaying:
+            return cassette.replay_httpx(method, url, kwargs)
+        await self.rate_limiters.aacquire(url)
+        try:
+            response = await self._with_deadline(self.async_client_for(url).request(method, url, **kwargs), kwargs.get("timeout"))
+        except httpx.TimeoutException:
+            self.rate_limiters.record_timeout(url)
+            raise
+        if cassette:
+            cassette.record_httpx(method, url, kwargs, response)
+        return self._record(url, response, kwargs)
+
+    @staticmethod
+    async def _with_deadline(request, timeout):
+        """
+        Таймауты httpx действуют на каждую фазу (соединение, чтение) отдельно,
+        поэтому числовой timeout дополнительно ограничивает весь запрос целиком.
+        Окно лимитера к этому моменту уже получено и в дедлайн не входит.
+        """
+        if not isinstance(timeout, (int, float)):
+            return await request
+        try:
+            return await asyncio.wait_for(request, timeout)
+        except asyncio.TimeoutError:
+            raise httpx.ReadTimeout(f"нет ответа за {timeout:.1f} с") from None
+
+    async def aget(self, url, **kwargs):
+        return await self.arequest("GET", url, **kwargs)
+
+    async def apost(self, url, **kwargs):
+        return await self.arequest("POST", url, **kwargs)
+
+    def close(self):
+        """Закрывает синхронные пулы соединений"""
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+    async def aclose(self):
+        """Закрывает асинхронные пулы соединений текущего event loop"""
+        clients = list(self._async_clients.values())
+        self._async_clients.clear()
+        for client in clients:
+            await client.aclose()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client(**kwargs):
+    """
+    Возвращает общий для процесса клиент.
+    Аргументы учитываются только при первом вызове.
+    """
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = SharedHttpClient(**kwargs)
+    return _shared_client
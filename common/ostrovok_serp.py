@@ -0,0 +1,272 @@
+"""
+Сбор выдачи Ostrovok: из ответов поискового XHR и из карточек на странице.
+
+Страница выдачи сама запрашивает список отелей у API поиска. SerpCapture
+слушает эти ответы через page.on("response") и достаёт записи прямо из JSON:
+без хрупких селекторов вроде .HotelRating_ratingCategory__cNoZe, без разбора
+локализованных строк цены и без ожиданий отрисовки карточек.
+
+Для режима DOM extract_cards забирает все карточки страницы одним
+page.evaluate вместо query_selector + inner_text на каждое поле каждой карточки.
+
+Режим network не сверен с живым сайтом: SERP_XHR_PATTERN и SERP_FIELD_PATHS
+выведены по соседнему API hp/search, а пример ответа
+tests/fixtures/ostrovok_serp.json составлен вручную. Поэтому по умолчанию
+парсеры собирают выдачу из DOM, а network включается только явно и при
+пустом результате откатывается на DOM.
+"""
+from common.endpoints import site_url
+from common.rate_limit import paced_goto
+
+# Путь поискового XHR выдачи (hp/search - это поиск номеров одного отеля, он сюда не попадает)
+SERP_XHR_PATTERN = "/site/serp"
+
+# Где в записи отеля лежит каждое поле; берётся первый непустой путь.
+# Если сайт поменяет структуру ответа, правится только эта таблица (и пример
+# ответа tests/fixtures/ostrovok_serp.json, на котором она проверяется).
+SERP_FIELD_PATHS = {
+    "hotel_id": [("ota_hotel_id",), ("static_vm", "ota_hotel_id"), ("id",)],
+    "master_id": [("master_id",), ("static_vm", "master_id")],
+    "name": [("static_vm", "name"), ("name",)],
+    "address": [("static_vm", "address"), ("address",)],
+    "url": [("static_vm", "url"), ("url",)],
+    "price": [
+        ("rates", 0, "payment_options", "payment_types", 0, "show_amount"),
+        ("rates", 0, "payment_options", "payment_types", 0, "amount"),
+        ("min_price",),
+    ],
+    "rating": [("static_vm", "rating", "total"), ("rating", "total"), ("rating",)],
+    "rating_category": [("static_vm", "rating", "category"), ("rating", "category")],
+    "reviews_count": [("static_vm", "rating", "count"), ("rating", "count"), ("reviews_count",)],
+}
+
+# Печатается парсерами при явном включении режима network
+NETWORK_MODE_WARNING = (
+    "Внимание: режим network не проверен на живом ответе сайта (SERP_XHR_PATTERN и "
+    "SERP_FIELD_PATHS - предположение). Если отели не соберутся, обход продолжится из DOM"
+)
+
+# Поля, по которым сравнивается заполненность при сборе из DOM и из XHR
+REPORT_FIELDS = ["name", "address", "url", "show_rooms_url", "price", "rating", "rating_category", "reviews_count"]
+
+
+# Все поля всех карточек за один вызов page.evaluate. Ошибка в карточке
+# возвращается в её записи и не прерывает разбор остальных.
+EXTRACT_CARDS_JS = """
+() => Array.from(document.querySelectorAll('[data-testid="serp-hotelcard"]')).map((card, index) => {
+    try {
+        const text = (selector) => {
+            const el = card.querySelector(selector);
+            return el ? el.innerText.trim() : null;
+        };
+        const attr = (selector, name) => {
+            const el = card.querySelector(selector);
+            return el ? el.getAttribute(name) : null;
+        };
+        return {
+            index,
+            name: text('a[data-testid="hotel-card-name"]'),
+            href: attr('a[data-testid="hotel-card-name"]', 'href'),
+            show_rooms_href: attr('a[data-testid="next-step-button"]', 'href'),
+            address: text('[data-testid="hotel-card-distance-address"]'),
+            price_value: text('[data-testid="hotel-card-price-value"]'),
+            price_desc: text('[data-testid="hotel-card-rate-description"]'),
+            rating: text('[data-testid="hotel-card-rating-content"]'),
+            rating_category: text('.HotelRating_ratingCategory__cNoZe'),
+            reviews_count: text('.HotelRating_reviewsCount__3YYVd')
+        };
+    } catch (e) {
+        return {index, error: String(e)};
+    }
+})
+"""
+
+CARD_FIELDS = [
+    "name", "href", "show_rooms_href", "address", "price_value",
+    "price_desc", "rating", "rating_category", "reviews_count"
+]
+
+
+def extract_cards(page):
+    """Сырые поля всех карточек выдачи на странице (None - элемента в карточке нет)"""
+    return page.evaluate(EXTRACT_CARDS_JS)
+
+
+def card_problem(card, required_fields=CARD_FIELDS):
+    """Почему карточку нельзя принять: текст ошибки, список пустых полей или None"""
+    if card.get("error"):
+        return card["error"]
+    missing = [field for field in required_fields if card.get(field) is None]
+    if missing:
+        return f"нет полей {', '.join(missing)}"
+    return None
+
+
+def _get_path(data, path):
+    for key in path:
+        if isinstance(data, dict):
+            data = data.get(key)
+        elif isinstance(data, list) and isinstance(key, int) and len(data) > key:
+            data = data[key]
+        else:
+            return None
+    return data
+
+
+def _first(item, paths):
+    for path in paths:
+        value = _get_path(item, path)
+        if value not in (None, "", [], {}):
+            return value
+    return ""
+
+
+def _absolute_url(url, site):
+    if url and url.startswith("/"):
+        return f"{site}{url}"
+    return url
+
+
+def extract_serp_total(data):
+    """Общее число отелей в выдаче, если API его отдаёт"""
+    for path in [("total_hotels",), ("total",), ("data", "total_hotels")]:
+        value = _get_path(data, path)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def extract_serp_hotels(data, site=None):
+    """
+    Записи отелей из ответа поискового XHR в формате списка отелей парсера.
+    site - адрес сайта для относительных url (по умолчанию site_url("ostrovok")).
+    """
+    site = site or site_url("ostrovok")
+    items = _first(data, [("hotels",), ("data", "hotels")]) or []
+    hotels = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        hotel = {field: _first(item, paths) for field, paths in SERP_FIELD_PATHS.items()}
+        # Запись без id и url - структура ответа разошлась с SERP_FIELD_PATHS
+        if not hotel["hotel_id"] and not hotel["url"]:
+            continue
+        hotel["url"] = _absolute_url(hotel["url"], site)
+        # Отдельной кнопки "Показать все номера" в ответе нет, парсеру номеров хватает слага из url
+        hotel["show_rooms_url"] = hotel["url"]
+        hotels.append(hotel)
+    return hotels
+
+
+def field_fill_report(hotels, fields=REPORT_FIELDS):
+    """Доля записей с непустым значением по каждому полю"""
+    if not hotels:
+        return {field: 0.0 for field in fields}
+    return {
+        field: sum(1 for hotel in hotels if hotel.get(field) not in (None, "")) / len(hotels)
+        for field in fields
+    }
+
+
+def print_crawl_report(mode, pages, seconds, hotels):
+    """Скорость обхода (страниц в минуту) и заполненность полей для сравнения режимов"""
+    pages_per_minute = pages / seconds * 60 if seconds else 0.0
+    print(f"\n=== Режим {mode}: {pages} страниц за {seconds:.1f} с ({pages_per_minute:.1f} страниц/мин), {len(hotels)} отелей ===")
+    for field, share in field_fill_report(hotels).items():
+        print(f"  {field}: {share:.0%}")
+
+
+class SerpCapture:
+    def __init__(self, page, site=None):
+        """
+        Подписывается на ответы страницы; подключать до первой навигации.
+        site - адрес сайта парсера (по умолчанию site_url("ostrovok")), от него строятся url отелей.
+        """
+        self.page = page
+        self.site = site_url("ostrovok", site)
+        self.responses = []
+        self.total = None
+        self.completed = False
+        page.on("response", self._on_response)
+
+    def _on_response(self, response):
+        # В обработчике только запоминаем ответ, тело читаем вне события
+        if SERP_XHR_PATTERN in response.url and response.request.resource_type in ("xhr", "fetch"):
+            self.responses.append(response)
+
+    def take_hotels(self):
+        """Разбирает накопленные ответы и возвращает записи отелей из них"""
+        hotels = []
+        for response in self.responses:
+            try:
+                data = response.json()
+            except Exception as e:
+                print(f"Не удалось прочитать ответ {response.url}: {e}")
+                continue
+            total = extract_serp_total(data)
+            if total is not None:
+                self.total = total
+            response_hotels = extract_serp_hotels(data, self.site)
+            # Пустой список hotels - нормальный конец выдачи; тревожно, если списка
+            # нет вовсе или в нём есть записи, но ни одна не разобралась
+            items = _get_path(data, ("hotels",))
+            if items is None:
+                items = _get_path(data, ("data", "hotels"))
+            if not response_hotels and (items is None or items):
+                keys = ", ".join(sorted(data)) if isinstance(data, dict) else type(data).__name__
+                print(
+                    f"Предупреждение: в ответе {response.url} не найдено ни одного отеля. "
+                    f"Возможно, сменилась структура ответа (SERP_FIELD_PATHS); ключи ответа: {keys}"
+                )
+            hotels.extend(response_hotels)
+        self.responses = []
+        return hotels
+
+    def capture_page(self, waiter, url):
+        """
+        Открывает url и ждёт поискового XHR, не дожидаясь отрисовки страницы.
+        Возвращает записи отелей или None, если XHR так и не пришёл.
+        """
+        response = waiter.for_response(
+            "serp_xhr",
+            SERP_XHR_PATTERN,
+            lambda: paced_goto(self.page, url, timeout=60000, wait_until="commit")
+        )
+        if response is None and not self.responses:
+            return None
+        return self.take_hotels()
+
+    def iter_pages(self, waiter, page_url, start_page=1, seen_ids=()):
+        """
+        Обходит страницы выдачи, отдавая (номер страницы, новые отели).
+        Останавливается на пустой странице, на странице без новых отелей или когда
+        собрано total отелей. После обхода self.completed показывает, дошёл ли он до конца.
+        """
+        seen_ids = set(seen_ids)
+        page_number = start_page
+        self.completed = False
+        while True:
+            print(f"\n--- Page {page_number} (XHR) ---")
+            hotels = self.capture_page(waiter, page_url(page_number))
+            if hotels is None:
+                print(f"Поисковый XHR на странице {page_number} не пойман, обход остановлен")
+                break
+
+            new_hotels = []
+            for hotel in hotels:
+                hotel_key = hotel["hotel_id"] or hotel["url"]
+                if hotel_key not in seen_ids:
+                    seen_ids.add(hotel_key)
+                    new_hotels.append(hotel)
+            if not new_hotels:
+                print(f"На странице {page_number} нет новых отелей. Reached last page.")
+                # Пустая первая страница - скорее блокировка, чем конец выдачи
+                self.completed = page_number > start_page
+                break
+
+            yield page_number, new_hotels
+
+            if self.total is not None and len(seen_ids) >= self.total:
+                self.completed = True
+                break
+            page_number += 1
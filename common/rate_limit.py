@@ -0,0 +1,214 @@
+"""
+Общий для процесса адаптивный ограничитель частоты запросов по хостам.
+
+На каждый хост заводится свой AdaptiveRateLimiter, и все парсеры берут
+разрешение на запрос у него (SharedHttpClient делает это сам, браузерные
+сценарии - перед fetch и навигациями). Частота подбирается по AIMD: пока
+ответы здоровые, она растёт на increase запросов в секунду за ответ; на 429,
+403, 5xx, таймаут или HTML вместо JSON (капча) она падает в decrease раз.
+Поэтому без ручных пауз обход идёт так быстро, как хост позволяет, и сразу
+сбавляет ход, когда начинает срабатывать антибот или хост перегружен.
+Потолок частоты (max_rate) задаётся для каждого хоста в HOST_SETTINGS.
+"""
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+# Ответы, которые считаются отказом хоста (плюс любой 5xx - хост перегружен)
+REJECT_STATUSES = {403, 429}
+
+DEFAULT_SETTINGS = {
+    "rate": 2.0,        # начальная частота, запросов в секунду
+    "min_rate": 0.2,
+    "max_rate": 10.0,
+    "increase": 0.1,    # прибавка частоты за здоровый ответ
+    "decrease": 0.5,    # множитель частоты при отказе
+    "cooldown": 1.0,    # не чаще одного снижения за столько секунд
+}
+
+# Настройки отдельных хостов поверх DEFAULT_SETTINGS
+HOST_SETTINGS = {
+    "tvil.ru": {"max_rate": 5.0},
+    "ostrovok.ru": {"max_rate": 4.0},
+    "travel.yandex.ru": {"max_rate": 3.0},
+}
+
+
+def rejection_reason(status, content_type="", expects_json=False):
+    """Причина считать ответ отказом ("429", "403", "503" и другие 5xx, "non_json") или None"""
+    if status in REJECT_STATUSES or status >= 500:
+        return str(status)
+    if expects_json and status == 200 and "json" not in (content_type or "").lower():
+        return "non_json"
+    return None
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, host, rate, min_rate, max_rate, increase, decrease, cooldown):
+        self.host = host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.successes = 0
+        self.rejections = {}
+        self._next_start = 0.0
+        self._last_decrease = 0.0
+        # threading.Lock, а не asyncio.Lock: лимитер общий для потоков и event loop,
+        # а под блокировкой только арифметика без ожиданий
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Занимает ближайшее окно для запроса, возвращает сколько до него ждать"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + 1 / self.rate
+            return start - now
+
+    def acquire(self):
+        """Ждёт своей очереди на запрос (sync)"""
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def aacquire(self):
+        """Ждёт своей очереди на запрос (async)"""
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_success(self):
+        with self._lock:
+            self.successes += 1
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def record_rejection(self, reason):
+        with self._lock:
+            self.rejections[reason] = self.rejections.get(reason, 0) + 1
+            now = time.monotonic()
+            # Пачка отказов от уже отправленных параллельных запросов - это одно событие
+            if now - self._last_decrease >= self.cooldown:
+                self._last_decrease = now
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self._next_start = max(self._next_start, now + 1 / self.rate)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "host": self.host,
+                "rate": self.rate,
+                "max_rate": self.max_rate,
+                "successes": self.successes,
+                "rejections": dict(self.rejections),
+            }
+
+
+class HostRateLimiters:
+    def __init__(self, defaults=None, host_settings=None):
+        self.defaults = dict(DEFAULT_SETTINGS, **(defaults or {}))
+        self.host_settings = {host: dict(settings) for host, settings in HOST_SETTINGS.items()}
+        for host, settings in (host_settings or {}).items():
+            self.host_settings.setdefault(host, {}).update(settings)
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _host(url_or_host):
+        return urlparse(url_or_host).netloc if "//" in url_or_host else url_or_host
+
+    def configure(self, host, **settings):
+        """Переопределяет настройки хоста; уже созданный лимитер обновляется сразу"""
+        self.host_settings.setdefault(host, {}).update(settings)
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter:
+                for name, value in settings.items():
+                    setattr(limiter, name, value)
+                limiter.rate = min(max(limiter.rate, limiter.min_rate), limiter.max_rate)
+
+    def for_host(self, url_or_host):
+        """Лимитер для хоста (можно передать URL целиком)"""
+        host = self._host(url_or_host)
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                settings = dict(self.defaults, **self.host_settings.get(host, {}))
+                limiter = AdaptiveRateLimiter(host, **settings)
+                self._limiters[host] = limiter
+        return limiter
+
+    def reserve(self, url_or_host):
+        """Занимает окно для запроса без ожидания; возвращает, сколько секунд ждать до него"""
+        return self.for_host(url_or_host)._reserve()
+
+    def acquire(self, url_or_host):
+        self.for_host(url_or_host).acquire()
+
+    async def aacquire(self, url_or_host):
+        await self.for_host(url_or_host).aacquire()
+
+    def record(self, url_or_host, status, content_type="", expects_json=False):
+        """Учитывает ответ хоста; возвращает причину отказа или None"""
+        limiter = self.for_host(url_or_host)
+        reason = rejection_reason(status, content_type, expects_json)
+        if reason:
+            limiter.record_rejection(reason)
+        else:
+            limiter.record_success()
+        return reason
+
+    def record_timeout(self, url_or_host):
+        """Учитывает запрос, на который хост не ответил вовремя (или соединение оборвалось)"""
+        self.for_host(url_or_host).record_rejection("timeout")
+
+    def stats(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.stats() for limiter in limiters]
+
+    def print_report(self):
+        """Текущая частота и отказы по каждому хосту"""
+        for item in self.stats():
+            rejections = ", ".join(f"{reason}: {count}" for reason, count in sorted(item["rejections"].items()))
+            print(
+                f"Лимит {item['host']}: {item['rate']:.2f} запросов/с (потолок {item['max_rate']:.2f}), "
+                f"успешных ответов {item['successes']}, отказов {sum(item['rejections'].values())}"
+                + (f" ({rejections})" if rejections else "")
+            )
+
+
+def paced_goto(page, url, **kwargs):
+    """page.goto (sync API) с разрешением от лимитера хоста и учётом статуса документа"""
+    # Playwright нужен только браузерным сценариям, HTTP-клиент без него обходится
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+
+    rate_limiters = get_host_limiters()
+    rate_limiters.acquire(url)
+    try:
+        response = page.goto(url, **kwargs)
+    except PlaywrightTimeoutError:
+        rate_limiters.record_timeout(url)
+        raise
+    if response is not None:
+        rate_limiters.record(url, response.status)
+    return response
+
+
+_host_limiters = None
+_host_limiters_lock = threading.Lock()
+
+
+def get_host_limiters(**kwargs):
+    """
+    Возвращает общий для процесса набор лимитеров.
+    Аргументы учитываются только при первом вызове.
+    """
+    global _host_limiters
+    with _host_limiters_lock:
+        if _host_limiters is None:
+            _host_limiters = HostRateLimiters(**kwargs)
+    return _host_limiters
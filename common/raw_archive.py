@@ -0,0 +1,196 @@
+"""
+Архив сырых ответов в сжатом NDJSON.
+
+Каждая запись (один отель) хранится одной компактной JSON-строкой. Строки
+сжимаются блоками, каждый блок - отдельный gzip member, поэтому файл целиком
+читается обычным gzip.open как NDJSON, а отдельную запись можно достать по
+индексу, распаковав только её блок из memory-mapped файла.
+
+Рядом с архивом лежит индекс <архив>.idx: по строке JSON на запись
+[id, файл, смещение блока, длина блока, номер строки в блоке]. Блок попадает
+в индекс только после записи в архив, поэтому при открытии на дозапись всё,
+что лежит в архиве после последнего проиндексированного блока (оборванный
+падением блок), отрезается.
+"""
+import gzip
+import json
+import mmap
+import zlib
+from pathlib import Path
+
+DEFAULT_BLOCK_SIZE = 64
+
+
+def index_path_for(archive_path):
+    archive_path = Path(archive_path)
+    return archive_path.with_name(archive_path.name + ".idx")
+
+
+class RawArchiveWriter:
+    def __init__(self, path, block_size=DEFAULT_BLOCK_SIZE):
+        """
+        Args:
+            path: Путь к архиву (*.ndjson.gz). Существующий архив дописывается.
+            block_size: Сколько записей сжимать в один блок
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.block_size = block_size
+        self._recover()
+        self._file = open(self.path, "ab")
+        self._index = open(index_path_for(self.path), "a", encoding="utf-8")
+        self._pending = []
+        self.records_written = 0
+
+    def _recover(self):
+        """Обрезает архив и индекс до последнего блока, записанного в индекс целиком"""
+        index_path = index_path_for(self.path)
+        if not self.path.exists() or not index_path.exists():
+            return
+        archive_size = self.path.stat().st_size
+        with open(index_path, "rb") as f:
+            index_bytes = f.read()
+
+        # Годный индекс - префикс целых строк, чьи блоки целиком лежат в архиве
+        archive_end = 0
+        index_end = 0
+        for line in index_bytes.splitlines(keepends=True):
+            try:
+                _, _, offset, length, _ = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n") or offset + length > archive_size:
+                break
+            archive_end = max(archive_end, offset + length)
+            index_end += len(line)
+
+        if archive_end < archive_size:
+            print(f"{self.path.name}: отрезан оборванный хвост архива, {archive_size - archive_end} байт")
+            with open(self.path, "r+b") as f:
+                f.truncate(archive_end)
+        if index_end < len(index_bytes):
+            with open(index_path, "r+b") as f:
+                f.truncate(index_end)
+
+    def write(self, record_id, record):
+        """Добавляет запись; блок сжимается и пишется при заполнении"""
+        self._pending.append((str(record_id), json.dumps(record, ensure_ascii=False, separators=(",", ":"))))
+        if len(self._pending) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Сжимает накопленные записи в блок и дописывает его вместе с индексом"""
+        if not self._pending:
+            return
+        block = "".join(line + "\n" for _, line in self._pending).encode("utf-8")
+        compressed = gzip.compress(block)
+        offset = self._file.tell()
+        self._file.write(compressed)
+        self._file.flush()
+
+        for line_number, (record_id, _) in enumerate(self._pending):
+            entry = [record_id, self.path.name, offset, len(compressed), line_number]
+            self._index.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._index.flush()
+
+        self.records_written += len(self._pending)
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def latest_archive(directory, prefix, run_id=None, exclude_prefix=None):
+    """
+    Архив одного прогона в directory.
+
+    Args:
+        directory: Папка с архивами
+        prefix: Начало имени архива, например "tvil_"
+        run_id: Идентификатор прогона (<prefix><run_id>.ndjson.gz); по умолчанию - самый свежий архив
+        exclude_prefix: Архивы с таким началом имени не рассматриваются (например, "yandex_tiles_"
+                        при поиске архивов "yandex_")
+
+    Returns:
+        Путь к архиву или None, если подходящего архива нет
+    """
+    directory = Path(directory)
+    if run_id is not None:
+        path = directory / f"{prefix}{run_id}.ndjson.gz"
+        return path if path.exists() else None
+    archives = [
+        path for path in directory.glob(f"{prefix}*.ndjson.gz")
+        if not (exclude_prefix and path.name.startswith(exclude_prefix))
+    ]
+    archives.sort(key=lambda path: path.stat().st_mtime)
+    return archives[-1] if archives else None
+
+
+def iter_archive(path):
+    """
+    Последовательно отдаёт все записи архива.
+    На оборванном хвосте (прогон упал посреди блока) чтение останавливается:
+    целые строки до обрыва отдаются, недописанная строка - нет.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.endswith("\n") and line.strip():
+                    yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            print(f"{Path(path).name}: архив оборван, чтение остановлено ({e})")
+
+
+def load_index(archive_path):
+    """Индекс архива: {id: (файл, смещение, длина, строка)}. При повторах побеждает последняя запись."""
+    index = {}
+    index_path = index_path_for(archive_path)
+    if not index_path.exists():
+        return index
+    with open(index_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                # Недописанная строка после падения прогона
+                break
+            if line.strip():
+                record_id, file_name, offset, length, line_number = json.loads(line)
+                index[record_id] = (file_name, offset, length, line_number)
+    return index
+
+
+class RawArchiveReader:
+    """Точечное чтение записей по id через mmap, без распаковки всего архива"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.index = load_index(self.path)
+        self._file = open(self.path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.path.stat().st_size else None
+
+    def get(self, record_id):
+        """Возвращает запись по id или None"""
+        entry = self.index.get(str(record_id))
+        if entry is None or self._mmap is None:
+            return None
+        _, offset, length, line_number = entry
+        block = gzip.decompress(self._mmap[offset:offset + length])
+        return json.loads(block.split(b"\n")[line_number])
+
+    def close(self):
+        if self._mmap is not None:
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,267 @@
+"""
+Исполнитель идемпотентных запросов с повторами, дедлайнами по перцентилям и хеджированием.
+
+Вместо одной попытки с timeout=30 каждая попытка получает дедлайн из
+наблюдаемых задержек источника (p99 с запасом), упавшая или истёкшая попытка
+повторяется с экспоненциальной паузой и случайным разбросом, а при hedge=True
+второй такой же запрос уходит, как только первый дольше p95, и берётся тот
+ответ, что придёт раньше. В конце прогона print_report печатает p50/p95/p99
+по источнику.
+
+Только для запросов без побочных эффектов: поиск цен и страниц выдачи можно
+безопасно повторить или отправить дважды.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+
+# Статусы, при которых запрос стоит повторить
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LatencyTracker:
+    def __init__(self, window=500):
+        """Хранит задержки последних window успешных попыток, секунды"""
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def percentile(self, p):
+        """p-й перцентиль (0-100) или None, если замеров нет"""
+        with self._lock:
+            ordered = sorted(self.samples)
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+
+class RequestExecutor:
+    def __init__(
+        self,
+        source,
+        attempts=3,
+        backoff=0.5,
+        max_backoff=8.0,
+        hedge=False,
+        default_deadline=30.0,
+        min_deadline=2.0,
+        deadline_factor=2.0,
+        min_samples=20,
+    ):
+        """
+        Args:
+            source: Имя источника для отчёта
+            attempts: Сколько всего попыток на запрос
+            backoff: Базовая пауза перед повтором, секунды (удваивается с каждой попыткой)
+            max_backoff: Предел паузы перед повтором
+            hedge: Отправлять дублирующий запрос, если первый дольше p95
+            default_deadline: Дедлайн попытки, пока замеров меньше min_samples
+            min_deadline: Нижняя граница дедлайна
+            deadline_factor: Дедлайн = p99 * deadline_factor, но не больше default_deadline
+            min_samples: С какого числа замеров дедлайн и хеджирование берутся из перцентилей
+        """
+        self.source = source
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge
+        self.default_deadline = default_deadline
+        self.min_deadline = min_deadline
+        self.deadline_factor = deadline_factor
+        self.min_samples = min_samples
+        self.latency = LatencyTracker()
+        self.counters = {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def deadline(self):
+        """Дедлайн одной попытки, секунды"""
+        p99 = self.latency.percentile(99)
+        if p99 is None or len(self.latency) < self.min_samples:
+            return self.default_deadline
+        return min(self.default_deadline, max(self.min_deadline, p99 * self.deadline_factor))
+
+    def hedge_delay(self):
+        """Через сколько секунд отправлять дублирующий запрос, None - не отправлять"""
+        if not self.hedge or len(self.latency) < self.min_samples:
+            return None
+        return self.latency.percentile(95)
+
+    def _pause(self, attempt):
+        """Экспоненциальная пауза перед повтором с разбросом ±50%"""
+        return min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _add_latency(self, response, started_at):
+        if response.status_code in RETRY_STATUSES:
+            return
+        # elapsed считает httpx от отправки до ответа, без ожидания в лимитере частоты
+        try:
+            seconds = response.elapsed.total_seconds()
+        except RuntimeError:
+            seconds = time.perf_counter() - started_at
+        self.latency.add(seconds)
+
+    def _timed(self, send, deadline):
+        started_at = time.perf_counter()
+        response = send(deadline)
+        self._add_latency(response, started_at)
+        return response
+
+    async def _atimed(self, send, deadline):
+        # Общий дедлайн попытки держит SharedHttpClient.arequest: он ограничивает
+        # им только сам запрос, а ожидание в лимитере частоты в дедлайн не входит
+        started_at = time.perf_counter()
+        response = await send(deadline)
+        self._add_latency(response, started_at)
+        return response
+
+    def _attempt(self, send):
+        """Одна попытка (sync), при необходимости с дублирующим запросом в соседнем потоке"""
+        deadline = self.deadline()
+        hedge_delay = self.hedge_delay()
+        if hedge_delay is None:
+            return self._timed(send, deadline)
+
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"hedge-{self.source}")
+        primary = self._pool.submit(self._timed, send, deadline)
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedged = self._pool.submit(self._timed, send, deadline)
+        pending = {primary, hedged}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                # Проигравший запрос в потоке не прервать, он завершится сам по своему дедлайну
+                if future is hedged:
+                    self._count("hedge_wins")
+                return response
+        raise error
+
+    async def _aattempt(self, send):
+        """Одна попытка (async), при необходимости с дублирующим запросом"""
+        deadline = self.deadline()
+        hedge_delay = self.hedge_delay()
+        primary = asyncio.ensure_future(self._atimed(send, deadline))
+        if hedge_delay is None:
+            return await primary
+
+        done, _ = await asyncio.wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self._count("hedges")
+        hedged = asyncio.ensure_future(self._atimed(send, deadline))
+        pending = {primary, hedged}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    if task is hedged:
+                        self._count("hedge_wins")
+                    return task.result()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _should_retry(self, attempt, response=None):
+        if attempt + 1 >= self.attempts:
+            return False
+        return response is None or response.status_code in RETRY_STATUSES
+
+    def run(self, send):
+        """
+        Выполняет запрос с повторами (sync).
+
+        Args:
+            send: send(timeout) -> httpx.Response, один запрос с заданным таймаутом
+
+        Returns:
+            Ответ последней попытки; если все попытки упали, пробрасывает последнюю ошибку
+        """
+        self._count("requests")
+        for attempt in range(self.attempts):
+            try:
+                response = self._attempt(send)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt):
+                    self._count("failures")
+                    raise
+                print(f"{self.source}: попытка {attempt + 1} не удалась ({type(e).__name__}), повтор")
+            else:
+                if not self._should_retry(attempt, response):
+                    return response
+                print(f"{self.source}: попытка {attempt + 1} вернула {response.status_code}, повтор")
+            self._count("retries")
+            time.sleep(self._pause(attempt))
+
+    async def arun(self, send):
+        """То же, что run, для send(timeout), возвращающего корутину"""
+        self._count("requests")
+        for attempt in range(self.attempts):
+            try:
+                response = await self._aattempt(send)
+            except (httpx.TransportError, asyncio.TimeoutError) as e:
+                if not self._should_retry(attempt):
+                    self._count("failures")
+                    raise
+                print(f"{self.source}: попытка {attempt + 1} не удалась ({type(e).__name__}), повтор")
+            else:
+                if not self._should_retry(attempt, response):
+                    return response
+                print(f"{self.source}: попытка {attempt + 1} вернула {response.status_code}, повтор")
+            self._count("retries")
+            await asyncio.sleep(self._pause(attempt))
+
+    def report(self):
+        """Перцентили задержки (секунды) и счётчики повторов и хеджирования"""
+        return dict(
+            self.counters,
+            source=self.source,
+            samples=len(self.latency),
+            p50=self.latency.percentile(50),
+            p95=self.latency.percentile(95),
+            p99=self.latency.percentile(99),
+        )
+
+    def print_report(self):
+        report = self.report()
+        if not report["samples"]:
+            print(f"Задержки {self.source}: замеров нет; запросов {report['requests']}, отказов {report['failures']}")
+            return
+        print(
+            f"Задержки {self.source}: p50 {report['p50']:.2f} с, p95 {report['p95']:.2f} с, p99 {report['p99']:.2f} с "
+            f"по {report['samples']} ответам; запросов {report['requests']}, повторов {report['retries']}, "
+            f"дублей {report['hedges']} (быстрее первого: {report['hedge_wins']}), отказов {report['failures']}"
+        )
@@ -0,0 +1,284 @@
+"""
+Профили блокировки ресурсов для браузерных сессий Playwright.
+
+Парсерам от браузера нужны только антибот, куки и данные выдачи, а страницы
+тянут картинки, шрифты, тайлы карт, аналитику и рекламу на каждой навигации.
+ResourceBlocker вешается на контекст через context.route и обрывает запросы
+ненужных типов и к известным сторонним хостам, считая заблокированное по
+навигациям вместе с размером тел пропущенных ответов и временем до load.
+При получении куки (bootstrap=True) часть хостов профиля
+пропускается: у Яндекса Метрика участвует в выдаче сессионных куки, поэтому
+её блокируют только на страницах обхода.
+Сколько это экономит байт и времени, замеряет compare_profile (страница
+без профиля и с ним); замер сохраняется и печатается в отчёте каждого прогона:
+
+    python common/resource_blocking.py tvil
+"""
+import json
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlparse
+
+# Корень репозитория в sys.path, чтобы модуль можно было запускать как скрипт
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.endpoints import site_url
+
+# Последние замеры compare_profile по источникам
+MEASUREMENTS_PATH = Path(__file__).resolve().parents[1] / "benchmarks" / "results" / "resource_blocking.json"
+
+# Аналитика, счётчики и реклама: на данные и антибот не влияют
+THIRD_PARTY_HOSTS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "mc.yandex.ru",
+    "an.yandex.ru",
+    "top-fwz1.mail.ru",
+    "ad.mail.ru",
+    "vk.com",
+    "criteo.com",
+    "facebook.net",
+]
+
+PROFILES = {
+    # Запросы к API идут fetch из страницы, вёрстка не нужна совсем
+    "tvil": {
+        "block_types": {"image", "media", "font", "stylesheet"},
+        "block_hosts": THIRD_PARTY_HOSTS,
+        "url": f"{site_url('tvil')}/city/irkutskaya-oblast/hotels/",
+    },
+    # Стили оставляем: inner_text карточек зависит от видимости элементов
+    "ostrovok": {
+        "block_types": {"image", "media", "font"},
+        "block_hosts": THIRD_PARTY_HOSTS,
+        "url": f"{site_url('ostrovok')}/hotel/russia/western_siberia_irkutsk_oblast_multi/?type_group=hotel",
+    },
+    # Для куки хватает документа и скриптов; тайлы карты не нужны.
+    # Метрику на получении куки не трогаем - без неё сессия может не выдаться
+    "yandex": {
+        "block_types": {"image", "media", "font", "stylesheet"},
+        "block_hosts": THIRD_PARTY_HOSTS + ["maps.yandex.net", "api-maps.yandex.ru"],
+        "bootstrap_allow_hosts": ["mc.yandex.ru"],
+        "url": f"{site_url('yandex')}/hotels/irkutsk-oblast/",
+    },
+}
+
+
+def _host_matches(host, hosts):
+    return any(host == blocked or host.endswith("." + blocked) for blocked in hosts)
+
+
+class ResourceBlocker:
+    def __init__(self, source, bootstrap=False):
+        """
+        Args:
+            source: Имя профиля из PROFILES
+            bootstrap: Контекст только получает куки/сессию - хосты из
+                       bootstrap_allow_hosts профиля не блокируются
+        """
+        profile = PROFILES[source]
+        self.source = source
+        self.block_types = profile["block_types"]
+        self.block_hosts = profile["block_hosts"]
+        if bootstrap:
+            allowed = profile.get("bootstrap_allow_hosts", [])
+            self.block_hosts = [host for host in self.block_hosts if host not in allowed]
+        self.navigations = []
+        # Пропущенные запросы, ждущие ответа: request -> навигация
+        self._pending = {}
+
+    def should_block(self, request):
+        if request.resource_type in self.block_types:
+            return True
+        return _host_matches(urlparse(request.url).hostname or "", self.block_hosts)
+
+    def _count(self, request, blocked):
+        # Новая навигация главного фрейма открывает новую строку статистики
+        if request.is_navigation_request() and request.frame.parent_frame is None:
+            self.navigations.append(_new_navigation(request.url))
+        if not self.navigations:
+            self.navigations.append(_new_navigation(""))
+        navigation = self.navigations[-1]
+        if blocked:
+            navigation["blocked"] += 1
+            blocked_types = navigation["blocked_types"]
+            blocked_types[request.resource_type] = blocked_types.get(request.resource_type, 0) + 1
+        else:
+            navigation["allowed"] += 1
+            self._pending[request] = navigation
+
+    def _on_request_finished(self, request):
+        # Размер тела считается по факту (responseBodySize), Content-Length часто не приходит
+        navigation = self._pending.pop(request, None)
+        if navigation is not None:
+            navigation["bytes"] += max(request.sizes()["responseBodySize"], 0)
+
+    async def _on_request_finished_async(self, request):
+        navigation = self._pending.pop(request, None)
+        if navigation is not None:
+            navigation["bytes"] += max((await request.sizes())["responseBodySize"], 0)
+
+    def _on_request_failed(self, request):
+        self._pending.pop(request, None)
+
+    def _on_load(self, page):
+        # Время навигации - от запроса документа до события load
+        if self.navigations and self.navigations[-1]["seconds"] is None:
+            navigation = self.navigations[-1]
+            navigation["seconds"] = time.perf_counter() - navigation["started_at"]
+
+    def _watch_pages(self, context):
+        for page in context.pages:
+            page.on("load", self._on_load)
+        context.on("page", lambda page: page.on("load", self._on_load))
+        context.on("requestfailed", self._on_request_failed)
+
+    def _handle(self, route):
+        blocked = self.should_block(route.request)
+        self._count(route.request, blocked)
+        if blocked:
+            route.abort()
+        else:
+            route.continue_()
+
+    async def _handle_async(self, route):
+        blocked = self.should_block(route.request)
+        self._count(route.request, blocked)
+        if blocked:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def install(self, context):
+        """Подключает профиль к контексту (sync API)"""
+        context.route("**/*", self._handle)
+        context.on("requestfinished", self._on_request_finished)
+        self._watch_pages(context)
+        return context
+
+    async def install_async(self, context):
+        """Подключает профиль к контексту (async API)"""
+        await context.route("**/*", self._handle_async)
+        context.on("requestfinished", self._on_request_finished_async)
+        self._watch_pages(context)
+        return context
+
+    def print_report(self):
+        """
+        Запросы, байты и время каждой навигации с профилем и последний замер
+        compare_profile той же страницы без профиля и с ним
+        """
+        for navigation in self.navigations:
+            types = ", ".join(f"{name}: {count}" for name, count in sorted(navigation["blocked_types"].items()))
+            seconds = navigation["seconds"]
+            print(
+                f"Блокировка {self.source}: {navigation['url'][:80]} - "
+                f"пропущено {navigation['allowed']} ({navigation['bytes'] / 1024:.0f} КБ), "
+                f"заблокировано {navigation['blocked']}"
+                + (f" ({types})" if types else "")
+                + (f", до load {seconds:.2f} с" if seconds is not None else ", load не дождались")
+            )
+        measurement = load_measurement(self.source)
+        if measurement:
+            print(
+                f"Замер {self.source} от {measurement['measured_at']}: на навигацию "
+                f"без профиля {measurement['full_bytes'] / 1024:.0f} КБ за {measurement['full_seconds']:.2f} с, "
+                f"с профилем {measurement['blocked_bytes'] / 1024:.0f} КБ за {measurement['blocked_seconds']:.2f} с; "
+                f"экономия {(measurement['full_bytes'] - measurement['blocked_bytes']) / 1024:.0f} КБ "
+                f"и {measurement['full_seconds'] - measurement['blocked_seconds']:.2f} с"
+            )
+        elif self.navigations:
+            print(f"Экономия профиля {self.source} не замерена: python common/resource_blocking.py {self.source}")
+
+
+def _new_navigation(url):
+    return {
+        "url": url,
+        "allowed": 0,
+        "blocked": 0,
+        "blocked_types": {},
+        "bytes": 0,
+        "started_at": time.perf_counter(),
+        "seconds": None
+    }
+
+
+def load_measurement(source, path=None):
+    """Последний замер compare_profile для источника или None"""
+    path = Path(path) if path else MEASUREMENTS_PATH
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get(source)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Не удалось прочитать {path.name}: {e}")
+        return None
+
+
+def save_measurement(source, measurement, path=None):
+    """Сохраняет замер compare_profile для источника рядом с остальными"""
+    path = Path(path) if path else MEASUREMENTS_PATH
+    measurements = {}
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                measurements = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            measurements = {}
+    measurements[source] = measurement
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(measurements, f, ensure_ascii=False, indent=2)
+
+
+def _measure_navigation(browser, url, blocker=None):
+    """Время загрузки страницы до load и фактический объём тел ответов"""
+    context = browser.new_context()
+    if blocker:
+        blocker.install(context)
+    page = context.new_page()
+    transferred = {"bytes": 0}
+
+    def on_request_finished(request):
+        transferred["bytes"] += max(request.sizes()["responseBodySize"], 0)
+
+    page.on("requestfinished", on_request_finished)
+    started_at = time.perf_counter()
+    page.goto(url, wait_until="load", timeout=60000)
+    seconds = time.perf_counter() - started_at
+    context.close()
+    return transferred["bytes"], seconds
+
+
+def compare_profile(browser, source, url=None):
+    """
+    Загружает страницу источника без профиля и с ним, печатает сэкономленные
+    байты и время и сохраняет замер для отчётов ResourceBlocker.print_report
+    """
+    url = url or PROFILES[source]["url"]
+    full_bytes, full_seconds = _measure_navigation(browser, url)
+    blocker = ResourceBlocker(source)
+    blocked_bytes, blocked_seconds = _measure_navigation(browser, url, blocker)
+    save_measurement(source, {
+        "url": url,
+        "measured_at": datetime.now().isoformat(timespec="seconds"),
+        "full_bytes": full_bytes,
+        "full_seconds": full_seconds,
+        "blocked_bytes": blocked_bytes,
+        "blocked_seconds": blocked_seconds
+    })
+    blocker.print_report()
+
+
+if __name__ == "__main__":
+    from playwright.sync_api import sync_playwright
+
+    sources = sys.argv[1:] or list(PROFILES)
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        for source in sources:
+            compare_profile(browser, source)
+        browser.close()
@@ -0,0 +1,106 @@
+"""
+Дисковый кэш браузерных сессий.
+
+Для каждого источника хранится storage state Playwright (куки и localStorage)
+со сроком годности. При старте сессия берётся из кэша и проверяется дешёвым
+пробным запросом; браузер запускается, только если кэша нет, он просрочен
+или пробный запрос отклонён.
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+from common.cassette import get_cassette
+
+DEFAULT_SESSION_DIR = Path(__file__).resolve().parents[1] / "sessions"
+DEFAULT_TTL = 6 * 60 * 60
+
+
+class SessionCache:
+    def __init__(self, source, ttl=DEFAULT_TTL, directory=None):
+        """
+        Args:
+            source: Имя источника, например "ostrovok"
+            ttl: Срок годности сессии, секунды
+            directory: Каталог для файлов сессий
+        """
+        self.source = source
+        self.ttl = ttl
+        self.directory = Path(directory) if directory else DEFAULT_SESSION_DIR
+        self.path = self.directory / f"{source}.json"
+
+    def load(self):
+        """Возвращает storage state из кэша или None, если его нет или он просрочен"""
+        if not self.path.exists():
+            return None
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Не удалось прочитать сессию {self.path.name}: {e}")
+            return None
+        if cached.get("expires_at", 0) <= time.time():
+            print(f"Сессия {self.source} в кэше просрочена")
+            return None
+        return cached.get("storage_state")
+
+    def save(self, storage_state):
+        """Атомарно сохраняет storage state со сроком годности ttl"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        saved_at = time.time()
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "saved_at": saved_at,
+                "expires_at": saved_at + self.ttl,
+                "storage_state": storage_state
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def invalidate(self):
+        """Удаляет сессию из кэша"""
+        if self.path.exists():
+            self.path.unlink()
+
+    @staticmethod
+    def cookies(storage_state):
+        """Куки из storage state в виде {name: value}"""
+        return {cookie["name"]: cookie["value"] for cookie in storage_state.get("cookies", [])}
+
+    @staticmethod
+    def apply(http, storage_state):
+        """Переносит куки из storage state в общий HTTP-клиент с их доменами"""
+        for cookie in storage_state.get("cookies", []):
+            http.update_cookies({cookie["name"]: cookie["value"]}, domain=cookie.get("domain", ""))
+
+    def get_or_create(self, launch, probe=None):
+        """
+        Возвращает рабочую сессию: из кэша, если она прошла probe, иначе из launch().
+
+        Args:
+            launch: Функция без аргументов, которая запускает браузер и возвращает storage state
+            probe: Функция storage_state -> bool, пробный запрос с сессией из кэша
+        """
+        started_at = time.perf_counter()
+        storage_state = self.load()
+        cassette = get_cassette()
+        if cassette and cassette.replaying:
+            # Ответы придут из кассеты, куки не нужны и браузер не запускается
+            return storage_state or {"cookies": [], "origins": []}
+        if storage_state is not None:
+            try:
+                valid = probe is None or probe(storage_state)
+            except Exception as e:
+                print(f"Ошибка проверки сессии {self.source}: {e}")
+                valid = False
+            if valid:
+                print(f"Сессия {self.source} взята из кэша за {time.perf_counter() - started_at:.2f} с")
+                return storage_state
+            print(f"Сессия {self.source} из кэша отклонена, запускаем браузер")
+            self.invalidate()
+
+        storage_state = launch()
+        self.save(storage_state)
+        print(f"Новая сессия {self.source} получена за {time.perf_counter() - started_at:.2f} с")
+        return storage_state
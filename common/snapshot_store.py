@@ -0,0 +1,104 @@
+"""
+Хранилище снимков отелей в SQLite.
+
+Один снимок - запись об отеле источника на дату сбора. Повторный сбор
+в тот же день обновляет снимок (upsert по (source, hotel_id, scrape_date)),
+поэтому историю можно запрашивать между прогонами без переписывания CSV.
+База работает в режиме WAL: чтение не блокирует пишущий парсер.
+"""
+import json
+import sqlite3
+from datetime import date, datetime
+from pathlib import Path
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parents[1] / "hotels.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshots (
+    source TEXT NOT NULL,
+    hotel_id TEXT NOT NULL,
+    scrape_date TEXT NOT NULL,
+    scraped_at TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (source, hotel_id, scrape_date)
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_hotel ON snapshots (hotel_id, scrape_date);
+CREATE INDEX IF NOT EXISTS idx_snapshots_date ON snapshots (scrape_date, source);
+"""
+
+UPSERT_SQL = """
+INSERT INTO snapshots (source, hotel_id, scrape_date, scraped_at, data)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (source, hotel_id, scrape_date) DO UPDATE SET
+    scraped_at = excluded.scraped_at,
+    data = excluded.data
+"""
+
+
+class SnapshotStore:
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path) if db_path else DEFAULT_DB_PATH
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def upsert(self, source, records, id_key="id", scrape_date=None):
+        """
+        Записывает записи одной транзакцией.
+
+        Args:
+            source: Имя источника, например "tvil"
+            records: Итерируемое словарей (может быть генератором)
+            id_key: Ключ с идентификатором отеля в записи, либо функция record -> id
+            scrape_date: Дата сбора (по умолчанию - сегодня)
+
+        Returns:
+            Количество записанных записей
+        """
+        if scrape_date is None:
+            scrape_date = date.today()
+        if not isinstance(scrape_date, str):
+            scrape_date = scrape_date.isoformat()
+        scraped_at = datetime.now().isoformat(timespec="seconds")
+        get_id = id_key if callable(id_key) else (lambda record: record.get(id_key, ""))
+        count = 0
+
+        def rows():
+            nonlocal count
+            for record in records:
+                hotel_id = get_id(record)
+                if hotel_id is None or hotel_id == "":
+                    continue
+                count += 1
+                yield (source, str(hotel_id), scrape_date, scraped_at, json.dumps(record, ensure_ascii=False))
+
+        with self.conn:
+            self.conn.executemany(UPSERT_SQL, rows())
+        return count
+
+    def history(self, source, hotel_id):
+        """Все снимки отеля по датам сбора"""
+        cursor = self.conn.execute(
+            "SELECT scrape_date, data FROM snapshots WHERE source = ? AND hotel_id = ? ORDER BY scrape_date",
+            (source, str(hotel_id))
+        )
+        return [(scrape_date, json.loads(data)) for scrape_date, data in cursor]
+
+    def snapshot(self, source, scrape_date):
+        """Все отели источника на дату сбора"""
+        cursor = self.conn.execute(
+            "SELECT hotel_id, data FROM snapshots WHERE source = ? AND scrape_date = ? ORDER BY hotel_id",
+            (source, scrape_date)
+        )
+        return [json.loads(data) for _, data in cursor]
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,385 @@
+"""
+Локальная заглушка API ТВИЛ, Ostrovok и Яндекс Путешествий для нагрузочных прогонов.
+
+Отвечает в формате боевых эндпоинтов, которые используют парсеры:
+
+    GET  /api/entities                     - ТВИЛ, пагинация page[offset]/page[limit], meta.total
+    POST /hotel/search/v1/site/hp/search   - Ostrovok, тарифы одного отеля по полю hotel
+    GET  /api/hotels/searchHotels          - Яндекс, bbox, navigationToken и опрос pollIteration
+
+Остальные GET отдают HTML-страницу с кукой сессии (стартовые страницы и пробные
+запросы парсеров). Данные синтезируются из выгрузок в репозитории:
+tvil_parser/tvil_hotels.csv, ostrovok_parser/hotels_rooms.csv и
+yandex_parser/yandex_json/page_*.json, при необходимости размноженных до
+заданного числа отелей. Задержка, доля ошибок 503 и доля страниц антибота
+настраиваются:
+
+    python common/standin_server.py --port 8765 --latency-ms 80 --error-rate 0.02 --challenge-rate 0.01
+
+Парсеры направляются на заглушку через <SOURCE>_BASE_URL (см. common/endpoints.py)
+или аргумент site_url.
+"""
+import argparse
+import copy
+import csv
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+TVIL_CSV = REPO_ROOT / "tvil_parser" / "tvil_hotels.csv"
+OSTROVOK_ROOMS_CSV = REPO_ROOT / "ostrovok_parser" / "hotels_rooms.csv"
+YANDEX_JSON_DIR = REPO_ROOT / "yandex_parser" / "yandex_json"
+
+# Область поиска Яндекса, по которой раскладываются синтетические отели
+YANDEX_REGION_BBOX = (104.13056255102043, 51.54264369120642, 107.37870529166668, 53.505019898537164)
+
+CHALLENGE_HTML = (
+    "<!DOCTYPE html><html><head><title>Проверка</title></head>"
+    "<body><form action=\"/checkcaptcha\">Подтвердите, что запросы отправляли вы, а не робот</form></body></html>"
+)
+
+SESSION_HTML = "<!DOCTYPE html><html><head><title>Заглушка</title></head><body>stand-in</body></html>"
+
+# Колонки CSV ТВИЛ, которые в ответе API лежат во вложенных объектах
+TVIL_NESTED = {
+    "price": ["price_min", "price_max"],
+    "daily_rubles_price": ["daily_price_min", "daily_price_max"],
+    "currency": {"id": "currency_id", "title": "currency_title", "symbol": "currency_symbol"},
+    "food_type": {"label": "food_type_label", "text_short": "food_type_text_short", "text_full": "food_type_text_full"},
+    "status": {"enabled": "status_enabled", "checked": "status_checked", "deleted": "status_deleted"},
+    "owner": {"first_time": "owner_first_time", "update_time": "owner_update_time"},
+}
+
+
+def _typed(value):
+    """Значение из CSV в типе, в котором его отдаёт API"""
+    if value in ("True", "False"):
+        return value == "True"
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _read_csv(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def tvil_entity_from_row(row):
+    """Сущность JSON:API ТВИЛ из строки выгрузки tvil_hotels.csv"""
+    nested_columns = set()
+    attributes = {}
+    for name, columns in TVIL_NESTED.items():
+        if isinstance(columns, list):
+            attributes[name] = [_typed(row[column]) for column in columns if row.get(column)]
+            nested_columns.update(columns)
+        else:
+            attributes[name] = {key: _typed(row.get(column, "")) for key, column in columns.items()}
+            nested_columns.update(columns.values())
+    for column, value in row.items():
+        if column in nested_columns or column in ("id", "url"):
+            continue
+        if column == "params":
+            attributes[column] = json.loads(value) if value else {}
+        else:
+            attributes[column] = _typed(value)
+    return {"id": row["id"], "type": "entities", "attributes": attributes}
+
+
+def build_tvil_entities(count=None, path=TVIL_CSV):
+    """Сущности ТВИЛ из выгрузки; count больше строк - строки повторяются с новыми id"""
+    templates = [tvil_entity_from_row(row) for row in _read_csv(path)]
+    count = count or len(templates)
+    entities = []
+    for index in range(count):
+        entity = copy.deepcopy(templates[index % len(templates)])
+        if index >= len(templates):
+            entity["id"] = str(9000000 + index)
+        entities.append(entity)
+    return entities
+
+
+def ostrovok_rate_from_row(row):
+    """Тариф в формате ответа hp/search из строки выгрузки hotels_rooms.csv"""
+    payment_types = [
+        {"type": value.split("/")[0], "by": value.split("/")[1] if "/" in value else ""}
+        for value in row["payment_types"].split(", ") if value
+    ]
+    policies = []
+    if row["cancellation_penalty_percent"]:
+        policies.append({"penalty": {"percent": row["cancellation_penalty_percent"]}})
+    return {
+        "hash": row["rate_hash"],
+        "payment_options": {
+            "payment_types": [{"amount": row["price_rub"], "show_amount": row["price_rub"]}],
+            "allowed_payment_types": payment_types,
+        },
+        "cancellation_info": {
+            "free_cancellation_before": row["free_cancellation_before"] + "T00:00:00" if row["free_cancellation_before"] else None,
+            "policies": policies,
+        },
+        "no_show": {"penalty": {"amount": row["no_show_penalty"]}} if row["no_show_penalty"] else {},
+        "rooms": [{
+            "room_name": row["room_name"],
+            "room_data_trans": {"ru": {"main_room_type": row["room_type"], "bedding_type": row["bedding_type"]}},
+            "bed_places": {"main_count": _typed(row["main_bed_count"]), "extra_count": _typed(row["extra_bed_count"])},
+            "meal_data": {"meals": [{"has_breakfast": row["has_breakfast"] == "Да", "value": row["meal_type"]}]},
+            "serp_filters": row["amenities"].split(", ") if row["amenities"] else [],
+            "allotment": _typed(row["allotment"]),
+            "rg_hash": _typed(row["rg_hash"]),
+            "multi_bed_data": json.loads(row["multi_bed_data"]) if row["multi_bed_data"] else [],
+        }],
+    }
+
+
+def build_ostrovok_hotels(path=OSTROVOK_ROOMS_CSV):
+    """Ответы hp/search по отелям выгрузки: {hotel_id: ответ}"""
+    hotels = {}
+    for row in _read_csv(path):
+        hotel = hotels.setdefault(row["hotel_id"], {
+            "ota_hotel_id": row["hotel_id"],
+            "master_id": _typed(row["master_id"]),
+            "rates": [],
+        })
+        if row["rate_hash"]:
+            hotel["rates"].append(ostrovok_rate_from_row(row))
+    return hotels
+
+
+def build_yandex_hotels(count=None, directory=YANDEX_JSON_DIR, seed=0):
+    """
+    Отели Яндекса по образцу сохранённых страниц выдачи; при count больше образцов
+    копии получают свой permalink и случайные координаты внутри области поиска.
+    """
+    templates = []
+    for path in sorted(directory.glob("page_*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            templates.extend(json.load(f)["data"]["hotels"])
+    count = count or len(templates)
+    rng = random.Random(seed)
+    min_lon, min_lat, max_lon, max_lat = YANDEX_REGION_BBOX
+    hotels = []
+    for index in range(count):
+        hotel_item = templates[index % len(templates)]
+        if index >= len(templates):
+            hotel_item = copy.deepcopy(hotel_item)
+            hotel_item["hotel"]["permalink"] = str(900000000000 + index)
+            hotel_item["hotel"]["coordinates"] = {
+                "lon": rng.uniform(min_lon, max_lon),
+                "lat": rng.uniform(min_lat, max_lat),
+            }
+        hotels.append(hotel_item)
+    return hotels
+
+
+def _in_bbox(hotel_item, bbox):
+    coordinates = hotel_item.get("hotel", {}).get("coordinates") or {}
+    lon, lat = coordinates.get("lon"), coordinates.get("lat")
+    if lon is None or lat is None:
+        return True
+    return bbox[0] <= lon <= bbox[2] and bbox[1] <= lat <= bbox[3]
+
+
+def _parse_bbox(value):
+    try:
+        south_west, north_east = value.split("~")
+        return tuple(map(float, south_west.split(","))) + tuple(map(float, north_east.split(",")))
+    except ValueError:
+        return YANDEX_REGION_BBOX
+
+
+class StandInState:
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, challenge_rate=0.0, challenge_status=200,
+                 yandex_polls=2, yandex_poll_delay_ms=200, tvil_hotels=None, yandex_hotels=None, seed=0):
+        """
+        Args:
+            latency_ms, jitter_ms: Задержка ответа API и её случайный разброс, миллисекунды
+            error_rate: Доля ответов 503
+            challenge_rate: Доля ответов страницей антибота вместо JSON
+            challenge_status: HTTP-статус страницы антибота (200 - как капча Яндекса, 403 - как блокировка)
+            yandex_polls: С какого опроса (pollIteration) поиск Яндекса считается завершённым
+            yandex_poll_delay_ms: nextPollingRequestDelayMs в незавершённых ответах
+            tvil_hotels, yandex_hotels: Сколько отелей отдавать (None - как в выгрузке)
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.challenge_rate = challenge_rate
+        self.challenge_status = challenge_status
+        self.yandex_polls = yandex_polls
+        self.yandex_poll_delay_ms = yandex_poll_delay_ms
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.tvil_entities = build_tvil_entities(tvil_hotels)
+        self.ostrovok_hotels = build_ostrovok_hotels()
+        self.ostrovok_templates = list(self.ostrovok_hotels.values())
+        self.yandex_hotels = build_yandex_hotels(yandex_hotels, seed=seed)
+        self.counters = {"requests": 0, "errors": 0, "challenges": 0}
+
+    def roll(self):
+        """Исход запроса: None - обычный ответ, "error" или "challenge"; заодно задержка"""
+        with self.rng_lock:
+            self.counters["requests"] += 1
+            delay = max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            value = self.rng.random()
+            outcome = None
+            if value < self.error_rate:
+                outcome = "error"
+                self.counters["errors"] += 1
+            elif value < self.error_rate + self.challenge_rate:
+                outcome = "challenge"
+                self.counters["challenges"] += 1
+        time.sleep(delay)
+        return outcome
+
+    def tvil_page(self, query):
+        offset = int(query.get("page[offset]", ["0"])[0])
+        limit = int(query.get("page[limit]", ["20"])[0])
+        return {
+            "data": self.tvil_entities[offset:offset + limit],
+            "included": [],
+            "meta": {"total": len(self.tvil_entities)},
+        }
+
+    def ostrovok_search(self, payload):
+        hotel_id = str(payload.get("hotel", ""))
+        hotel = self.ostrovok_hotels.get(hotel_id)
+        if hotel is None:
+            # Незнакомый отель получает тарифы одного из известных, выбранного по его id
+            template = self.ostrovok_templates[zlib.crc32(hotel_id.encode("utf-8")) % len(self.ostrovok_templates)]
+            hotel = dict(template, ota_hotel_id=hotel_id)
+        return hotel
+
+    def yandex_search(self, query):
+        bbox = _parse_bbox(query.get("bbox", [""])[0])
+        offset = int(query.get("navigationToken", ["0"])[0] or 0)
+        page_size = int(query.get("pageHotelCount", ["50"])[0])
+        poll_iteration = int(query.get("pollIteration", ["0"])[0])
+        poll_epoch = int(query.get("pollEpoch", ["0"])[0])
+        finished = poll_iteration + 1 >= self.yandex_polls
+
+        found = [hotel_item for hotel_item in self.yandex_hotels if _in_bbox(hotel_item, bbox)]
+        hotels = []
+        for hotel_item in found[offset:offset + page_size]:
+            hotel_item = dict(hotel_item, searchIsFinished=finished)
+            if not finished:
+                hotel_item["offers"] = []
+            hotels.append(hotel_item)
+        next_offset = offset + page_size if offset + page_size < len(found) else offset
+        return {
+            "data": {
+                "pollEpoch": poll_epoch,
+                "pollIteration": poll_iteration,
+                "navigationTokens": {
+                    "nextPage": str(next_offset),
+                    "prevPage": str(max(0, offset - page_size)) if offset else "",
+                    "currentPage": str(offset),
+                },
+                "bboxAsString": "{},{}~{},{}".format(*bbox),
+                "foundHotelCount": len(found),
+                "pricedHotelCount": len(found) if finished else 0,
+                "offerSearchProgress": {"finished": finished},
+                "nextPollingRequestDelayMs": None if finished else self.yandex_poll_delay_ms,
+                "hotels": hotels,
+            },
+            "error": None,
+        }
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        data = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Set-Cookie", "standin_session=1; Path=/")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_api(self, build):
+        outcome = self.state.roll()
+        if outcome == "error":
+            self._send(503, json.dumps({"error": "Service Unavailable"}), "application/json")
+        elif outcome == "challenge":
+            self._send(self.state.challenge_status, CHALLENGE_HTML, "text/html; charset=utf-8")
+        else:
+            self._send(200, json.dumps(build(), ensure_ascii=False), "application/json; charset=utf-8")
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        if parsed.path == "/api/entities":
+            self._send_api(lambda: self.state.tvil_page(query))
+        elif parsed.path == "/api/hotels/searchHotels":
+            self._send_api(lambda: self.state.yandex_search(query))
+        else:
+            self._send(200, SESSION_HTML, "text/html; charset=utf-8")
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if parsed.path == "/hotel/search/v1/site/hp/search":
+            try:
+                payload = json.loads(body or b"{}")
+            except json.JSONDecodeError:
+                self._send(400, json.dumps({"error": "bad json"}), "application/json")
+                return
+            self._send_api(lambda: self.state.ostrovok_search(payload))
+        else:
+            self._send(404, json.dumps({"error": "not found"}), "application/json")
+
+
+def make_server(host="127.0.0.1", port=8765, **settings):
+    """HTTP-сервер заглушки; serve_forever() запускает его в текущем потоке"""
+    handler = type("BoundStandInHandler", (StandInHandler,), {"state": StandInState(**settings)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальная заглушка API ТВИЛ, Ostrovok и Яндекс Путешествий")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--challenge-rate", type=float, default=0.0)
+    parser.add_argument("--challenge-status", type=int, default=200)
+    parser.add_argument("--yandex-polls", type=int, default=2)
+    parser.add_argument("--tvil-hotels", type=int, default=None)
+    parser.add_argument("--yandex-hotels", type=int, default=None)
+    args = parser.parse_args()
+
+    server = make_server(
+        args.host, args.port,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, challenge_rate=args.challenge_rate, challenge_status=args.challenge_status,
+        yandex_polls=args.yandex_polls, tvil_hotels=args.tvil_hotels, yandex_hotels=args.yandex_hotels,
+    )
+    state = server.RequestHandlerClass.state
+    base = f"http://{args.host}:{args.port}"
+    print(
+        f"Заглушка на {base}: ТВИЛ {len(state.tvil_entities)} отелей, Ostrovok {len(state.ostrovok_hotels)} отелей, "
+        f"Яндекс {len(state.yandex_hotels)} отелей"
+    )
+    print(f"Парсеры: TVIL_BASE_URL={base} OSTROVOK_BASE_URL={base} YANDEX_BASE_URL={base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Запросов: {state.counters['requests']}, ошибок: {state.counters['errors']}, страниц антибота: {state.counters['challenges']}")
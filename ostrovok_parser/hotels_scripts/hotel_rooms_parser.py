@@ -1,20 +1,47 @@
 from playwright.sync_api import sync_playwright
-import requests
 import csv
 import json
 import os
+import sys
 import uuid
+from pathlib import Path
 from urllib.parse import urlparse
 
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.columnar import ParquetWriter, parquet_path_for
+from common.http_client import get_shared_client
+from common.resource_blocking import ResourceBlocker
+from common.endpoints import site_url
+from common.request_executor import RequestExecutor
+from common.session_cache import SessionCache
+
 
 class OstrovokParserAdvanced:
-    def __init__(self):
-        self.session = requests.Session()
-        self.api_url = "https://ostrovok.ru/hotel/search/v1/site/hp/search"
+    def __init__(self, hedge=False, site=None):
+        self.http = get_shared_client()
+        # site - адрес сайта вместо https://ostrovok.ru (например, локальной заглушки)
+        self.site = site_url("ostrovok", site)
+        # Поиск цен ничего не меняет на сайте, поэтому его можно повторять и дублировать
+        self.executor = RequestExecutor("ostrovok", hedge=hedge)
+        self.session_cache = SessionCache("ostrovok")
+        self.api_url = f"{self.site}/hotel/search/v1/site/hp/search"
         self.cookies = None
     
     def get_cookies_from_browser(self):
-        """Получение куки через реальный браузер"""
+        """
+        Получение куки: из кэша сессии, если она ещё принимается сайтом,
+        иначе через реальный браузер.
+        """
+        storage_state = self.session_cache.get_or_create(self._launch_browser_session, self._probe_session)
+        self.session_cache.apply(self.http, storage_state)
+        self.cookies = self.session_cache.cookies(storage_state)
+        
+        print(f"Получено {len(self.cookies)} куки")
+        return self.cookies
+    
+    def _launch_browser_session(self):
+        """Открывает ostrovok.ru в браузере и возвращает storage state (куки и localStorage)"""
         print("Запуск браузера для получения куки...")
         
         with sync_playwright() as p:
@@ -23,18 +50,27 @@ class OstrovokParserAdvanced:
                 viewport={'width': 1920, 'height': 1080},
                 user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             )
+            blocker = ResourceBlocker("ostrovok")
+            blocker.install(context)
             
             page = context.new_page()
-            page.goto('https://ostrovok.ru')
-            
-            # Получаем куки
-            cookies = context.cookies()
-            self.cookies = {cookie['name']: cookie['value'] for cookie in cookies}
+            page.goto(self.site)
             
+            storage_state = context.storage_state()
+            blocker.print_report()
             browser.close()
-            
-        print(f"Получено {len(self.cookies)} куки")
-        return self.cookies
+        
+        return storage_state
+    
+    def _probe_session(self, storage_state):
+        """Пробный запрос с куки из кэша: антибот отвечает на отклонённую сессию не 200"""
+        self.session_cache.apply(self.http, storage_state)
+        response = self.http.get(
+            f'{self.site}/',
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'},
+            timeout=10
+        )
+        return response.status_code == 200
 
     def _extract_hotel_id(self, hotel_url):
         """Достаем слаг отеля из URL (последний сегмент пути)."""
@@ -55,8 +91,8 @@ class OstrovokParserAdvanced:
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Content-Type': 'application/json',
             'Accept': 'application/json',
-            'Origin': 'https://ostrovok.ru',
-            'Referer': 'https://ostrovok.ru/'
+            'Origin': self.site,
+            'Referer': f'{self.site}/'
         }
         
         payload = {
@@ -71,13 +107,12 @@ class OstrovokParserAdvanced:
         }
         
         try:
-            response = requests.post(
+            response = self.executor.run(lambda timeout: self.http.post(
                 self.api_url,
                 json=payload,
                 headers=headers,
-                cookies=self.cookies,
-                timeout=30
-            )
+                timeout=timeout
+            ))
             
             if response.status_code == 200:
                 return response.json()
@@ -91,8 +126,10 @@ class OstrovokParserAdvanced:
 
 
 class CsvHandler:
-    def __init__(self, output_csv):
+    def __init__(self, output_csv, parquet=False):
         self.output_csv = output_csv
+        self.parquet = parquet
+        self.parquet_writer = None
         self.fieldnames = [
             "hotel_id",
             "master_id",
@@ -124,6 +161,17 @@ class CsvHandler:
             with open(self.output_csv, "w", newline="", encoding="utf-8-sig") as csvfile:
                 writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
                 writer.writeheader()
+        
+        # Parquet нельзя дописывать, поэтому файл пишется заново за прогон, группами строк
+        if self.parquet:
+            self.parquet_writer = ParquetWriter(parquet_path_for(self.output_csv), "ostrovok_rooms", self.fieldnames)
+    
+    def close(self):
+        """Дописывает последнюю группу строк и закрывает Parquet файл"""
+        if self.parquet_writer:
+            self.parquet_writer.close()
+            print(f"Сохранено {self.parquet_writer.count} номеров в {self.parquet_writer.path}")
+            self.parquet_writer = None
     
     def read_hotels_from_csv(self, csv_path):
         """Читает список отелей из CSV файла"""
@@ -288,6 +336,8 @@ class CsvHandler:
         with open(self.output_csv, "a", newline="", encoding="utf-8-sig") as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames)
             writer.writerows(rooms_data)
+        if self.parquet_writer:
+            self.parquet_writer.write_rows(rooms_data)
     
     def process_hotel(self, parser, hotel_row, checkin_date, checkout_date):
         """Обрабатывает один отель: извлекает ID, запрашивает данные и сохраняет в CSV"""
@@ -318,17 +368,23 @@ def run_for_hotels_list(
     checkin_date="2026-01-25",
     checkout_date="2026-01-26",
     output_csv=r"c:\Users\matve\Desktop\Accommodation-monitoring\ostrovok_parser\hotels_rooms.csv",
+    parquet=False,
 ):
     """Основная функция для парсинга номеров отелей из списка"""
     parser = OstrovokParserAdvanced()
     parser.get_cookies_from_browser()
 
-    csv_handler = CsvHandler(output_csv)
+    csv_handler = CsvHandler(output_csv, parquet=parquet)
     csv_handler.initialize_csv_file()
     hotels = csv_handler.read_hotels_from_csv(csv_path)
     
-    for hotel_row in hotels:
-        csv_handler.process_hotel(parser, hotel_row, checkin_date, checkout_date)
+    try:
+        for hotel_row in hotels:
+            csv_handler.process_hotel(parser, hotel_row, checkin_date, checkout_date)
+    finally:
+        csv_handler.close()
+    parser.http.rate_limiters.print_report()
+    parser.executor.print_report()
 
 
 if __name__ == "__main__":
@@ -3,8 +3,20 @@ import time
 import sys
 import json
 import csv
+from pathlib import Path
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from common.browser_wait import PageWaiter
+from common.endpoints import site_url
+from common.ostrovok_serp import NETWORK_MODE_WARNING, SerpCapture, card_problem, extract_cards, print_crawl_report
+from common.rate_limit import get_host_limiters, paced_goto
+from common.resource_blocking import ResourceBlocker
+
+
+SITE = site_url('ostrovok')
+SEARCH_URL = f"{SITE}/hotel/russia/western_siberia_irkutsk_oblast_multi/?type_group=hotel"
 
 # Настройка stdout для корректного вывода Юникода
 if sys.stdout.encoding != 'utf-8':
@@ -18,7 +30,8 @@ def close_search_popup(page):
         btn = page.locator('button[aria-label*="close" i]').first
         if btn.count() > 0 and btn.is_visible():
             btn.click()
-            time.sleep(0.5)
+            # Ждём, пока попап исчезнет, а не фиксированную паузу
+            btn.wait_for(state="hidden", timeout=5000)
             print("Popup closed: Close button clicked")
         else:
             print("Popup not closed: Close button not found or not visible")
@@ -45,6 +58,7 @@ def get_hotel_cards(page):
     """
     Извлекает данные отелей из карточек на странице.
     Возвращает список словарей с полной информацией об отелях.
+    Все карточки разбираются одним вызовом page.evaluate.
     """
     hotels = []
 
@@ -52,87 +66,49 @@ def get_hotel_cards(page):
         # Ждём появления хотя бы одной карточки
         page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
 
-        # Находим все карточки отелей по контейнеру
-        hotel_cards = page.query_selector_all('[data-testid="serp-hotelcard"]')
-
-        for card in hotel_cards:
-            try:
-                hotel_data = {}
-                
-                # Название отеля и ссылка на страницу
-                name_link = card.query_selector('a[data-testid="hotel-card-name"]')
-                if name_link:
-                    hotel_data['name'] = name_link.inner_text().strip()
-                    href = name_link.get_attribute('href')
-                    if href:
-                        # Формируем полный URL
-                        if href.startswith('/'):
-                            hotel_data['detail_url'] = f"https://ostrovok.ru{href}"
-                        else:
-                            hotel_data['detail_url'] = href
-                else:
-                    continue
-
-                if not hotel_data.get('name'):
-                    continue
-
-                # Адрес
-                address_el = card.query_selector('[data-testid="hotel-card-distance-address"]')
-                hotel_data['address'] = address_el.inner_text().strip() if address_el else ""
-
-                # Ссылка "Показать все номера"
-                show_rooms_link = card.query_selector('a[data-testid="next-step-button"]')
-                if show_rooms_link:
-                    rooms_href = show_rooms_link.get_attribute('href')
-                    if rooms_href:
-                        if rooms_href.startswith('/'):
-                            hotel_data['show_rooms_url'] = f"https://ostrovok.ru{rooms_href}"
-                        else:
-                            hotel_data['show_rooms_url'] = rooms_href
-                    else:
-                        hotel_data['show_rooms_url'] = ""
-                else:
-                    hotel_data['show_rooms_url'] = ""
-
-                # Минимальная цена за ночь
-                price_value_el = card.query_selector('[data-testid="hotel-card-price-value"]')
-                price_desc_el = card.query_selector('[data-testid="hotel-card-rate-description"]')
-                if price_value_el and price_desc_el:
-                    price_value = price_value_el.inner_text().strip()
-                    price_desc = price_desc_el.inner_text().strip()
-                    hotel_data['min_price'] = f"{price_value} {price_desc}".strip()
-                else:
-                    hotel_data['min_price'] = ""
-
-                # Оценка по отзывам (число)
-                rating_content_el = card.query_selector('[data-testid="hotel-card-rating-content"]')
-                if rating_content_el:
-                    rating_text = rating_content_el.inner_text().strip()
-                    # Заменяем запятую на точку для числового значения
-                    hotel_data['rating'] = rating_text.replace(',', '.')
-                else:
-                    hotel_data['rating'] = ""
-
-                # Текстовая категория оценки
-                rating_category_el = card.query_selector('.HotelRating_ratingCategory__cNoZe')
-                if rating_category_el:
-                    hotel_data['rating_category'] = rating_category_el.inner_text().strip()
-                else:
-                    hotel_data['rating_category'] = ""
-
-                # Количество отзывов
-                reviews_count_el = card.query_selector('.HotelRating_reviewsCount__3YYVd')
-                if reviews_count_el:
-                    hotel_data['reviews_count'] = reviews_count_el.inner_text().strip()
-                else:
-                    hotel_data['reviews_count'] = ""
-
-                hotels.append(hotel_data)
-
-            except Exception as e:
-                print(f"Error extracting hotel data: {e}")
+        for card in extract_cards(page):
+            # Без названия карточка не нужна; ошибки разбора печатаем и идём дальше
+            problem = card_problem(card, required_fields=["name"])
+            if problem or not card['name']:
+                print(f"Error extracting hotel data (card {card['index']}): {problem or 'пустое название'}")
                 continue
 
+            hotel_data = {}
+
+            # Название отеля и ссылка на страницу
+            hotel_data['name'] = card['name']
+            href = card['href']
+            if href:
+                # Формируем полный URL
+                hotel_data['detail_url'] = f"{SITE}{href}" if href.startswith('/') else href
+
+            # Адрес
+            hotel_data['address'] = card['address'] or ""
+
+            # Ссылка "Показать все номера"
+            rooms_href = card['show_rooms_href']
+            if rooms_href:
+                hotel_data['show_rooms_url'] = f"{SITE}{rooms_href}" if rooms_href.startswith('/') else rooms_href
+            else:
+                hotel_data['show_rooms_url'] = ""
+
+            # Минимальная цена за ночь
+            if card['price_value'] is not None and card['price_desc'] is not None:
+                hotel_data['min_price'] = f"{card['price_value']} {card['price_desc']}".strip()
+            else:
+                hotel_data['min_price'] = ""
+
+            # Оценка по отзывам (число), запятую заменяем на точку
+            hotel_data['rating'] = (card['rating'] or "").replace(',', '.')
+
+            # Текстовая категория оценки
+            hotel_data['rating_category'] = card['rating_category'] or ""
+
+            # Количество отзывов
+            hotel_data['reviews_count'] = card['reviews_count'] or ""
+
+            hotels.append(hotel_data)
+
         return hotels
 
     except Exception as e:
@@ -155,21 +131,30 @@ def goto_page(page, page_number):
 
     print(f"Navigating to page {page_number}: {new_url}")
     try:
-        page.goto(new_url, timeout=60000, wait_until="domcontentloaded")
-        # Ждем немного для загрузки контента
-        time.sleep(1)
+        paced_goto(page, new_url, timeout=60000, wait_until="domcontentloaded")
     except Exception as e:
         print(f"Error navigating to page {page_number}: {e}")
         raise
 
 
-def paginate_and_extract_all_hotels(page, hotels):
+def wait_for_cards(page, waiter, expected_count=None):
+    """
+    Ждёт отрисовки карточек: полной страницы, если её размер уже известен,
+    иначе пока число карточек не перестанет меняться.
+    """
+    page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
+    return waiter.for_count("cards", '[data-testid="serp-hotelcard"]', expected_count=expected_count)
+
+
+def paginate_and_extract_all_hotels(page, hotels, waiter=None, cards_per_page=None):
     """
     Обходит номера страниц (1, 2, 3, ...), пока в пагинации
     существует ссылка на следующую страницу.
     Собирает все отели со всех страниц без удаления дубликатов
     и без дополнительного объединения информации.
+    cards_per_page - число карточек на полной странице (по первой странице).
     """
+    waiter = waiter or PageWaiter(page)
 
     while True:
         try:
@@ -194,14 +179,12 @@ def paginate_and_extract_all_hotels(page, hotels):
             # Переходим на следующую страницу через параметр ?page=
             goto_page(page, next_page)
 
-            # Единоразовая загрузка карточек (scroll + wait)
+            # Единоразовая загрузка карточек: прокрутка запускает ленивую отрисовку,
+            # дальше ждём, пока все карточки появятся
+            page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
             page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-            time.sleep(1)
+            wait_for_cards(page, waiter, cards_per_page)
             page.evaluate("window.scrollTo(0, 0)")
-            time.sleep(0.5)
-            page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
-
-            time.sleep(1.0)
 
             # Собираем отели на новой странице (как есть, без удаления дубликатов)
             current_hotels = get_hotel_cards(page)
@@ -221,84 +204,146 @@ def paginate_and_extract_all_hotels(page, hotels):
     return hotels
 
 
-def get_hotels_list():
-    """Основная функция: собирает список всех отелей и сохраняет в JSON/CSV."""
+def page_url(page_number, base_url=None):
+    """URL страницы результатов page_number с сохранением остальных query-параметров"""
+    parsed = urlparse(base_url or SEARCH_URL)
+    qs = parse_qs(parsed.query)
+    qs["page"] = [str(page_number)]
+    return urlunparse(parsed._replace(query=urlencode(qs, doseq=True)))
+
+
+def capture_hotels_from_network(page):
+    """
+    Собирает отели из ответов поискового XHR страницы выдачи, без ожидания карточек.
+    Записи приводятся к полям get_hotel_cards (detail_url, min_price).
+    """
+    hotels = []
+    waiter = PageWaiter(page)
+    capture = SerpCapture(page)
+    started_at = time.perf_counter()
+    pages = 0
+
+    for page_number, page_hotels in capture.iter_pages(waiter, page_url):
+        hotels.extend(page_hotels)
+        pages += 1
+        print(f"Captured {len(page_hotels)} hotels on page {page_number}.")
+
+    print_crawl_report("network", pages, time.perf_counter() - started_at, hotels)
+    waiter.print_summary()
+
+    for hotel in hotels:
+        hotel['detail_url'] = hotel.pop('url')
+        hotel['min_price'] = hotel.pop('price')
+    return hotels
+
+
+def get_hotels_list(mode="dom"):
+    """
+    Основная функция: собирает список всех отелей и сохраняет в JSON/CSV.
+    mode: "dom" - из карточек на странице, "network" - из ответов поискового XHR
+    (не проверен на живом сайте; если отелей не нашлось, сбор идёт из DOM).
+    """
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=False)
-        page = browser.new_page()
+        blocker = ResourceBlocker("ostrovok")
+        page = blocker.install(browser.new_context()).new_page()
+
+        hotels = []
+        if mode == "network":
+            print(NETWORK_MODE_WARNING)
+            hotels = capture_hotels_from_network(page)
+            if not hotels:
+                print("В ответах XHR отелей не найдено, переходим на сбор из DOM")
+        if not hotels:
+            hotels = get_hotels_from_dom(page)
+
+        save_hotels_list(hotels)
+
+        blocker.print_report()
+        get_host_limiters().print_report()
+        browser.close()
 
-        page.goto(
-            "https://ostrovok.ru/hotel/russia/western_siberia_irkutsk_oblast_multi/?type_group=hotel"
-        )
 
-        # Небольшая пауза для первичной загрузки
-        time.sleep(1)
+def get_hotels_from_dom(page):
+    """Собирает отели из карточек на страницах выдачи."""
+    started_at = time.perf_counter()
+    waiter = PageWaiter(page)
+    page.goto(SEARCH_URL)
+    page.wait_for_selector('body', timeout=10000)
 
-        # Закрываем возможные попапы
-        close_search_popup(page)
+    # Закрываем возможные попапы
+    close_search_popup(page)
 
-        # Ждём появления карточек
-        page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
-        time.sleep(2)
+    # Ждём, пока карточки на первой странице перестанут дорисовываться
+    wait_for_cards(page, waiter)
 
-        # Сохраняем HTML (для отладки и анализа разметки)
-        save_page_html(page, "page.html")
+    # Сохраняем HTML (для отладки и анализа разметки)
+    save_page_html(page, "page.html")
 
-        # Отели на первой странице
-        hotels = get_hotel_cards(page)
+    # Отели на первой странице
+    hotels = get_hotel_cards(page)
 
-        # Переход по страницам и сбор всех отелей
-        hotels = paginate_and_extract_all_hotels(page, hotels)
+    # Переход по страницам и сбор всех отелей; полная страница - как первая
+    hotels = paginate_and_extract_all_hotels(page, hotels, waiter, cards_per_page=len(hotels) or None)
 
-        # Сохраняем в JSON
-        with open('hotels_list.json', 'w', encoding='utf-8') as f:
-            json.dump(hotels, f, ensure_ascii=False, indent=2)
+    # Номер последней открытой страницы = число обойдённых страниц.
+    # Отчёт считается по именам полей OstrovokHotelsParser (url, price)
+    pages = int(parse_qs(urlparse(page.url).query).get("page", ["1"])[0])
+    report_hotels = [dict(hotel, url=hotel.get('detail_url', ''), price=hotel.get('min_price', '')) for hotel in hotels]
+    print_crawl_report("dom", pages, time.perf_counter() - started_at, report_hotels)
+    waiter.print_summary()
+    return hotels
 
-        print(f"\nHotels list saved to hotels_list.json ({len(hotels)} hotels)")
 
-        # Сохраняем в CSV: все поля отеля
-        # Используем quoting для правильного экранирования значений с запятыми
-        with open('hotels_list.csv', 'w', encoding='utf-8-sig', newline='') as csv_file:
-            writer = csv.writer(csv_file, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+def save_hotels_list(hotels):
+    """Сохраняет список отелей в hotels_list.json и hotels_list.csv."""
+    # Сохраняем в JSON
+    with open('hotels_list.json', 'w', encoding='utf-8') as f:
+        json.dump(hotels, f, ensure_ascii=False, indent=2)
+
+    print(f"\nHotels list saved to hotels_list.json ({len(hotels)} hotels)")
+
+    # Сохраняем в CSV: все поля отеля
+    # Используем quoting для правильного экранирования значений с запятыми
+    with open('hotels_list.csv', 'w', encoding='utf-8-sig', newline='') as csv_file:
+        writer = csv.writer(csv_file, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+        writer.writerow([
+            'hotel_name', 
+            'address', 
+            'detail_url', 
+            'show_rooms_url', 
+            'min_price', 
+            'rating', 
+            'rating_category', 
+            'reviews_count'
+        ])
+        for hotel in hotels:
             writer.writerow([
-                'hotel_name', 
-                'address', 
-                'detail_url', 
-                'show_rooms_url', 
-                'min_price', 
-                'rating', 
-                'rating_category', 
-                'reviews_count'
+                hotel.get('name', ''), 
+                hotel.get('address', ''),
+                hotel.get('detail_url', ''),
+                hotel.get('show_rooms_url', ''),
+                hotel.get('min_price', ''),
+                hotel.get('rating', ''),
+                hotel.get('rating_category', ''),
+                hotel.get('reviews_count', '')
             ])
-            for hotel in hotels:
-                writer.writerow([
-                    hotel.get('name', ''), 
-                    hotel.get('address', ''),
-                    hotel.get('detail_url', ''),
-                    hotel.get('show_rooms_url', ''),
-                    hotel.get('min_price', ''),
-                    hotel.get('rating', ''),
-                    hotel.get('rating_category', ''),
-                    hotel.get('reviews_count', '')
-                ])
-
-        print(f"Hotels list also saved to hotels_list.csv ({len(hotels)} rows)")
-
-        # Печатаем список (если консоль позволяет)
-        try:
-            print("\nHotels list (first 10):")
-            for i, hotel in enumerate(hotels[:10], 1):
-                address_info = f" ({hotel.get('address', '')})" if hotel.get('address') else ""
-                rating_info = f" | Рейтинг: {hotel.get('rating', 'N/A')} ({hotel.get('rating_category', 'N/A')})" if hotel.get('rating') else ""
-                price_info = f" | {hotel.get('min_price', '')}" if hotel.get('min_price') else ""
-                print(f"{i}. {hotel['name']}{address_info}{rating_info}{price_info}")
-            if len(hotels) > 10:
-                print(f"... and {len(hotels) - 10} more")
-        except UnicodeEncodeError:
-            print(f"\nTotal hotels: {len(hotels)}")
-            print("(Full list saved to hotels_list.json and hotels_list.csv)")
 
-        browser.close()
+    print(f"Hotels list also saved to hotels_list.csv ({len(hotels)} rows)")
+
+    # Печатаем список (если консоль позволяет)
+    try:
+        print("\nHotels list (first 10):")
+        for i, hotel in enumerate(hotels[:10], 1):
+            address_info = f" ({hotel.get('address', '')})" if hotel.get('address') else ""
+            rating_info = f" | Рейтинг: {hotel.get('rating', 'N/A')} ({hotel.get('rating_category', 'N/A')})" if hotel.get('rating') else ""
+            price_info = f" | {hotel.get('min_price', '')}" if hotel.get('min_price') else ""
+            print(f"{i}. {hotel['name']}{address_info}{rating_info}{price_info}")
+        if len(hotels) > 10:
+            print(f"... and {len(hotels) - 10} more")
+    except UnicodeEncodeError:
+        print(f"\nTotal hotels: {len(hotels)}")
+        print("(Full list saved to hotels_list.json and hotels_list.csv)")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,93 @@
+"""
+Микробенчмарк разбора карточек выдачи Ostrovok: по элементам против одного page.evaluate.
+
+Страница берётся из сохранённого HTML выдачи (его пишет save_page_html в
+irkoblhotelparser2.py), поэтому сеть не нужна и оба способа видят один и тот же DOM.
+
+    python ostrovok_parser_refactoring/bench_card_extraction.py page.html 20
+"""
+from playwright.sync_api import sync_playwright
+import sys
+import time
+from pathlib import Path
+
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.ostrovok_serp import card_problem, extract_cards
+
+# Настройка stdout для корректного вывода Юникода
+if sys.stdout.encoding != 'utf-8':
+    sys.stdout.reconfigure(encoding='utf-8')
+
+# Селекторы прежнего разбора: query_selector + inner_text/get_attribute на каждое поле
+PER_ELEMENT_FIELDS = [
+    ('name', 'a[data-testid="hotel-card-name"]', None),
+    ('href', 'a[data-testid="hotel-card-name"]', 'href'),
+    ('show_rooms_href', 'a[data-testid="next-step-button"]', 'href'),
+    ('address', '[data-testid="hotel-card-distance-address"]', None),
+    ('price_value', '[data-testid="hotel-card-price-value"]', None),
+    ('price_desc', '[data-testid="hotel-card-rate-description"]', None),
+    ('rating', '[data-testid="hotel-card-rating-content"]', None),
+    ('rating_category', '.HotelRating_ratingCategory__cNoZe', None),
+    ('reviews_count', '.HotelRating_reviewsCount__3YYVd', None),
+]
+
+
+def extract_cards_per_element(page):
+    """Прежний способ: отдельный CDP-вызов на каждый элемент и каждое чтение"""
+    cards = []
+    for index, card in enumerate(page.query_selector_all('[data-testid="serp-hotelcard"]')):
+        record = {'index': index}
+        for field, selector, attribute in PER_ELEMENT_FIELDS:
+            element = card.query_selector(selector)
+            if element is None:
+                record[field] = None
+            elif attribute:
+                record[field] = element.get_attribute(attribute)
+            else:
+                record[field] = element.inner_text().strip()
+        cards.append(record)
+    return cards
+
+
+def measure(name, extract, page, repeats):
+    """Среднее и лучшее время разбора страницы, мс"""
+    timings = []
+    for _ in range(repeats):
+        started_at = time.perf_counter()
+        cards = extract(page)
+        timings.append((time.perf_counter() - started_at) * 1000)
+    accepted = sum(1 for card in cards if card_problem(card) is None)
+    print(
+        f"{name}: {len(cards)} карточек ({accepted} без ошибок), "
+        f"в среднем {sum(timings) / len(timings):.1f} мс на страницу, лучшее {min(timings):.1f} мс"
+    )
+    return cards
+
+
+def run_benchmark(html_path="page.html", repeats=10):
+    html = Path(html_path).read_text(encoding='utf-8')
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.set_content(html, wait_until="domcontentloaded")
+
+        before = measure("по элементам", extract_cards_per_element, page, repeats)
+        after = measure("один page.evaluate", extract_cards, page, repeats)
+
+        # Оба способа должны видеть одни и те же значения
+        fields = [field for field, _, _ in PER_ELEMENT_FIELDS]
+        mismatches = sum(
+            1 for old, new in zip(before, after)
+            if any(old[field] != new[field] for field in fields)
+        )
+        print(f"Карточек с расхождениями: {mismatches}")
+
+        browser.close()
+
+
+if __name__ == "__main__":
+    html_path = sys.argv[1] if len(sys.argv) > 1 else "page.html"
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    run_benchmark(html_path, repeats)
@@ -1,71 +1,146 @@
 from playwright.sync_api import sync_playwright
 import time
 import sys
-import json
 import csv
+from pathlib import Path
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.browser_wait import PageWaiter
+from common.checkpoint import CheckpointStore
+from common.endpoints import site_url
+from common.ostrovok_serp import NETWORK_MODE_WARNING, SerpCapture, card_problem, extract_cards, print_crawl_report
+from common.rate_limit import get_host_limiters, paced_goto
+from common.resource_blocking import ResourceBlocker
+from common.snapshot_store import SnapshotStore
+
+# Номер последней страницы по ссылкам пагинации (?page=N) на текущей странице
+LAST_PAGE_JS = """
+() => Math.max(1, ...Array.from(document.querySelectorAll('a[href*="page="]'))
+    .map(link => parseInt(link.innerText.trim(), 10))
+    .filter(number => !isNaN(number)))
+"""
+
 # Настройка stdout для корректного вывода Юникода
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 class OstrovokHotelsParser:
-    def __init__(self):
-        self.api_url = "https://ostrovok.ru/hotel/search/v1/site/hp/search"
+    def __init__(self, db_path=None, site=None):
+        # site - адрес сайта вместо https://ostrovok.ru (например, локальной заглушки)
+        self.site = site_url("ostrovok", site)
+        self.api_url = f"{self.site}/hotel/search/v1/site/hp/search"
         self.all_hotels = []
         self.current_page = 1
-        self.base_url = "https://ostrovok.ru/hotel/russia/western_siberia_irkutsk_oblast_multi/?type_group=hotel"
+        self.base_url = f"{self.site}/hotel/russia/western_siberia_irkutsk_oblast_multi/?type_group=hotel"
+        self.checkpoint = CheckpointStore("ostrovok_hotels")
+        self.db_path = db_path
+        self.waiter = None
+        # Карточек на полной странице выдачи; на последней их может быть меньше
+        self.cards_per_page = None
+        self.pages_crawled = 0
     
-    def get_all_hotels_list(self):
+    def get_all_hotels_list(self, storage="csv", mode="dom", workers=1):
+        """
+        Собирает список отелей со всех страниц выдачи.
+        storage: "csv" (hotels_list.csv), "sqlite" (база снимков) или "both".
+        mode: "dom" - из карточек на странице, "network" - из ответов поискового XHR
+        без ожидания отрисовки (не проверен на живом сайте; если отелей не
+        нашлось, обход продолжается в режиме dom).
+        workers: в режиме dom при N > 1 страницы выдачи грузятся параллельно в N вкладках.
+        """
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=False)
-            page = browser.new_page()
+            blocker = ResourceBlocker("ostrovok")
+            context = blocker.install(browser.new_context())
+            page = context.new_page()
+            self.waiter = PageWaiter(page)
+            started_at = time.perf_counter()
 
-            # --- Переходим на страницу с отелями ---
-            page.goto(self.base_url)
-            page.wait_for_selector('body', timeout=10000) # Ждем загрузки страницы
+            if mode == "network":
+                print(NETWORK_MODE_WARNING)
+                completed = self._capture_all_hotels_from_network(page)
+                if not self.all_hotels:
+                    print("В ответах XHR отелей не найдено, переходим на сбор из DOM")
+                    mode = "dom"
+            if mode != "network":
+                # --- Переходим на страницу с отелями ---
+                page.goto(self.base_url)
+                page.wait_for_selector('body', timeout=10000) # Ждем загрузки страницы
 
-            # --- Закрываем попапы ---
-            self._close_popup(page)
+                # --- Закрываем попапы ---
+                self._close_popup(page)
 
-            # Ждём появления карточек на первой странице
-            page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
-            time.sleep(2)
+                # Ждём, пока карточки на первой странице перестанут дорисовываться
+                page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
+                self._wait_for_cards(page)
 
-            self._paginate_and_extract_all_hotels(page)
+                if workers > 1:
+                    completed = self._paginate_parallel(page, workers)
+                else:
+                    completed = self._paginate_and_extract_all_hotels(page)
 
+            print_crawl_report(mode, self.pages_crawled, time.perf_counter() - started_at, self.all_hotels)
+            self.waiter.print_summary()
+            blocker.print_report()
+            get_host_limiters().print_report()
 
-            # --- Сохраняем данные в CSV ---
-            with open('hotels_list.csv', 'w', encoding='utf-8-sig', newline='') as csv_file:
-                writer = csv.writer(csv_file, delimiter=';', quoting=csv.QUOTE_MINIMAL)
-                writer.writerow([
-                    'hotel_name', 
-                    'address', 
-                    'url', 
-                    'show_rooms_url', 
-                    'price', 
-                    'rating', 
-                    'rating_category', 
-                    'reviews_count'
-                ])
-                for hotel in self.all_hotels:
-                    writer.writerow([
-                        hotel.get('name', ''), 
-                        hotel.get('address', ''),
-                        hotel.get('url', ''),
-                        hotel.get('show_rooms_url', ''),
-                        hotel.get('price', ''),
-                        hotel.get('rating', ''),
-                        hotel.get('rating_category', ''),
-                        hotel.get('reviews_count', '')
-                    ])
+            # --- Сохраняем данные в CSV и/или SQLite ---
+            if storage in ("csv", "both"):
+                self._save_to_csv()
+            if storage in ("sqlite", "both"):
+                self._save_to_db()
             
-            print(f"Сохранено {len(self.all_hotels)} отелей в hotels_list.csv")
+            # После полного прохода контрольная точка больше не нужна
+            if completed:
+                self.checkpoint.clear()
             
         browser.close()
         return self.all_hotels
             
 
+    def _save_to_csv(self):
+        with open('hotels_list.csv', 'w', encoding='utf-8-sig', newline='') as csv_file:
+            writer = csv.writer(csv_file, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow([
+                'hotel_name', 
+                'address', 
+                'url', 
+                'show_rooms_url', 
+                'price', 
+                'rating', 
+                'rating_category', 
+                'reviews_count'
+            ])
+            for hotel in self.all_hotels:
+                writer.writerow([
+                    hotel.get('name', ''), 
+                    hotel.get('address', ''),
+                    hotel.get('url', ''),
+                    hotel.get('show_rooms_url', ''),
+                    hotel.get('price', ''),
+                    hotel.get('rating', ''),
+                    hotel.get('rating_category', ''),
+                    hotel.get('reviews_count', '')
+                ])
+        
+        print(f"Сохранено {len(self.all_hotels)} отелей в hotels_list.csv")
+
+    def _save_to_db(self):
+        """Сохраняет снимок списка отелей за сегодня в SQLite (upsert по слагу отеля из URL)"""
+        def hotel_id(hotel):
+            # В режиме network слаг уже есть в записи как hotel_id
+            if hotel.get('hotel_id'):
+                return hotel['hotel_id']
+            path = urlparse(hotel.get('url', '')).path.rstrip('/')
+            return path.split('/')[-1] if path else None
+        
+        with SnapshotStore(self.db_path) as store:
+            count = store.upsert("ostrovok", self.all_hotels, id_key=hotel_id)
+        
+        print(f"Сохранено {count} отелей в {store.db_path.name}")
+
     def _close_popup(self, page):
         try:
             btn = page.locator('button[aria-label*="close"]').first
@@ -82,46 +157,42 @@ class OstrovokHotelsParser:
         try:
             page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
             
-            hotel_cards = page.query_selector_all('[data-testid="serp-hotelcard"]')
-
-            for card in hotel_cards:
-                try:
-                    hotel_data = {}
+            # Все карточки за один вызов page.evaluate
+            for card in extract_cards(page):
+                problem = card_problem(card)
+                if problem:
+                    print(f"Error getting hotel data (card {card['index']}): {problem}")
+                    continue
 
-                    # Название отеля и ссылка на страницу
-                    hotel_data['name'] = card.query_selector('a[data-testid="hotel-card-name"]').inner_text().strip()
-                    hotel_data['href'] = card.query_selector('a[data-testid="hotel-card-name"]').get_attribute('href')
+                hotel_data = {}
 
-                    # Полная ссылка на страницу отеля
-                    hotel_data['url'] = f"https://ostrovok.ru{hotel_data['href']}"
+                # Название отеля и ссылка на страницу
+                hotel_data['name'] = card['name']
+                hotel_data['href'] = card['href']
 
-                    # Ссылка "Показать все номера"
-                    hotel_data['show_rooms_url'] = card.query_selector('a[data-testid="next-step-button"]').get_attribute('href')
+                # Полная ссылка на страницу отеля
+                hotel_data['url'] = f"{self.site}{hotel_data['href']}"
 
-                    # Адрес отеля
-                    hotel_data['address'] = card.query_selector('[data-testid="hotel-card-distance-address"]').inner_text().strip() 
+                # Ссылка "Показать все номера"
+                hotel_data['show_rooms_url'] = card['show_rooms_href']
 
-                    # Минимальная цена за ночь и валюта
-                    price_value_el = card.query_selector('[data-testid="hotel-card-price-value"]').inner_text().strip()
-                    price_desc_el = card.query_selector('[data-testid="hotel-card-rate-description"]').inner_text().strip()
-                    price_value = price_value_el.replace('\u202f', '').replace('\xa0', '').strip()
-                    hotel_data['price'] = f"{price_value} {price_desc_el}"
-                    
-                    # Оценка по отзывам (число)
-                    hotel_data['rating'] = card.query_selector('[data-testid="hotel-card-rating-content"]').inner_text().strip()
-                    hotel_data['rating'] = hotel_data['rating'].replace(',', '.')
+                # Адрес отеля
+                hotel_data['address'] = card['address']
 
-                    # Текстовая категория оценки
-                    hotel_data['rating_category'] = card.query_selector('.HotelRating_ratingCategory__cNoZe').inner_text().strip()
+                # Минимальная цена за ночь и валюта
+                price_value = card['price_value'].replace('\u202f', '').replace('\xa0', '').strip()
+                hotel_data['price'] = f"{price_value} {card['price_desc']}"
+                
+                # Оценка по отзывам (число)
+                hotel_data['rating'] = card['rating'].replace(',', '.')
 
-                    # Количество отзывов
-                    hotel_data['reviews_count'] = card.query_selector('.HotelRating_reviewsCount__3YYVd').inner_text().strip()
-                    
-                    hotels.append(hotel_data)
+                # Текстовая категория оценки
+                hotel_data['rating_category'] = card['rating_category']
 
-                except Exception as e:
-                    print(f"Error getting hotel data: {e}")
-                    continue
+                # Количество отзывов
+                hotel_data['reviews_count'] = card['reviews_count']
+                
+                hotels.append(hotel_data)
 
         except Exception as e:
             print(f"Error getting hotel cards: {e}")
@@ -129,29 +200,94 @@ class OstrovokHotelsParser:
         
         return hotels
 
-    def _goto_page(self, page, page_number):
-        current_url = page.url
-        parsed = urlparse(current_url)
+    def _page_url(self, page_number, current_url=None):
+        """URL страницы выдачи page_number с сохранением остальных query-параметров"""
+        parsed = urlparse(current_url or self.base_url)
         qs = parse_qs(parsed.query)
         qs["page"] = [str(page_number)]
         new_query = urlencode(qs, doseq=True)
-        new_url = urlunparse(parsed._replace(query=new_query))
+        return urlunparse(parsed._replace(query=new_query))
+
+    def _goto_page(self, page, page_number):
+        new_url = self._page_url(page_number, page.url)
         
         print(f"Navigating to page {page_number}: {new_url}")
         try:
-            page.goto(new_url, timeout=60000, wait_until="domcontentloaded")
-            time.sleep(1)
+            paced_goto(page, new_url, timeout=60000, wait_until="domcontentloaded")
         except Exception as e:
             print(f"Error navigating to page {page_number}: {e}")
             raise
 
-    def _paginate_and_extract_all_hotels(self, page):
-        # Собираем отели на первой странице
-        hotels = self._get_hotel_cards(page)
-        if hotels:
+    def _wait_for_cards(self, page, waiter=None):
+        """
+        Ждёт отрисовки карточек: полной страницы, если её размер уже известен,
+        иначе пока число карточек не перестанет меняться.
+        """
+        return (waiter or self.waiter).for_count(
+            "cards",
+            '[data-testid="serp-hotelcard"]',
+            expected_count=self.cards_per_page
+        )
+
+    def _load_cards(self, page, waiter=None):
+        """
+        Единоразовая загрузка карточек на открытой странице: прокрутка запускает
+        ленивую отрисовку, дальше ждём, пока все карточки появятся.
+        """
+        page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
+        page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+        self._wait_for_cards(page, waiter)
+        page.evaluate("window.scrollTo(0, 0)")
+
+    def _capture_all_hotels_from_network(self, page):
+        """
+        Обходит страницы выдачи, собирая отели из ответов поискового XHR.
+        Карточки не ждём и не разбираем; контрольная точка та же, что и в режиме DOM.
+        Возвращает True, если обход дошёл до последней страницы.
+        """
+        capture = SerpCapture(page, self.site)
+        start_page = 1
+        state = self.checkpoint.load()
+        if state:
+            self.all_hotels = self.checkpoint.load_records()
+            start_page = state['page'] + 1
+            print(f"Resuming from checkpoint: page {start_page}, {len(self.all_hotels)} hotels collected.")
+        
+        seen_ids = [hotel.get('hotel_id') or hotel.get('url') for hotel in self.all_hotels]
+        for page_number, hotels in capture.iter_pages(self.waiter, self._page_url, start_page, seen_ids):
             self.all_hotels.extend(hotels)
-            print(f"Extracted {len(hotels)} hotels on page 1.")
+            self.checkpoint.commit(records=hotels, page=page_number)
+            self.pages_crawled += 1
+            print(f"Captured {len(hotels)} hotels on page {page_number}.")
+        
+        print(f"\n=== Total hotels collected from all pages: {len(self.all_hotels)} ===")
+        return capture.completed
+
+    def _paginate_and_extract_all_hotels(self, page):
+        """
+        Обходит страницы выдачи, продолжая с контрольной точки, если она есть.
+        Возвращает True, если обход дошёл до последней страницы.
+        """
+        state = self.checkpoint.load()
+        if state:
+            # Возвращаемся на последнюю сохранённую страницу, дальше цикл пойдёт как обычно
+            self.all_hotels = self.checkpoint.load_records()
+            print(f"Resuming from checkpoint: page {state['page']}, {len(self.all_hotels)} hotels collected.")
+            self._goto_page(page, state['page'])
+            self._close_popup(page)
+            page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
+            self._wait_for_cards(page)
+        else:
+            # Собираем отели на первой странице
+            hotels = self._get_hotel_cards(page)
+            if hotels:
+                self.cards_per_page = len(hotels)
+                self.all_hotels.extend(hotels)
+                self.checkpoint.commit(records=hotels, page=1)
+                self.pages_crawled += 1
+                print(f"Extracted {len(hotels)} hotels on page 1.")
         
+        completed = False
         while True:
             try:
                 # Определяем текущую страницу по URL
@@ -169,6 +305,7 @@ class OstrovokHotelsParser:
                 
                 if next_link.count() == 0:
                     print(f"No link for page {next_page} found. Reached last page.")
+                    completed = True
                     break
                 
                 # Переходим на следующую страницу
@@ -176,12 +313,7 @@ class OstrovokHotelsParser:
                 self._close_popup(page)
                 
                 # Единоразовая загрузка карточек (scroll + wait)
-                page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                time.sleep(1)
-                page.evaluate("window.scrollTo(0, 0)")
-                time.sleep(0.5)
-                page.wait_for_selector('a[data-testid="hotel-card-name"]', timeout=15000)
-                time.sleep(1.0)
+                self._load_cards(page)
                 
                 # Собираем отели на новой странице
                 hotels = self._get_hotel_cards(page)
@@ -191,6 +323,8 @@ class OstrovokHotelsParser:
                     break
                 else:
                     self.all_hotels.extend(hotels)
+                    self.checkpoint.commit(records=hotels, page=next_page)
+                    self.pages_crawled += 1
                     print(f"Extracted {len(hotels)} hotels on page {next_page}.")
                 
             except Exception as e:
@@ -198,8 +332,85 @@ class OstrovokHotelsParser:
                 break
         
         print(f"\n=== Total hotels collected from all pages: {len(self.all_hotels)} ===")
-        return self.all_hotels
-    
+        return completed
+
+    def _paginate_parallel(self, page, workers):
+        """
+        Читает номер последней страницы один раз и раздаёт оставшиеся страницы
+        пулу из workers вкладок того же браузера. Вкладка i обрабатывает страницы
+        i, i + workers, ...: пока разбирается одна, остальные уже грузятся.
+        Отели и контрольные точки фиксируются строго в порядке страниц.
+        Возвращает True, если обход дошёл до последней страницы.
+        """
+        state = self.checkpoint.load()
+        if state:
+            self.all_hotels = self.checkpoint.load_records()
+            next_page = state['page'] + 1
+            print(f"Resuming from checkpoint: page {next_page}, {len(self.all_hotels)} hotels collected.")
+        else:
+            # Первая страница уже открыта
+            hotels = self._get_hotel_cards(page)
+            if not hotels:
+                print("Warning: no hotels found on page 1.")
+                return False
+            self.cards_per_page = len(hotels)
+            self.all_hotels.extend(hotels)
+            self.checkpoint.commit(records=hotels, page=1)
+            self.pages_crawled += 1
+            print(f"Extracted {len(hotels)} hotels on page 1.")
+            next_page = 2
+        
+        last_page = page.evaluate(LAST_PAGE_JS)
+        page_numbers = list(range(next_page, last_page + 1))
+        print(f"Last page: {last_page}, pages left: {len(page_numbers)}, tabs: {workers}")
+        if not page_numbers:
+            return True
+        
+        tabs = [page] + [page.context.new_page() for _ in range(min(workers, len(page_numbers)) - 1)]
+        waiters = [self.waiter] + [PageWaiter(tab) for tab in tabs[1:]]
+        
+        def start(index):
+            # goto до commit: старый документ уже выгружен, остальное грузится параллельно с другими вкладками
+            tab = tabs[index % len(tabs)]
+            page_number = page_numbers[index]
+            print(f"Navigating tab {index % len(tabs)} to page {page_number}")
+            paced_goto(tab, self._page_url(page_number), timeout=60000, wait_until="commit")
+        
+        completed = False
+        try:
+            for index in range(len(tabs)):
+                start(index)
+            
+            for index, page_number in enumerate(page_numbers):
+                tab = tabs[index % len(tabs)]
+                print(f"\n--- Page {page_number} ---")
+                self._close_popup(tab)
+                self._load_cards(tab, waiters[index % len(tabs)])
+                hotels = self._get_hotel_cards(tab)
+                
+                # Вкладка свободна - сразу отправляем её за следующей своей страницей
+                if index + len(tabs) < len(page_numbers):
+                    start(index + len(tabs))
+                
+                if not hotels:
+                    print(f"Warning: no hotels found on page {page_number}.")
+                    break
+                self.all_hotels.extend(hotels)
+                self.checkpoint.commit(records=hotels, page=page_number)
+                self.pages_crawled += 1
+                print(f"Extracted {len(hotels)} hotels on page {page_number}.")
+            else:
+                completed = True
+        except Exception as e:
+            print(f"Error paginating and extracting hotels: {e}")
+        finally:
+            for tab, waiter in zip(tabs[1:], waiters[1:]):
+                self.waiter.timings.extend(waiter.timings)
+                tab.close()
+        
+        print(f"\n=== Total hotels collected from all pages: {len(self.all_hotels)} ===")
+        return completed
+
 if __name__ == "__main__":
     parser = OstrovokHotelsParser()
     parser.get_all_hotels_list()
\ No newline at end of file
@@ -5,10 +5,21 @@ import json
 import csv
 import os
 import uuid
-import requests
+import asyncio
+from pathlib import Path
 from urllib.parse import urlparse
 from datetime import date, timedelta
 
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.http_client import get_shared_client
+from common.checkpoint import CheckpointStore
+from common.endpoints import site_url
+from common.request_executor import RequestExecutor
+from common.snapshot_store import SnapshotStore
+from common.resource_blocking import ResourceBlocker
+from common.session_cache import SessionCache
+
 # Настройка stdout для корректного вывода Юникода
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
@@ -19,13 +30,54 @@ start_date = today_date + timedelta(days=1)
 end_date = today_date + timedelta(days=2)
 
 class OstrovokRoomsParser:
-    def __init__(self):
-        self.session = requests.Session()
-        self.api_url = "https://ostrovok.ru/hotel/search/v1/site/hp/search"
+    def __init__(self, db_path=None, hedge=False, site=None):
+        self.http = get_shared_client()
+        # site - адрес сайта вместо https://ostrovok.ru (например, локальной заглушки)
+        self.site = site_url("ostrovok", site)
+        # Поиск цен ничего не меняет на сайте, поэтому его можно повторять и дублировать
+        self.executor = RequestExecutor("ostrovok", hedge=hedge)
+        self.session_cache = SessionCache("ostrovok")
+        self.db_path = db_path
+        self.api_url = f"{self.site}/hotel/search/v1/site/hp/search"
         self.cookies = None
+        self.fieldnames = [
+            "hotel_id",
+            "master_id",
+            "rate_hash",
+            "rg_hash",
+            "multi_bed_data",
+            "room_name",
+            "room_type",
+            "allotment",
+            "bedding_type",
+            "main_bed_count",
+            "extra_bed_count",
+            "has_breakfast",
+            "meal_type",
+            "amenities",
+            "price_rub",
+            "payment_types",
+            "free_cancellation_before",
+            "cancellation_penalty_percent",
+            "no_show_penalty"
+        ]
+        # В режиме календаря каждая строка дополнительно привязана к дате заезда и длительности
+        self.sweep_fieldnames = ["checkin_date", "checkout_date", "nights"] + self.fieldnames
     
     def get_cookies_from_browser(self):
-        """Получение куки через реальный браузер"""
+        """
+        Получение куки: из кэша сессии, если она ещё принимается сайтом,
+        иначе через реальный браузер.
+        """
+        storage_state = self.session_cache.get_or_create(self._launch_browser_session, self._probe_session)
+        self.session_cache.apply(self.http, storage_state)
+        self.cookies = self.session_cache.cookies(storage_state)
+        
+        print(f"Получено {len(self.cookies)} куки")
+        return self.cookies
+    
+    def _launch_browser_session(self):
+        """Открывает ostrovok.ru в браузере и возвращает storage state (куки и localStorage)"""
         print("Запуск браузера для получения куки...")
         
         with sync_playwright() as p:
@@ -34,18 +86,27 @@ class OstrovokRoomsParser:
                 viewport={'width': 1920, 'height': 1080},
                 user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             )
+            blocker = ResourceBlocker("ostrovok")
+            blocker.install(context)
             
             page = context.new_page()
-            page.goto('https://ostrovok.ru')
-            
-            # Получаем куки
-            cookies = context.cookies()
-            self.cookies = {cookie['name']: cookie['value'] for cookie in cookies}
+            page.goto(self.site)
             
+            storage_state = context.storage_state()
+            blocker.print_report()
             browser.close()
-            
-        print(f"Получено {len(self.cookies)} куки")
-        return self.cookies
+        
+        return storage_state
+    
+    def _probe_session(self, storage_state):
+        """Пробный запрос с куки из кэша: антибот отвечает на отклонённую сессию не 200"""
+        self.session_cache.apply(self.http, storage_state)
+        response = self.http.get(
+            f'{self.site}/',
+            headers={'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'},
+            timeout=10
+        )
+        return response.status_code == 200
 
     def _extract_hotel_id(self, hotel_url):
         """Достаем url-идентификатор отеля из URL (последний сегмент пути)."""
@@ -56,21 +117,19 @@ class OstrovokRoomsParser:
             print(f"Не удалось распарсить url {hotel_url}: {exc}")
             return None
     
-    def search_hotel(self, hotel_id, checkin_date, checkout_date, adults=1):
-        """Поиск с куки из браузера"""
-        
-        if not self.cookies:
-            self.get_cookies_from_browser()
-        
-        headers = {
+    def _build_headers(self):
+        """Заголовки запроса к API поиска номеров"""
+        return {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Content-Type': 'application/json',
             'Accept': 'application/json',
-            'Origin': 'https://ostrovok.ru',
-            'Referer': 'https://ostrovok.ru/'
+            'Origin': self.site,
+            'Referer': f'{self.site}/'
         }
-        
-        payload = {
+
+    def _build_payload(self, hotel_id, checkin_date, checkout_date, adults=1):
+        """Тело запроса к API поиска номеров для одного отеля"""
+        return {
             "arrival_date": checkin_date,
             "departure_date": checkout_date,
             "hotel": hotel_id,
@@ -80,15 +139,23 @@ class OstrovokRoomsParser:
             "paxes": [{"adults": adults}],
             "search_uuid": str(uuid.uuid4())
         }
+
+    def search_hotel(self, hotel_id, checkin_date, checkout_date, adults=1):
+        """Поиск с куки из браузера"""
+        
+        if not self.cookies:
+            self.get_cookies_from_browser()
+        
+        headers = self._build_headers()
+        payload = self._build_payload(hotel_id, checkin_date, checkout_date, adults)
         
         try:
-            response = requests.post(
+            response = self.executor.run(lambda timeout: self.http.post(
                 self.api_url,
                 json=payload,
                 headers=headers,
-                cookies=self.cookies,
-                timeout=30
-            )
+                timeout=timeout
+            ))
             
             if response.status_code == 200:
                 return response.json()
@@ -100,6 +167,26 @@ class OstrovokRoomsParser:
             print(f"Ошибка: {e}")
             return None
 
+    async def search_hotel_async(self, hotel_id, checkin_date, checkout_date, adults=1):
+        """Асинхронный вариант search_hotel поверх общего пула соединений"""
+        payload = self._build_payload(hotel_id, checkin_date, checkout_date, adults)
+
+        try:
+            headers = self._build_headers()
+            response = await self.executor.arun(
+                lambda timeout: self.http.apost(self.api_url, json=payload, headers=headers, timeout=timeout)
+            )
+
+            if response.status_code == 200:
+                return response.json()
+            else:
+                print(f"Ошибка: {response.status_code}")
+                return None
+
+        except Exception as e:
+            print(f"Ошибка: {e}")
+            return None
+
     def extract_room_data(self, json_data):
         """Извлекает данные по каждому номеру из JSON ответа API"""
         rooms_data = []
@@ -258,11 +345,16 @@ class OstrovokRoomsParser:
         
         return hotels
 
-    def process_hotel(self, hotel_row, checkin_date, checkout_date):
-        """Обрабатывает один отель: извлекает ID, запрашивает данные и сохраняет в CSV"""
+    def _hotel_identity(self, hotel_row):
+        """Возвращает (hotel_name, hotel_id) для строки из списка отелей"""
         hotel_url = hotel_row.get("show_rooms_url") or hotel_row.get("url") or hotel_row.get("detail_url")
         hotel_name = hotel_row.get("hotel_name") or hotel_row.get("name") or "unknown"
         hotel_id = self._extract_hotel_id(hotel_url) if hotel_url else None
+        return hotel_name, hotel_id
+
+    def process_hotel(self, hotel_row, checkin_date, checkout_date):
+        """Обрабатывает один отель: извлекает ID, запрашивает данные и сохраняет в CSV"""
+        hotel_name, hotel_id = self._hotel_identity(hotel_row)
 
         if not hotel_id:
             print(f"Пропускаю {hotel_name}: не найден hotel_id")
@@ -278,60 +370,268 @@ class OstrovokRoomsParser:
         rooms_data = self.extract_room_data(result)
         return rooms_data
 
-    def get_all_rooms(self, csv_path, checkin_date, checkout_date, output_csv):
-        """Основная функция для парсинга номеров отелей из списка"""
+    async def process_hotel_async(self, hotel_row, checkin_date, checkout_date):
+        """Асинхронный вариант process_hotel; число запросов в полёте задаёт пул воркеров _run_pool"""
+        hotel_name, hotel_id = self._hotel_identity(hotel_row)
+
+        if not hotel_id:
+            print(f"Пропускаю {hotel_name}: не найден hotel_id")
+            return False
+
+        print(f"Запрашиваю {hotel_name} ({hotel_id})")
+        result = await self.search_hotel_async(hotel_id, checkin_date, checkout_date)
+
+        if not result:
+            print(f"Нет данных для {hotel_name}")
+            return False
+
+        return self.extract_room_data(result)
+
+    async def _run_pool(self, tasks, run_task, concurrency):
+        """
+        Выполняет run_task(task) для всех tasks пулом из concurrency воркеров.
+        Результаты лежат на тех же позициях, что и задачи в tasks.
+        """
+        results = [False] * len(tasks)
+        queue = asyncio.Queue()
+        for index in range(len(tasks)):
+            queue.put_nowait(index)
+
+        async def worker():
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results[index] = await run_task(tasks[index])
+
+        await asyncio.gather(*[worker() for _ in range(min(concurrency, len(tasks)))])
+        return results
+
+    async def _run_batches_async(self, batches, run_task, save_batch, concurrency):
+        """
+        Прогоняет пачки задач одним event loop: каждая пачка выполняется пулом
+        воркеров и сразу сохраняется через save_batch(batch_start, batch, results).
+        Пул соединений закрывается один раз, после последней пачки.
+        """
+        self.http.set_host_limit(urlparse(self.api_url).netloc, concurrency)
+        try:
+            for batch_start, batch in batches:
+                results = await self._run_pool(batch, run_task, concurrency)
+                save_batch(batch_start, batch, results)
+        finally:
+            await self.http.aclose()
+
+    def get_all_rooms(self, csv_path, checkin_date, checkout_date, output_csv, concurrency=None, checkpoint_every=None, storage="csv"):
+        """
+        Основная функция для парсинга номеров отелей из списка.
+        concurrency=None - последовательный режим, N > 0 - asyncio с N запросами в полёте.
+        Номера дописываются в CSV пачками по checkpoint_every отелей (по умолчанию 1 в
+        последовательном режиме и 4 * concurrency в asyncio), после каждой пачки
+        фиксируется контрольная точка, и перезапуск продолжает с первого необработанного отеля.
+        storage: "csv", "sqlite" (снимок номеров по отелю за день) или "both".
+        Частоту запросов к API в обоих режимах ограничивает лимитер хоста (потолок
+        ostrovok.ru в HOST_SETTINGS - 4 запроса/с), поэтому concurrency выигрывает за
+        счёт перекрытия ожидания ответов, а не частоты выше потолка. Потолок печатается
+        рядом с номерами/с, чтобы сравнение режимов было при одинаковом ограничении.
+        """
         
         # --- Получаем куки ---
         self.get_cookies_from_browser()
 
         # --- Инициализируем CSV файл ---
-        fieldnames = [
-            "hotel_id",
-            "master_id",
-            "rate_hash",
-            "rg_hash",
-            "multi_bed_data",
-            "room_name",
-            "room_type",
-            "allotment",
-            "bedding_type",
-            "main_bed_count",
-            "extra_bed_count",
-            "has_breakfast",
-            "meal_type",
-            "amenities",
-            "price_rub",
-            "payment_types",
-            "free_cancellation_before",
-            "cancellation_penalty_percent",
-            "no_show_penalty"
-        ]
+        fieldnames = self.fieldnames
+        
+        write_csv = storage in ("csv", "both")
+        store = SnapshotStore(self.db_path) if storage in ("sqlite", "both") else None
         
         file_exists = os.path.exists(output_csv)
-        if not file_exists:
+        if write_csv and not file_exists:
             with open(output_csv, "w", newline="", encoding="utf-8-sig") as csvfile:
                 writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
                 writer.writeheader()
 
         # --- Читаем список отелей ---
         hotels = self.read_hotels_from_csv(csv_path)
+
+        # --- Контрольная точка прогона на эти даты ---
+        checkpoint = CheckpointStore("ostrovok_rooms", run_id=f"{checkin_date}_{checkout_date}")
+        start_index = checkpoint.load().get("next_index", 0)
+        if start_index:
+            print(f"Продолжаем с контрольной точки: обработано {start_index} из {len(hotels)} отелей")
+
+        if checkpoint_every is None:
+            checkpoint_every = 4 * concurrency if concurrency else 1
         
-        # --- Обрабатываем каждый отель ---
+        # --- Обрабатываем отели пачками ---
         all_rooms_data = []
-        for hotel_row in hotels:
-            rooms_data = self.process_hotel(hotel_row, checkin_date, checkout_date)
-            if rooms_data:
-                all_rooms_data.extend(rooms_data)
-                print(f"Сохранено {len(rooms_data)} номеров для {hotel_row.get('hotel_name') or hotel_row.get('name', 'unknown')}")
-
-        # --- Сохраняем все данные в CSV ---
-        with open(output_csv, "a", newline="", encoding="utf-8-sig") as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writerows(all_rooms_data)
+        batches = [
+            (batch_start, hotels[batch_start:batch_start + checkpoint_every])
+            for batch_start in range(start_index, len(hotels), checkpoint_every)
+        ]
+
+        def save_batch(batch_start, batch, results):
+            batch_rooms_data = []
+            for hotel_row, rooms_data in zip(batch, results):
+                if rooms_data:
+                    batch_rooms_data.extend(rooms_data)
+                    print(f"Сохранено {len(rooms_data)} номеров для {hotel_row.get('hotel_name') or hotel_row.get('name', 'unknown')}")
+
+            # --- Сохраняем пачку и только потом двигаем контрольную точку ---
+            if write_csv:
+                with open(output_csv, "a", newline="", encoding="utf-8-sig") as csvfile:
+                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                    writer.writerows(batch_rooms_data)
+            if store:
+                store.upsert("ostrovok_rooms", self._group_rooms_by_hotel(batch_rooms_data, checkin_date, checkout_date), id_key="snapshot_id")
+            checkpoint.commit(next_index=batch_start + len(batch))
+            all_rooms_data.extend(batch_rooms_data)
+
+        started_at = time.perf_counter()
+        if concurrency:
+            asyncio.run(self._run_batches_async(
+                batches,
+                lambda hotel_row: self.process_hotel_async(hotel_row, checkin_date, checkout_date),
+                save_batch,
+                concurrency
+            ))
+        else:
+            for batch_start, batch in batches:
+                save_batch(batch_start, batch, [self.process_hotel(hotel_row, checkin_date, checkout_date) for hotel_row in batch])
+        elapsed = time.perf_counter() - started_at
+
+        checkpoint.clear()
+        if store:
+            store.close()
+
+        mode = f"asyncio, concurrency={concurrency}" if concurrency else "последовательно"
+        rate = len(all_rooms_data) / elapsed if elapsed > 0 else 0.0
+        max_rate = self.http.rate_limiters.for_host(self.api_url).max_rate
+        print(
+            f"Режим: {mode}. {len(hotels) - start_index} отелей за {elapsed:.1f} с, {rate:.1f} номеров/с "
+            f"(потолок API {max_rate:.1f} запросов/с)"
+        )
+        self.http.rate_limiters.print_report()
+        self.executor.print_report()
         
-        print(f"\n=== Всего сохранено {len(all_rooms_data)} номеров в {output_csv} ===")
+        print(f"\n=== Всего сохранено {len(all_rooms_data)} номеров в {output_csv if write_csv else store.db_path} ===")
         return all_rooms_data
 
+    def _group_rooms_by_hotel(self, rooms_data, checkin_date, checkout_date):
+        """
+        Собирает номера в снимки по отелю для SnapshotStore.
+        Ключ снимка - отель вместе с датами проживания (snapshot_id), чтобы
+        обходы разных дат заезда в один день не затирали друг друга.
+        """
+        snapshots = {}
+        for room in rooms_data:
+            snapshot = snapshots.setdefault(room["hotel_id"], {
+                "snapshot_id": f"{room['hotel_id']}:{checkin_date}:{checkout_date}",
+                "hotel_id": room["hotel_id"],
+                "checkin_date": checkin_date,
+                "checkout_date": checkout_date,
+                "rooms": []
+            })
+            snapshot["rooms"].append(room)
+        return list(snapshots.values())
+
+    def plan_calendar_sweep(self, hotels, days, nights_options, first_checkin=None):
+        """
+        Планирует все комбинации (отель, дата заезда, число ночей).
+        По умолчанию первая дата заезда - завтра, дальше days дней подряд.
+        """
+        if first_checkin is None:
+            first_checkin = date.today() + timedelta(days=1)
+
+        plan = []
+        for hotel_row in hotels:
+            for day in range(days):
+                checkin = first_checkin + timedelta(days=day)
+                for nights in nights_options:
+                    plan.append({
+                        "hotel_row": hotel_row,
+                        "checkin_date": checkin.strftime("%Y-%m-%d"),
+                        "checkout_date": (checkin + timedelta(days=nights)).strftime("%Y-%m-%d"),
+                        "nights": nights
+                    })
+        return plan
+
+    def sweep_all_rooms(self, csv_path, output_csv, days=30, nights_options=(1,), concurrency=16, first_checkin=None, checkpoint_every=None):
+        """
+        Календарный обход: цены и доступность номеров на days дней вперёд
+        для каждой длительности проживания из nights_options.
+        Пишет по строке на каждый номер каждой комбинации (отель, дата заезда, ночи).
+        Строки дописываются в CSV пачками по checkpoint_every комбинаций (по умолчанию
+        4 * concurrency), после каждой пачки фиксируется контрольная точка, и перезапуск
+        продолжает с первой необработанной комбинации. Возвращает число записанных строк.
+        """
+        self.get_cookies_from_browser()
+
+        if first_checkin is None:
+            first_checkin = date.today() + timedelta(days=1)
+        if checkpoint_every is None:
+            checkpoint_every = 4 * concurrency
+
+        hotels = self.read_hotels_from_csv(csv_path)
+        plan = self.plan_calendar_sweep(hotels, days, nights_options, first_checkin)
+        print(f"Запланировано {len(plan)} запросов: {len(hotels)} отелей x {days} дней x {len(nights_options)} вариантов длительности")
+
+        # --- Контрольная точка календаря с этой даты и с этими длительностями ---
+        nights_key = "-".join(str(nights) for nights in nights_options)
+        checkpoint = CheckpointStore("ostrovok_rooms_sweep", run_id=f"{first_checkin}_{days}d_{nights_key}n")
+        state = checkpoint.load()
+        start_index = state.get("next_index", 0)
+        totals = {"rows": state.get("rows", 0), "failed": state.get("failed", 0)}
+        if start_index:
+            print(f"Продолжаем с контрольной точки: обработано {start_index} из {len(plan)} комбинаций")
+
+        if not os.path.exists(output_csv):
+            with open(output_csv, "w", newline="", encoding="utf-8-sig") as csvfile:
+                csv.DictWriter(csvfile, fieldnames=self.sweep_fieldnames).writeheader()
+
+        def save_batch(batch_start, batch, results):
+            rows = []
+            for task, rooms_data in zip(batch, results):
+                if not rooms_data:
+                    totals["failed"] += 1
+                    continue
+                for room in rooms_data:
+                    rows.append({
+                        "checkin_date": task["checkin_date"],
+                        "checkout_date": task["checkout_date"],
+                        "nights": task["nights"],
+                        **room
+                    })
+
+            # --- Сохраняем пачку и только потом двигаем контрольную точку ---
+            with open(output_csv, "a", newline="", encoding="utf-8-sig") as csvfile:
+                csv.DictWriter(csvfile, fieldnames=self.sweep_fieldnames).writerows(rows)
+            totals["rows"] += len(rows)
+            checkpoint.commit(next_index=batch_start + len(batch), **totals)
+
+        batches = [
+            (batch_start, plan[batch_start:batch_start + checkpoint_every])
+            for batch_start in range(start_index, len(plan), checkpoint_every)
+        ]
+
+        started_at = time.perf_counter()
+        asyncio.run(self._run_batches_async(
+            batches,
+            lambda task: self.process_hotel_async(task["hotel_row"], task["checkin_date"], task["checkout_date"]),
+            save_batch,
+            concurrency
+        ))
+        elapsed = time.perf_counter() - started_at
+        checkpoint.clear()
+
+        done = len(plan) - start_index
+        rate = done / elapsed if elapsed > 0 else 0.0
+        print(f"\n=== Календарь: {done} комбинаций за {elapsed:.1f} с ({rate:.1f} запросов/с), без данных: {totals['failed']} ===")
+        self.http.rate_limiters.print_report()
+        self.executor.print_report()
+        print(f"=== Сохранено {totals['rows']} строк в {output_csv} ===")
+        return totals["rows"]
+
 if __name__ == "__main__":
     parser = OstrovokRoomsParser()
     
@@ -344,4 +644,19 @@ if __name__ == "__main__":
     csv_path = r"c:\Users\matve\Desktop\Accommodation-monitoring\ostrovok_parser\hotels_list.csv"
     output_csv = r"c:\Users\matve\Desktop\Accommodation-monitoring\ostrovok_parser\hotels_rooms.csv"
     
-    parser.get_all_rooms(csv_path, checkin_date, checkout_date, output_csv)
+    # None - последовательный режим, число - количество одновременных запросов
+    # (частота всё равно ограничена лимитером ostrovok.ru, 4 запроса/с)
+    concurrency = None
+    if len(sys.argv) > 1:
+        concurrency = int(sys.argv[1])
+    
+    # Календарный режим: sweep_days > 0 включает обход на несколько дат вперёд
+    sweep_days = 0
+    sweep_nights = (1, 2, 3)
+    sweep_output_csv = r"c:\Users\matve\Desktop\Accommodation-monitoring\ostrovok_parser\hotels_rooms_calendar.csv"
+    
+    if sweep_days > 0:
+        parser.sweep_all_rooms(csv_path, sweep_output_csv, days=sweep_days, nights_options=sweep_nights, concurrency=16)
+    else:
+        # storage="sqlite" или "both" дополнительно пишет снимки в hotels.sqlite3
+        parser.get_all_rooms(csv_path, checkin_date, checkout_date, output_csv, concurrency=concurrency)
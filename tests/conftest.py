@@ -0,0 +1,31 @@
+"""
+Общие фикстуры тестов.
+
+Скрипты репозитория импортируют общие модули как common.* и соседние модули
+парсера напрямую (import tvil_fetch), поэтому в sys.path кладём корень
+репозитория и папки парсеров - так же, как это делают сами скрипты.
+"""
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT))
+sys.path.insert(0, str(REPO_ROOT / "tvil_parser"))
+sys.path.insert(0, str(REPO_ROOT / "ostrovok_parser_refactoring"))
+sys.path.insert(0, str(REPO_ROOT / "yandex_parser"))
+
+
+@pytest.fixture
+def standin_url():
+    """Локальная заглушка API (common/standin_server.py) на свободном порту"""
+    from common.standin_server import make_server
+
+    server = make_server(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,55 @@
+import pytest
+
+from common.cassette import Cassette, CassetteMiss, set_cassette
+from common.http_client import SharedHttpClient
+
+
+@pytest.fixture
+def no_process_cassette():
+    yield
+    set_cassette(None)
+
+
+def test_record_then_replay_in_order(tmp_path):
+    recorder = Cassette("unit", "record", tmp_path)
+    recorder.record("fetch", "GET", "https://tvil.ru/api/entities?page=1", None, {"status": 503})
+    recorder.record("fetch", "GET", "https://tvil.ru/api/entities?page=1", None, {"status": 200, "data": []})
+
+    player = Cassette("unit", "replay", tmp_path)
+    url = "https://tvil.ru/api/entities?page=1"
+    assert player.replay("fetch", "GET", url, None) == {"status": 503}
+    assert player.replay("fetch", "GET", url, None) == {"status": 200, "data": []}
+    # Дальше повторяется последний записанный ответ
+    assert player.replay("fetch", "GET", url, None) == {"status": 200, "data": []}
+    with pytest.raises(CassetteMiss):
+        player.replay("fetch", "GET", "https://tvil.ru/api/entities?page=2", None)
+
+
+def test_new_recording_replaces_previous_run(tmp_path):
+    Cassette("unit", "record", tmp_path).record("http", "GET", "https://example.org/", None, {"v": 1})
+    Cassette("unit", "record", tmp_path).record("http", "GET", "https://example.org/", None, {"v": 2})
+    assert Cassette("unit", "replay", tmp_path).replay("http", "GET", "https://example.org/", None) == {"v": 2}
+
+
+def test_ignored_body_fields_do_not_change_key():
+    first = Cassette.key_for("http", "POST", "https://ostrovok.ru/", {"hotel": "x", "search_uuid": "a"})
+    second = Cassette.key_for("http", "POST", "https://ostrovok.ru/", {"hotel": "x", "search_uuid": "b"})
+    assert first == second
+    assert first != Cassette.key_for("http", "POST", "https://ostrovok.ru/", {"hotel": "y"})
+
+
+def test_http_client_round_trip_through_standin(tmp_path, standin_url, no_process_cassette):
+    url = f"{standin_url}/hotel/search/v1/site/hp/search"
+    payload = {"hotel": "irkutsk_hotel", "search_uuid": "1"}
+
+    set_cassette(Cassette("standin", "record", tmp_path))
+    client = SharedHttpClient()
+    recorded = client.post(url, json=payload, headers={"Accept": "application/json"})
+    client.close()
+    assert recorded.status_code == 200
+
+    # В replay сеть не нужна: тот же запрос отвечает кассета
+    set_cassette(Cassette("standin", "replay", tmp_path))
+    replayed = SharedHttpClient().post(url, json=dict(payload, search_uuid="2"))
+    assert replayed.status_code == 200
+    assert replayed.json() == recorded.json()
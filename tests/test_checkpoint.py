@@ -0,0 +1,47 @@
+from common.checkpoint import CheckpointStore
+
+
+def test_resume_returns_committed_state_and_records(tmp_path):
+    store = CheckpointStore("tvil_hotels", run_id="2026-10-01", directory=tmp_path)
+    store.commit([{"id": 1}, {"id": 2}], offset=40)
+    store.commit([{"id": 3}], offset=60)
+
+    resumed = CheckpointStore("tvil_hotels", run_id="2026-10-01", directory=tmp_path)
+    assert resumed.load() == {"offset": 60}
+    assert resumed.load_records() == [{"id": 1}, {"id": 2}, {"id": 3}]
+
+
+def test_uncommitted_tail_is_dropped_and_truncated(tmp_path):
+    store = CheckpointStore("tvil_hotels", run_id="run", directory=tmp_path)
+    store.commit([{"id": 1}], offset=20)
+    # Падение между дозаписью данных и сохранением состояния
+    with open(store.records_path, "a", encoding="utf-8") as f:
+        f.write('{"id": 2}\n{"id": 3')
+
+    resumed = CheckpointStore("tvil_hotels", run_id="run", directory=tmp_path)
+    assert resumed.load() == {"offset": 20}
+    assert resumed.load_records() == [{"id": 1}]
+
+    # Следующий commit обрезает неподтверждённый хвост перед дозаписью
+    resumed.commit([{"id": 4}], offset=40)
+    assert CheckpointStore("tvil_hotels", run_id="run", directory=tmp_path).load_records() == [{"id": 1}, {"id": 4}]
+    assert store.records_path.read_text(encoding="utf-8").splitlines() == ['{"id": 1}', '{"id": 4}']
+
+
+def test_state_only_commit_and_clear(tmp_path):
+    store = CheckpointStore("ostrovok_rooms", run_id="run", directory=tmp_path)
+    assert store.load() == {}
+    store.commit(next_index=8)
+    assert CheckpointStore("ostrovok_rooms", run_id="run", directory=tmp_path).load() == {"next_index": 8}
+
+    store.clear()
+    assert not store.state_path.exists()
+    assert CheckpointStore("ostrovok_rooms", run_id="run", directory=tmp_path).load() == {}
+
+
+def test_corrupted_state_starts_over(tmp_path):
+    store = CheckpointStore("yandex", run_id="run", directory=tmp_path)
+    store.directory.mkdir(parents=True, exist_ok=True)
+    store.state_path.write_text("{not json", encoding="utf-8")
+    assert store.load() == {}
+    assert store.load_records() == []
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from common.columnar import ParquetWriter, parquet_path_for, read_columns
+from tvil_columns import COLUMNS, hotel_row
+
+
+def test_tuples_and_dicts_round_trip_with_types(tmp_path):
+    path = tmp_path / "tvil_hotels.parquet"
+    entity = {"id": "42", "attributes": {"title": "Байкал", "latitude": "52.28", "price": [1000, 2500], "is_new": "true"}}
+    with ParquetWriter(path, "tvil", COLUMNS, row_group_size=1) as writer:
+        writer.write_tuple(hotel_row(entity))
+        writer.write_row({"id": 43, "title": "Ангара", "latitude": "", "is_new": False})
+    assert writer.count == 2
+
+    table = read_columns(path, ["id", "title", "latitude", "price_max", "is_new"])
+    assert table.column_names == ["id", "title", "latitude", "price_max", "is_new"]
+    rows = table.to_pylist()
+    assert rows[0] == {"id": 42, "title": "Байкал", "latitude": 52.28, "price_max": 2500, "is_new": True}
+    # Пустые значения становятся null, а не пустой строкой
+    assert rows[1] == {"id": 43, "title": "Ангара", "latitude": None, "price_max": None, "is_new": False}
+
+
+def test_parquet_path_for_csv():
+    assert parquet_path_for("out/tvil_hotels.csv").name == "tvil_hotels.parquet"
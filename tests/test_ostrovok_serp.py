@@ -0,0 +1,84 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from common.ostrovok_serp import SERP_XHR_PATTERN, SerpCapture, extract_serp_hotels, extract_serp_total
+
+FIXTURE = Path(__file__).parent / "fixtures" / "ostrovok_serp.json"
+
+
+@pytest.fixture
+def serp_response():
+    with open(FIXTURE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_fixture_request_matches_xhr_pattern(serp_response):
+    assert SERP_XHR_PATTERN in serp_response["request"]["url"]
+
+
+def test_field_paths_extract_fixture(serp_response):
+    data = serp_response["response"]["json"]
+    hotels = extract_serp_hotels(data, "https://ostrovok.ru")
+
+    assert extract_serp_total(data) == 3
+    assert [hotel["hotel_id"] for hotel in hotels] == ["baikal_view_hotel", "angara_guest_house", "hostel_na_karla_marksa"]
+    assert hotels[0] == {
+        "hotel_id": "baikal_view_hotel",
+        "master_id": 8812345,
+        "name": "Отель Байкал Вью",
+        "address": "ул. Горького, 12, Листвянка",
+        "url": "https://ostrovok.ru/hotel/russia/listvyanka/mid8812345/baikal_view_hotel/",
+        "price": "6400.00",
+        "rating": 9.1,
+        "rating_category": "Превосходно",
+        "reviews_count": 214,
+        "show_rooms_url": "https://ostrovok.ru/hotel/russia/listvyanka/mid8812345/baikal_view_hotel/",
+    }
+    # Запасные пути: static_vm.ota_hotel_id, amount без show_amount, min_price без тарифов
+    assert hotels[1]["master_id"] == 7731920
+    assert hotels[1]["price"] == "3200.00"
+    assert hotels[2]["price"] == 900
+    assert hotels[2]["rating"] == ""
+
+
+def test_relative_urls_use_parser_site(serp_response):
+    hotels = extract_serp_hotels(serp_response["response"]["json"], "http://127.0.0.1:8765")
+    assert hotels[0]["url"] == "http://127.0.0.1:8765/hotel/russia/listvyanka/mid8812345/baikal_view_hotel/"
+    # Абсолютный url остаётся как есть
+    assert hotels[1]["url"].startswith("https://ostrovok.ru/")
+
+
+class FakePage:
+    def on(self, event, handler):
+        pass
+
+
+class FakeResponse:
+    def __init__(self, data, url="https://ostrovok.ru/hotel/search/v2/site/serp?page=2"):
+        self.data = data
+        self.url = url
+
+    def json(self):
+        return self.data
+
+
+def take(data):
+    capture = SerpCapture(FakePage(), site="https://ostrovok.ru")
+    capture.responses.append(FakeResponse(data))
+    return capture.take_hotels()
+
+
+def test_capture_warns_when_structure_does_not_match(capsys):
+    assert take({"result": {"items": [{"hotel": "x"}]}}) == []
+    assert "не найдено ни одного отеля" in capsys.readouterr().out
+
+    assert take({"hotels": [{"unknown": 1}]}) == []
+    assert "не найдено ни одного отеля" in capsys.readouterr().out
+
+
+def test_capture_empty_page_is_not_a_warning(capsys, serp_response):
+    assert take({"hotels": [], "total_hotels": 3}) == []
+    assert "не найдено" not in capsys.readouterr().out
+    assert len(take(serp_response["response"]["json"])) == 3
@@ -0,0 +1,89 @@
+import pytest
+
+from common.rate_limit import AdaptiveRateLimiter, HostRateLimiters, rejection_reason
+
+
+def make_limiter(**settings):
+    defaults = {"rate": 2.0, "min_rate": 0.5, "max_rate": 3.0, "increase": 0.25, "decrease": 0.5, "cooldown": 0.0}
+    return AdaptiveRateLimiter("example.org", **dict(defaults, **settings))
+
+
+def test_additive_increase_stops_at_max_rate():
+    limiter = make_limiter()
+    limiter.record_success()
+    assert limiter.rate == pytest.approx(2.25)
+    for _ in range(20):
+        limiter.record_success()
+    assert limiter.rate == 3.0
+    assert limiter.successes == 21
+
+
+def test_multiplicative_decrease_stops_at_min_rate():
+    limiter = make_limiter()
+    limiter.record_rejection("429")
+    assert limiter.rate == pytest.approx(1.0)
+    limiter.record_rejection("429")
+    limiter.record_rejection("503")
+    assert limiter.rate == 0.5
+    assert limiter.rejections == {"429": 2, "503": 1}
+
+
+def test_burst_of_rejections_within_cooldown_is_one_decrease():
+    limiter = make_limiter(cooldown=60.0)
+    for _ in range(5):
+        limiter.record_rejection("429")
+    assert limiter.rate == pytest.approx(1.0)
+    assert limiter.rejections == {"429": 5}
+
+
+def test_reservations_are_spaced_by_rate():
+    limiter = make_limiter(rate=2.0)
+    assert limiter._reserve() == 0
+    assert limiter._reserve() == pytest.approx(0.5, abs=0.05)
+    assert limiter._reserve() == pytest.approx(1.0, abs=0.05)
+
+
+@pytest.mark.parametrize("status, content_type, expects_json, reason", [
+    (200, "application/json", True, None),
+    (404, "application/json", True, None),
+    (403, "", False, "403"),
+    (429, "", False, "429"),
+    (500, "", False, "500"),
+    (503, "", False, "503"),
+    (200, "text/html", True, "non_json"),
+    (200, "text/html", False, None),
+])
+def test_rejection_reason(status, content_type, expects_json, reason):
+    assert rejection_reason(status, content_type, expects_json) == reason
+
+
+def test_host_limiters_record_success_rejection_and_timeout():
+    limiters = HostRateLimiters(defaults={"cooldown": 0.0})
+    limiter = limiters.for_host("https://example.org/api?page=1")
+    assert limiters.for_host("example.org") is limiter
+
+    limiters.record("https://example.org/api", 200, "application/json", expects_json=True)
+    rate = limiter.rate
+    assert limiters.record("https://example.org/api", 502) == "502"
+    assert limiter.rate == pytest.approx(rate * 0.5)
+    limiters.record_timeout("https://example.org/api")
+    assert limiter.rejections == {"502": 1, "timeout": 1}
+
+
+def test_max_rate_is_per_host():
+    limiters = HostRateLimiters(host_settings={"example.org": {"max_rate": 2.5}})
+    for host in ("example.org", "tvil.ru", "other.example"):
+        limiter = limiters.for_host(host)
+        for _ in range(200):
+            limiter.record_success()
+    assert limiters.for_host("example.org").rate == 2.5
+    assert limiters.for_host("tvil.ru").rate == 5.0
+    assert limiters.for_host("other.example").rate == 10.0
+
+
+def test_configure_updates_existing_limiter():
+    limiters = HostRateLimiters()
+    limiter = limiters.for_host("example.org")
+    limiters.configure("example.org", max_rate=1.0)
+    assert limiter.max_rate == 1.0
+    assert limiter.rate == 1.0
@@ -0,0 +1,78 @@
+import gzip
+import os
+
+from common.raw_archive import RawArchiveReader, RawArchiveWriter, iter_archive, latest_archive, load_index
+
+
+def write_archive(path, records, block_size=2):
+    with RawArchiveWriter(path, block_size=block_size) as archive:
+        for record in records:
+            archive.write(record["id"], record)
+
+
+def test_iter_archive_round_trip(tmp_path):
+    path = tmp_path / "tvil_run.ndjson.gz"
+    records = [{"id": str(i), "title": f"Отель {i}"} for i in range(5)]
+    write_archive(path, records)
+    assert list(iter_archive(path)) == records
+
+
+def test_index_lookup_reads_single_record(tmp_path):
+    path = tmp_path / "tvil_run.ndjson.gz"
+    records = [{"id": str(i), "title": f"Отель {i}"} for i in range(7)]
+    write_archive(path, records, block_size=3)
+
+    index = load_index(path)
+    assert set(index) == {str(i) for i in range(7)}
+    # Запись 4 - вторая строка второго блока
+    assert index["4"][3] == 1
+
+    with RawArchiveReader(path) as reader:
+        assert reader.get(4) == {"id": "4", "title": "Отель 4"}
+        assert reader.get("6") == {"id": "6", "title": "Отель 6"}
+        assert reader.get("missing") is None
+
+
+def test_appended_archive_prefers_last_record(tmp_path):
+    path = tmp_path / "tvil_run.ndjson.gz"
+    write_archive(path, [{"id": "1", "title": "старый"}])
+    write_archive(path, [{"id": "1", "title": "новый"}])
+
+    assert [record["title"] for record in iter_archive(path)] == ["старый", "новый"]
+    with RawArchiveReader(path) as reader:
+        assert reader.get("1")["title"] == "новый"
+
+
+def test_latest_archive_picks_newest_or_requested_run(tmp_path):
+    assert latest_archive(tmp_path, "tvil_") is None
+    old = tmp_path / "tvil_2026-10-01.ndjson.gz"
+    new = tmp_path / "tvil_2026-10-02.ndjson.gz"
+    write_archive(old, [{"id": "1"}])
+    write_archive(new, [{"id": "1"}])
+    os.utime(old, (1, 1))
+
+    assert latest_archive(tmp_path, "tvil_") == new
+    assert latest_archive(tmp_path, "tvil_", "2026-10-01") == old
+    assert latest_archive(tmp_path, "tvil_", "2026-09-30") is None
+
+
+def test_truncated_tail_is_cut_on_reopen_and_skipped_on_read(tmp_path):
+    path = tmp_path / "tvil_run.ndjson.gz"
+    write_archive(path, [{"id": str(i)} for i in range(4)])
+    size = path.stat().st_size
+
+    # Падение посреди блока: часть gzip member записана, в индекс он не попал
+    with open(path, "ab") as f:
+        f.write(gzip.compress(b'{"id":"4"}\n{"id":"5"}\n')[:15])
+    with open(path.with_name(path.name + ".idx"), "a", encoding="utf-8") as f:
+        f.write('["4", "tvil_run.ndjso')
+
+    assert [record["id"] for record in iter_archive(path)] == ["0", "1", "2", "3"]
+    assert set(load_index(path)) == {"0", "1", "2", "3"}
+
+    write_archive(path, [{"id": "6"}])
+    assert path.stat().st_size > size
+    assert [record["id"] for record in iter_archive(path)] == ["0", "1", "2", "3", "6"]
+    with RawArchiveReader(path) as reader:
+        assert reader.get("6") == {"id": "6"}
+        assert reader.get("4") is None
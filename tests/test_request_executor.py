@@ -0,0 +1,144 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from common.request_executor import LatencyTracker, RequestExecutor
+
+
+def response(status, text=""):
+    return httpx.Response(status, text=text, request=httpx.Request("GET", "https://example.org/"))
+
+
+class Sender:
+    """send(timeout) для исполнителя: отдаёт заготовленные ответы или ошибки по очереди"""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def next_outcome(self):
+        outcome = self.outcomes[min(self.calls, len(self.outcomes) - 1)]
+        self.calls += 1
+        return outcome
+
+    def __call__(self, timeout):
+        delay, outcome = self.next_outcome()
+        time.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    async def send_async(self, timeout):
+        delay, outcome = self.next_outcome()
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_executor(**kwargs):
+    return RequestExecutor("test", backoff=0.0, **kwargs)
+
+
+def test_latency_percentiles():
+    tracker = LatencyTracker()
+    assert tracker.percentile(50) is None
+    for value in range(1, 101):
+        tracker.add(value / 100)
+    assert tracker.percentile(50) == 0.5
+    assert tracker.percentile(99) == 0.99
+
+
+def test_retries_retryable_status_then_succeeds():
+    executor = make_executor(attempts=3)
+    send = Sender([(0, response(503)), (0, response(429)), (0, response(200, "ok"))])
+    result = executor.run(send)
+    assert result.status_code == 200
+    assert send.calls == 3
+    assert executor.counters["retries"] == 2
+    assert executor.counters["failures"] == 0
+
+
+def test_retries_transport_error_and_gives_up_after_attempts():
+    executor = make_executor(attempts=2)
+    send = Sender([(0, httpx.ConnectError("connection refused"))])
+    with pytest.raises(httpx.ConnectError):
+        executor.run(send)
+    assert send.calls == 2
+    assert executor.counters["requests"] == 1
+    assert executor.counters["retries"] == 1
+    assert executor.counters["failures"] == 1
+
+
+def test_non_retryable_status_is_returned_immediately():
+    executor = make_executor()
+    send = Sender([(0, response(404))])
+    assert executor.run(send).status_code == 404
+    assert send.calls == 1
+
+
+def test_last_retryable_response_is_returned():
+    executor = make_executor(attempts=2)
+    send = Sender([(0, response(503))])
+    assert executor.run(send).status_code == 503
+    assert send.calls == 2
+
+
+def primed_hedging_executor():
+    executor = make_executor(hedge=True, min_samples=5)
+    for _ in range(5):
+        executor.latency.add(0.02)
+    return executor
+
+
+def test_hedge_wins_when_primary_is_slow():
+    executor = primed_hedging_executor()
+    send = Sender([(0.5, response(200, "primary")), (0, response(200, "hedge"))])
+    assert executor.run(send).text == "hedge"
+    assert executor.counters["hedges"] == 1
+    assert executor.counters["hedge_wins"] == 1
+
+
+def test_no_hedge_when_primary_is_fast():
+    executor = primed_hedging_executor()
+    send = Sender([(0, response(200, "primary"))])
+    assert executor.run(send).text == "primary"
+    assert executor.counters["hedges"] == 0
+
+
+def test_async_retry_and_hedge():
+    executor = primed_hedging_executor()
+    send = Sender([(0, response(502)), (0.5, response(200, "primary")), (0, response(200, "hedge"))])
+    result = asyncio.run(executor.arun(send.send_async))
+    assert result.text == "hedge"
+    assert executor.counters["retries"] == 1
+    assert executor.counters["hedge_wins"] == 1
+
+
+def test_async_deadline_excludes_limiter_wait(monkeypatch):
+    from common.http_client import SharedHttpClient
+    from common.rate_limit import HostRateLimiters
+
+    client = SharedHttpClient()
+    client.rate_limiters = HostRateLimiters(host_settings={"example.org": {"rate": 1.0, "max_rate": 1.0}})
+
+    class SlowClient:
+        async def request(self, method, url, **kwargs):
+            await asyncio.sleep(kwargs["delay"])
+            return response(200, "ok")
+
+    monkeypatch.setattr(client, "async_client_for", lambda url: SlowClient())
+    monkeypatch.setattr(client, "_record", lambda url, result, kwargs: result)
+
+    async def run():
+        # Второй запрос ждёт окно лимитера около секунды, но сам отвечает быстро
+        first = await client.aget("https://example.org/a", timeout=0.3, delay=0)
+        second = await client.aget("https://example.org/b", timeout=0.3, delay=0)
+        with pytest.raises(httpx.TimeoutException):
+            await client.aget("https://example.org/c", timeout=0.05, delay=0.5)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.text == second.text == "ok"
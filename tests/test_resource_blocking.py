@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from common import resource_blocking
+from common.resource_blocking import ResourceBlocker
+
+
+class FakeRequest:
+    """Запрос Playwright в объёме, который нужен ResourceBlocker"""
+    def __init__(self, url, resource_type, body_size, navigation=False):
+        self.url = url
+        self.resource_type = resource_type
+        self.frame = SimpleNamespace(parent_frame=None)
+        self.navigation = navigation
+        self.body_size = body_size
+
+    def is_navigation_request(self):
+        return self.navigation
+
+    def sizes(self):
+        return {"responseBodySize": self.body_size}
+
+
+def test_report_counts_real_body_sizes_and_saved_measurement(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(resource_blocking, "MEASUREMENTS_PATH", tmp_path / "resource_blocking.json")
+    resource_blocking.save_measurement("tvil", {
+        "url": "https://tvil.ru/", "measured_at": "2026-10-17T10:00:00",
+        "full_bytes": 4096 * 1024, "full_seconds": 3.5, "blocked_bytes": 1024 * 1024, "blocked_seconds": 1.25
+    })
+    blocker = ResourceBlocker("tvil")
+    document = FakeRequest("https://tvil.ru/", "document", 50 * 1024, navigation=True)
+    image = FakeRequest("https://tvil.ru/a.jpg", "image", 0)
+    script = FakeRequest("https://tvil.ru/app.js", "script", 30 * 1024)
+    for request in (document, image, script):
+        blocker._count(request, blocker.should_block(request))
+    blocker._on_request_finished(document)
+    blocker._on_request_finished(script)
+    blocker._on_load(None)
+
+    navigation = blocker.navigations[0]
+    assert (navigation["allowed"], navigation["blocked"], navigation["bytes"]) == (2, 1, 80 * 1024)
+    assert navigation["seconds"] is not None
+
+    blocker.print_report()
+    report = capsys.readouterr().out
+    assert "пропущено 2 (80 КБ), заблокировано 1 (image: 1)" in report
+    assert "без профиля 4096 КБ за 3.50 с, с профилем 1024 КБ за 1.25 с; экономия 3072 КБ и 2.25 с" in report
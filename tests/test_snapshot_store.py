@@ -0,0 +1,24 @@
+from common.snapshot_store import SnapshotStore
+from ostrovok_rooms import OstrovokRoomsParser
+
+
+def test_upsert_replaces_same_day_snapshot(tmp_path):
+    with SnapshotStore(tmp_path / "hotels.sqlite3") as store:
+        store.upsert("tvil", [{"id": "1", "title": "старый"}], scrape_date="2026-10-01")
+        store.upsert("tvil", [{"id": "1", "title": "новый"}, {"id": ""}], scrape_date="2026-10-01")
+        store.upsert("tvil", [{"id": "1", "title": "завтра"}], scrape_date="2026-10-02")
+
+        assert store.snapshot("tvil", "2026-10-01") == [{"id": "1", "title": "новый"}]
+        assert [title["title"] for _, title in store.history("tvil", "1")] == ["новый", "завтра"]
+
+
+def test_rooms_for_different_stay_dates_do_not_overwrite(tmp_path):
+    parser = OstrovokRoomsParser()
+    rooms = [{"hotel_id": "baikal", "room_name": "Стандарт"}, {"hotel_id": "baikal", "room_name": "Люкс"}]
+    with SnapshotStore(tmp_path / "hotels.sqlite3") as store:
+        for checkin, checkout in [("2026-11-01", "2026-11-02"), ("2026-11-05", "2026-11-07")]:
+            snapshots = parser._group_rooms_by_hotel(rooms, checkin, checkout)
+            assert store.upsert("ostrovok_rooms", snapshots, id_key="snapshot_id", scrape_date="2026-10-17") == 1
+
+        saved = store.snapshot("ostrovok_rooms", "2026-10-17")
+    assert [(item["checkin_date"], len(item["rooms"])) for item in saved] == [("2026-11-01", 2), ("2026-11-05", 2)]
@@ -0,0 +1,103 @@
+"""
+hotel_row сравнивается с построчным разбором extract_hotel_data, каким он был
+до перехода на скомпилированную спецификацию колонок (reference_extract ниже).
+"""
+import json
+
+import pytest
+
+from tvil_columns import COLUMNS, HOTEL_ROW_SOURCE, hotel_row, row_from_record, row_to_dict
+from tvil_json_to_csv import extract_hotel_data
+
+PLAIN_ATTRIBUTES = [
+    "title", "cabinet_title", "full_title", "list_title", "entity_type", "subtype",
+    "address", "short_address", "full_address", "map_address", "city_address",
+    "latitude", "longitude", "description", "conditions", "prepayment",
+    "rooms_total", "bedroom_total", "count_rooms", "count_reviews", "count_real_reviews",
+    "rating_overall", "entity_rating", "total_rating", "user_rating", "stars",
+    "country_id", "region_id", "city_id", "aria_id", "count_photos", "count_guest",
+    "count_guest_max", "categories_count", "occupied_categories", "last_reserve",
+    "last_reserve_label", "is_new", "is_instant_reserve", "is_searchable_and_has_prices",
+    "allow_quota", "ros_accreditation_code", "ros_accreditation_url", "ics_export_link",
+    "more_often", "more_often_type",
+]
+
+NESTED = {
+    "currency": {"id": "currency_id", "title": "currency_title", "symbol": "currency_symbol"},
+    "food_type": {"label": "food_type_label", "text_short": "food_type_text_short", "text_full": "food_type_text_full"},
+    "status": {"enabled": "status_enabled", "checked": "status_checked", "deleted": "status_deleted"},
+    "owner": {"first_time": "owner_first_time", "update_time": "owner_update_time"},
+}
+
+PRICES = {"price": "price", "daily_rubles_price": "daily_price", "year_price": "year_price"}
+
+
+def reference_extract(hotel):
+    attributes = hotel.get("attributes", {})
+    row = {"id": hotel.get("id", "")}
+    for name in PLAIN_ATTRIBUTES:
+        row[name] = attributes.get(name, "")
+    for key, prefix in PRICES.items():
+        values = attributes.get(key, [])
+        ok = isinstance(values, list) and len(values) > 0
+        row[f"{prefix}_min"] = values[0] if ok else ""
+        row[f"{prefix}_max"] = values[-1] if ok else ""
+    for key, columns in NESTED.items():
+        value = attributes.get(key, {})
+        for field, column in columns.items():
+            row[column] = value.get(field, "") if isinstance(value, dict) else ""
+    params = attributes.get("params", {})
+    row["params"] = json.dumps(params, ensure_ascii=False) if isinstance(params, dict) else ""
+    return {column: row[column] for column in COLUMNS}
+
+
+FULL_ATTRIBUTES = dict(
+    {name: f"{name}-значение" for name in PLAIN_ATTRIBUTES},
+    price=[1000, 1500, 2500],
+    daily_rubles_price=[900],
+    year_price=[],
+    currency={"id": 1, "title": "Рубль", "symbol": "₽"},
+    food_type={"label": "BB", "text_short": "завтрак"},
+    status={"enabled": True, "checked": False, "deleted": False},
+    owner=None,
+    params={"wifi": True, "тип": "гостиница"},
+)
+
+ENTITIES = [
+    {"id": "1", "attributes": FULL_ATTRIBUTES},
+    {"id": "2", "attributes": {}},
+    {"id": "3"},
+    {"attributes": {"title": "без id"}},
+    {"id": "5", "attributes": {"params": None, "price": "1000", "currency": "RUB", "status": []}},
+    {"id": "6", "attributes": {"params": {}, "price": [0], "food_type": {}}},
+    {"id": "7", "attributes": dict(FULL_ATTRIBUTES, params=[1, 2])},
+]
+
+
+@pytest.mark.parametrize("entity", ENTITIES, ids=lambda entity: str(entity.get("id", "no-id")))
+def test_hotel_row_matches_reference(entity):
+    assert row_to_dict(hotel_row(entity)) == reference_extract(entity)
+    assert extract_hotel_data(entity) == reference_extract(entity)
+
+
+def test_missing_params_defaults_to_empty_object():
+    index = COLUMNS.index("params")
+    assert hotel_row({"id": "1", "attributes": {}})[index] == "{}"
+    assert hotel_row({"id": "1", "attributes": {"params": None}})[index] == ""
+
+
+def test_parity_holds_in_any_order_of_complete_and_partial_entities():
+    # Первый объект без ключа переключает разбор на медленный путь; результат не меняется
+    for entity in ENTITIES + ENTITIES[::-1]:
+        assert row_to_dict(hotel_row(entity)) == reference_extract(entity)
+
+
+def test_row_from_record_accepts_lists_and_legacy_dicts():
+    row = hotel_row(ENTITIES[0])
+    assert row_from_record(list(row)) == row
+    assert row_from_record(row_to_dict(row)) == row
+    assert row_from_record({"id": "1"})[1:] == ("",) * (len(COLUMNS) - 1)
+
+
+def test_generated_source_is_exposed():
+    assert HOTEL_ROW_SOURCE.startswith("def hotel_row(entity):")
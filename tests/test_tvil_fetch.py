@@ -0,0 +1,25 @@
+import time
+
+import tvil_fetch
+
+
+def test_page_limit_cache_is_per_include_and_expires(tmp_path, monkeypatch):
+    path = tmp_path / "tvil_page_limit.json"
+    tvil_fetch.save_page_limit("params", 200, path)
+    tvil_fetch.save_page_limit("params,photos_t1", 50, path)
+
+    assert tvil_fetch.load_page_limit("params", path) == 200
+    assert tvil_fetch.load_page_limit("params,photos_t1", path) == 50
+    assert tvil_fetch.load_page_limit("", path) is None
+
+    monkeypatch.setattr(time, "time", lambda: 10 ** 12)
+    assert tvil_fetch.load_page_limit("params", path) is None
+
+
+def test_choose_page_limit_does_not_probe_without_calibrate(tmp_path, monkeypatch):
+    monkeypatch.setattr(tvil_fetch, "PAGE_LIMIT_CACHE", tmp_path / "tvil_page_limit.json")
+    monkeypatch.setattr(tvil_fetch, "calibrate_page_limit", lambda *args: (_ for _ in ()).throw(AssertionError("probe")))
+
+    assert tvil_fetch.choose_page_limit(None, "http://api", {"include": "params"}) == 20
+    tvil_fetch.save_page_limit("params", 100)
+    assert tvil_fetch.choose_page_limit(None, "http://api", {"include": "params"}) == 100
@@ -0,0 +1,47 @@
+import csv
+import json
+import os
+
+from common.raw_archive import RawArchiveWriter
+from tvil_json_to_csv import convert_json_to_csv
+
+
+def write_run(directory, run_id, entities, mtime):
+    path = directory / "raw" / f"tvil_{run_id}.ndjson.gz"
+    with RawArchiveWriter(path) as archive:
+        for entity in entities:
+            archive.write(entity["id"], entity)
+    os.utime(path, (mtime, mtime))
+
+
+def read_titles(path):
+    with open(path, encoding="utf-8", newline="") as f:
+        return {row["id"]: row["title"] for row in csv.DictReader(f)}
+
+
+def test_converts_latest_run_and_keeps_last_record(tmp_path):
+    write_run(tmp_path, "2026-10-01", [{"id": "1", "attributes": {"title": "старый"}}, {"id": "9", "attributes": {}}], 1000)
+    write_run(tmp_path, "2026-10-02", [
+        {"id": "1", "attributes": {"title": "до перезапуска"}},
+        {"id": "2", "attributes": {"title": "второй"}},
+        {"id": "1", "attributes": {"title": "новый"}},
+    ], 2000)
+
+    convert_json_to_csv(tmp_path)
+    assert read_titles(tmp_path / "tvil_hotels.csv") == {"1": "новый", "2": "второй"}
+
+
+def test_run_id_selects_archive(tmp_path):
+    write_run(tmp_path, "2026-10-01", [{"id": "1", "attributes": {"title": "старый"}}], 1000)
+    write_run(tmp_path, "2026-10-02", [{"id": "1", "attributes": {"title": "новый"}}], 2000)
+
+    convert_json_to_csv(tmp_path, output_file=tmp_path / "old.csv", run_id="2026-10-01")
+    assert read_titles(tmp_path / "old.csv") == {"1": "старый"}
+
+
+def test_legacy_page_files_without_archives(tmp_path):
+    page = {"data": [{"id": "5", "attributes": {"title": "из страницы"}}]}
+    (tmp_path / "tvil_irko_1.json").write_text(json.dumps(page, ensure_ascii=False), encoding="utf-8")
+
+    convert_json_to_csv(tmp_path)
+    assert read_titles(tmp_path / "tvil_hotels.csv") == {"5": "из страницы"}
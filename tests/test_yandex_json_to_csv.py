@@ -0,0 +1,47 @@
+import csv
+import os
+from datetime import date
+
+import pyarrow.parquet as pq
+
+import yandex_json_to_csv
+from common.raw_archive import RawArchiveWriter
+from common.snapshot_store import SnapshotStore
+
+
+def write_run(name, permalinks, mtime):
+    path = f"yandex_parser/raw/{name}.ndjson.gz"
+    with RawArchiveWriter(path) as archive:
+        for permalink in permalinks:
+            archive.write(permalink, {"hotel": {"permalink": permalink, "name": f"Отель {permalink}"}})
+    os.utime(path, (mtime, mtime))
+
+
+def test_serial_run_ignores_tile_archives_and_is_parsed_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_run("yandex_2026-10-01", ["1", "2", "1"], 1000)
+    write_run("yandex_tiles_2026-10-02", ["7", "8"], 2000)
+
+    opened = []
+    iter_archive = yandex_json_to_csv.iter_archive
+    monkeypatch.setattr(yandex_json_to_csv, "iter_archive", lambda path: opened.append(path) or iter_archive(path))
+    db_path = tmp_path / "hotels.sqlite3"
+    monkeypatch.setattr(yandex_json_to_csv, "SnapshotStore", lambda _: SnapshotStore(db_path))
+
+    yandex_json_to_csv.main(storage="both", parquet=True)
+
+    assert opened == ["yandex_parser/raw/yandex_2026-10-01.ndjson.gz"]
+    with open("yandex_hotels.csv", encoding="utf-8", newline="") as f:
+        assert [row["id"] for row in csv.DictReader(f)] == ["1", "2"]
+    assert pq.read_table("yandex_hotels.parquet").column("id").to_pylist() == [1, 2]
+    with SnapshotStore(db_path) as store:
+        assert sorted(hotel["id"] for hotel in store.snapshot("yandex", date.today().isoformat())) == ["1", "2"]
+
+
+def test_tiles_flag_reads_tile_archive(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_run("yandex_2026-10-01", ["1"], 2000)
+    write_run("yandex_tiles_2026-10-02", ["7", "8"], 1000)
+
+    assert [hotel["id"] for hotel in yandex_json_to_csv.iter_json_files(tiles=True)] == ["7", "8"]
+    assert [hotel["id"] for hotel in yandex_json_to_csv.iter_json_files()] == ["1"]
@@ -1,105 +1,118 @@
 import json
+import sys
 from pathlib import Path
 from playwright.sync_api import sync_playwright
-import time
+import tvil_fetch
+from tvil_json_to_csv import get_csv_columns
 
-def parse_tvil_api():
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.checkpoint import CheckpointStore
+from common.endpoints import site_url
+from common.raw_archive import RawArchiveWriter
+from common.rate_limit import get_host_limiters
+from common.resource_blocking import ResourceBlocker
+from common.session_cache import SessionCache
+
+def parse_tvil_api(concurrency=None, calibrate=False, site=None):
     """
     Парсит API ТВИЛ, получая отели с пагинацией через Playwright.
-    Сохраняет каждый ответ в отдельный JSON-файл.
+    Сохраняет отели в сжатый NDJSON-архив raw/tvil_<дата>.ndjson.gz с индексом по id.
+    concurrency=None - страницы по одной, N > 1 - окнами по N запросов из браузера.
+    calibrate=True - перед обходом подобрать максимальный page[limit] и сохранить его в кэш;
+    без него используется page[limit] из кэша прошлой калибровки или 20.
+    site - адрес сайта вместо https://tvil.ru (например, локальной заглушки).
     """
-    base_url = "https://tvil.ru/api/entities"
+    site = site_url("tvil", site)
+    base_url = f"{site}/api/entities"
     offset = 0
     limit = 20
     
+    # Запрашиваем только те include, которые нужны колонкам tvil_json_to_csv
+    include = tvil_fetch.build_include(get_csv_columns())
+    
+    def build_params(page_limit):
+        """Параметры запроса без offset"""
+        return {
+            "page[limit]": str(page_limit),
+            "include": include,
+            "filter[type]": "hotel",
+            "filter[geo]": "251",
+            "format[withNearEntities]": "1",
+            "format[withBusyEntities]": "1",
+            "order[priceFrom]": "0"
+        }
+    
     # Получаем текущую директорию
     current_dir = Path(__file__).parent
     
+    # Ответы уже лежат в архиве, в контрольной точке достаточно offset
+    checkpoint = CheckpointStore("tvil_api")
+    state = checkpoint.load()
+    if state:
+        offset = state["offset"]
+        print(f"Продолжаем с контрольной точки: offset={offset}")
+    completed = False
+    
+    # Архив прогона дописывается и при продолжении с контрольной точки
+    archive = RawArchiveWriter(current_dir / "raw" / f"tvil_{checkpoint.run_id}.ndjson.gz")
+    
+    def save_page(page_offset, hotels):
+        """Пишет отели страницы в архив и сбрасывает блок до фиксации контрольной точки"""
+        for hotel in hotels:
+            archive.write(hotel.get("id", ""), hotel)
+        archive.flush()
+        print(f"offset={page_offset}: {len(hotels)} отелей сохранено в {archive.path.name}")
+    
     with sync_playwright() as p:
         # Запускаем браузер
         browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
+        blocker = ResourceBlocker("tvil")
         
-        # Сначала открываем главную страницу, чтобы получить cookies и пройти антибот
+        # Сначала открываем главную страницу, чтобы получить cookies и пройти антибот.
+        # Если сессия из кэша ещё принимается API, ожидание антибота пропускается
         print("Инициализация сессии через главную страницу...")
-        page = context.new_page()
-        page.goto("https://tvil.ru/city/irkutskaya-oblast/hotels/", wait_until="networkidle")
-        time.sleep(5)  # Даём больше времени на обработку антибота
+        context, page = tvil_fetch.open_session_page(
+            browser,
+            f"{site}/city/irkutskaya-oblast/hotels/",
+            "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+            tvil_fetch.build_url(base_url, build_params(1), 0),
+            SessionCache("tvil"),
+            blocker
+        )
         
         # Теперь делаем запросы через JavaScript прямо в контексте страницы
         # Это обходит антибот, так как запрос выполняется как обычный браузерный запрос
         
-        while True:
-            # Формируем URL с параметрами
-            params = {
-                "page[limit]": str(limit),
-                "page[offset]": str(offset),
-                "include": "params,child_params,photos_t2,photos_t1,tooltip,services,inflect,characteristics",
-                "filter[type]": "hotel",
-                "filter[geo]": "251",
-                "format[withNearEntities]": "1",
-                "format[withBusyEntities]": "1",
-                "order[priceFrom]": "0"
-            }
+        # Калиброванный page[limit] берётся из кэша; калибровка запускается только по calibrate=True
+        limit = tvil_fetch.choose_page_limit(page, base_url, build_params(limit), calibrate, limit)
+        
+        if concurrency:
+            def handle_page(page_offset, data, hotels):
+                save_page(page_offset, hotels)
+                checkpoint.commit(offset=page_offset + limit)
             
-            # Формируем query string
-            query_string = "&".join([f"{k}={v}" for k, v in params.items()])
-            url = f"{base_url}?{query_string}"
+            try:
+                completed, stats = tvil_fetch.fetch_offsets_parallel(
+                    page, base_url, build_params(limit), offset, limit, concurrency, handle_page
+                )
+                tvil_fetch.print_batch_stats(stats)
+            except Exception as e:
+                print(f"Ошибка параллельного обхода: {e}")
+            
+            # Если параллельный обход не завершился, последовательный цикл продолжит с контрольной точки
+            offset = checkpoint.load().get("offset", offset)
+        
+        while not completed:
+            # Формируем URL с параметрами
+            url = tvil_fetch.build_url(base_url, build_params(limit), offset)
             
             try:
                 print(f"Запрос для offset={offset}...")
                 
                 # Делаем запрос через JavaScript fetch в контексте страницы
                 # Это использует все cookies и заголовки браузера
-                response_data = page.evaluate("""
-                    async (url) => {
-                        try {
-                            const response = await fetch(url, {
-                                method: 'GET',
-                                credentials: 'same-origin',
-                                headers: {
-                                    'Referer': 'https://tvil.ru/city/irkutskaya-oblast/hotels/'
-                                }
-                            });
-                            const contentType = response.headers.get('content-type') || '';
-                            let data;
-                            let text;
-                            
-                            // Пытаемся прочитать как текст сначала
-                            text = await response.text();
-                            
-                            // Пытаемся распарсить как JSON, даже если Content-Type не application/json
-                            try {
-                                data = JSON.parse(text);
-                            } catch (e) {
-                                // Если не JSON, возвращаем текст
-                                return {
-                                    status: response.status,
-                                    statusText: response.statusText,
-                                    headers: Object.fromEntries(response.headers.entries()),
-                                    data: null,
-                                    error: 'Not JSON response',
-                                    text: text.substring(0, 1000)
-                                };
-                            }
-                            
-                            return {
-                                status: response.status,
-                                statusText: response.statusText,
-                                headers: Object.fromEntries(response.headers.entries()),
-                                data: data
-                            };
-                        } catch (error) {
-                            return {
-                                status: 0,
-                                statusText: 'Error',
-                                error: error.toString()
-                            };
-                        }
-                    }
-                """, url)
+                response_data = tvil_fetch.fetch_json(page, url)
                 
                 print(f"Получен ответ со статусом {response_data['status']}")
                 
@@ -150,28 +163,23 @@ def parse_tvil_api():
                 # Если список отелей пуст, останавливаемся
                 if not hotels or len(hotels) == 0:
                     print(f"Получен пустой список отелей для offset={offset}. Останавливаем парсинг.")
+                    completed = True
                     break
                 
-                # Сохраняем в файл
-                filename = current_dir / f"tvil_irko_{offset}.json"
-                with open(filename, "w", encoding="utf-8") as f:
-                    json.dump(data, f, ensure_ascii=False, indent=2)
-                
-                # Выводим информацию
+                # Сохраняем в архив
                 hotels_count = len(hotels) if isinstance(hotels, list) else 0
-                print(f"Сохранён файл: {filename.name}, отелей в ответе: {hotels_count}")
+                save_page(offset, hotels)
+                checkpoint.commit(offset=offset + limit)
                 
                 # Если получили меньше отелей, чем limit, значит это последняя страница
                 if hotels_count < limit:
                     print(f"Получено меньше отелей ({hotels_count}), чем limit ({limit}). Это последняя страница.")
+                    completed = True
                     break
                 
                 # Увеличиваем offset для следующей итерации
                 offset += limit
                 
-                # Небольшая задержка между запросами
-                time.sleep(0.5)
-                
             except Exception as e:
                 print(f"Ошибка при выполнении запроса для offset={offset}: {e}")
                 # Сохраняем ошибку для анализа
@@ -182,8 +190,14 @@ def parse_tvil_api():
                 print(f"Ошибка сохранена в {error_filename.name}")
                 break
         
+        blocker.print_report()
+        get_host_limiters().print_report()
         browser.close()
     
+    archive.close()
+    if completed:
+        checkpoint.clear()
+    
     print(f"\nПарсинг завершён. Всего обработано offset до {offset}.")
 
 if __name__ == "__main__":
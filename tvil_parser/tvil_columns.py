@@ -0,0 +1,218 @@
+"""
+Колонки выгрузки ТВИЛ и путь к каждой в сущности JSON:API.
+
+COLUMN_SPEC - единственное описание разбора отеля: и живой обход
+(tvil_hotels.py), и офлайн-конвертер (tvil_json_to_csv.py) получают строку
+из hotel_row. Спецификация один раз при импорте компилируется в функцию:
+генерируется код, который достаёт значения всех ключей одного объекта
+одним вызовом operator.itemgetter, без dict.get на каждую колонку.
+
+Путь - ключи через точку от корня сущности; число - элемент списка
+(0 - первый, -1 - последний). Если объекта или списка по пути нет, либо он
+другого типа или пуст, значение колонки - пустая строка.
+"""
+import json
+from operator import itemgetter
+
+MISSING = ""
+
+# Один настроенный кодировщик: json.dumps с ensure_ascii=False создаёт новый на каждый вызов
+_encode_json = json.JSONEncoder(ensure_ascii=False, check_circular=False).encode
+
+
+def params_json(value):
+    """params сериализуется в JSON строку; нет ключа - "{}", не словарь - пустая строка"""
+    if type(value) is dict:
+        return _encode_json(value)
+    # Отсутствующий ключ приходит как MISSING: прежде params по умолчанию был {}
+    return "{}" if value is MISSING else MISSING
+
+
+# (колонка, путь[, преобразование])
+COLUMN_SPEC = [
+    ("id", "id"),
+    ("title", "attributes.title"),
+    ("cabinet_title", "attributes.cabinet_title"),
+    ("full_title", "attributes.full_title"),
+    ("list_title", "attributes.list_title"),
+    ("entity_type", "attributes.entity_type"),
+    ("subtype", "attributes.subtype"),
+    ("address", "attributes.address"),
+    ("short_address", "attributes.short_address"),
+    ("full_address", "attributes.full_address"),
+    ("map_address", "attributes.map_address"),
+    ("city_address", "attributes.city_address"),
+    ("latitude", "attributes.latitude"),
+    ("longitude", "attributes.longitude"),
+    ("description", "attributes.description"),
+    ("conditions", "attributes.conditions"),
+    ("price_min", "attributes.price.0"),
+    ("price_max", "attributes.price.-1"),
+    ("daily_price_min", "attributes.daily_rubles_price.0"),
+    ("daily_price_max", "attributes.daily_rubles_price.-1"),
+    ("year_price_min", "attributes.year_price.0"),
+    ("year_price_max", "attributes.year_price.-1"),
+    ("currency_id", "attributes.currency.id"),
+    ("currency_title", "attributes.currency.title"),
+    ("currency_symbol", "attributes.currency.symbol"),
+    ("prepayment", "attributes.prepayment"),
+    ("rooms_total", "attributes.rooms_total"),
+    ("bedroom_total", "attributes.bedroom_total"),
+    ("count_rooms", "attributes.count_rooms"),
+    ("count_reviews", "attributes.count_reviews"),
+    ("count_real_reviews", "attributes.count_real_reviews"),
+    ("rating_overall", "attributes.rating_overall"),
+    ("entity_rating", "attributes.entity_rating"),
+    ("total_rating", "attributes.total_rating"),
+    ("user_rating", "attributes.user_rating"),
+    ("stars", "attributes.stars"),
+    ("country_id", "attributes.country_id"),
+    ("region_id", "attributes.region_id"),
+    ("city_id", "attributes.city_id"),
+    ("aria_id", "attributes.aria_id"),
+    ("count_photos", "attributes.count_photos"),
+    ("count_guest", "attributes.count_guest"),
+    ("count_guest_max", "attributes.count_guest_max"),
+    ("categories_count", "attributes.categories_count"),
+    ("occupied_categories", "attributes.occupied_categories"),
+    ("last_reserve", "attributes.last_reserve"),
+    ("last_reserve_label", "attributes.last_reserve_label"),
+    ("is_new", "attributes.is_new"),
+    ("is_instant_reserve", "attributes.is_instant_reserve"),
+    ("is_searchable_and_has_prices", "attributes.is_searchable_and_has_prices"),
+    ("allow_quota", "attributes.allow_quota"),
+    ("food_type_label", "attributes.food_type.label"),
+    ("food_type_text_short", "attributes.food_type.text_short"),
+    ("food_type_text_full", "attributes.food_type.text_full"),
+    ("status_enabled", "attributes.status.enabled"),
+    ("status_checked", "attributes.status.checked"),
+    ("status_deleted", "attributes.status.deleted"),
+    ("owner_first_time", "attributes.owner.first_time"),
+    ("owner_update_time", "attributes.owner.update_time"),
+    ("ros_accreditation_code", "attributes.ros_accreditation_code"),
+    ("ros_accreditation_url", "attributes.ros_accreditation_url"),
+    ("ics_export_link", "attributes.ics_export_link"),
+    ("more_often", "attributes.more_often"),
+    ("more_often_type", "attributes.more_often_type"),
+    ("params", "attributes.params", params_json),
+]
+
+COLUMNS = [entry[0] for entry in COLUMN_SPEC]
+
+
+def _parse_path(path):
+    return tuple(int(part) if part.lstrip("-").isdigit() else part for part in path.split("."))
+
+
+class _Defaulted(dict):
+    """Словарь, в котором отсутствующий ключ - пустое значение"""
+
+    def __missing__(self, key):
+        return MISSING
+
+
+class _Node:
+    """Объект на пути спецификации: его ключи (или индексы) и переменная в генерируемом коде"""
+
+    def __init__(self, var):
+        self.var = var
+        self.children = {}
+        self.is_list = False
+
+
+def compile_row_getter(spec):
+    """
+    Компилирует спецификацию в функцию entity -> кортеж значений колонок.
+
+    Returns:
+        (функция, исходный код функции)
+    """
+    root = _Node("entity")
+    leaves = []
+    names = {"_Defaulted": _Defaulted, "NO_KEYS": _Defaulted(), "NO_ITEMS": (MISSING,), "MISSING": MISSING}
+    counter = 0
+
+    for index, entry in enumerate(spec):
+        path = _parse_path(entry[1])
+        node = root
+        for depth, part in enumerate(path):
+            if isinstance(part, int):
+                node.is_list = True
+            if part not in node.children:
+                counter += 1
+                node.children[part] = _Node(f"v{counter}")
+            child = node.children[part]
+            if depth == len(path) - 1:
+                leaves.append((child, entry[2] if len(entry) > 2 else None, index))
+            node = child
+
+    lines = ["def hotel_row(entity):"]
+
+    def emit(node, indent="    "):
+        keys = list(node.children)
+        child_vars = [node.children[key].var for key in keys]
+        if node.is_list:
+            # Пустой или не список - все элементы пустые
+            lines.append(f"{indent}if type({node.var}) is not list or not {node.var}:")
+            lines.append(f"{indent}    {node.var} = NO_ITEMS")
+            for key, var in zip(keys, child_vars):
+                if key in (0, -1):
+                    lines.append(f"{indent}{var} = {node.var}[{key}]")
+                else:
+                    lines.append(f"{indent}{var} = {node.var}[{key}] if len({node.var}) > {abs(key) - (key < 0)} else MISSING")
+        else:
+            if node is not root:
+                lines.append(f"{indent}if type({node.var}) is not dict:")
+                lines.append(f"{indent}    {node.var} = NO_KEYS")
+            getter, complete = f"get_{node.var}", f"complete_{node.var}"
+            names[getter] = itemgetter(*keys)
+            names[complete] = [True]
+            targets = ", ".join(child_vars) + ("," if len(keys) == 1 else "")
+            call = f"{getter}({node.var})" + ("," if len(keys) == 1 else "")
+            defaulted_call = f"{getter}(_Defaulted({node.var}))" + ("," if len(keys) == 1 else "")
+            # Пока у объектов есть все ключи - один вызов itemgetter; после первого
+            # объекта без ключа - itemgetter по копии, где отсутствующие ключи пустые
+            lines.append(f"{indent}if {complete}[0]:")
+            lines.append(f"{indent}    try:")
+            lines.append(f"{indent}        {targets} = {call}")
+            lines.append(f"{indent}    except KeyError:")
+            lines.append(f"{indent}        {complete}[0] = False")
+            lines.append(f"{indent}        {targets} = {defaulted_call}")
+            lines.append(f"{indent}else:")
+            lines.append(f"{indent}    {targets} = {defaulted_call}")
+        for key in keys:
+            child = node.children[key]
+            if child.children:
+                emit(child, indent)
+
+    emit(root)
+
+    values = [None] * len(spec)
+    for child, transform, index in leaves:
+        if transform is None:
+            values[index] = child.var
+        else:
+            name = f"transform_{index}"
+            names[name] = transform
+            values[index] = f"{name}({child.var})"
+    lines.append(f"    return ({', '.join(values)},)")
+
+    source = "\n".join(lines) + "\n"
+    exec(compile(source, "<tvil_columns.hotel_row>", "exec"), names)
+    return names["hotel_row"], source
+
+
+hotel_row, HOTEL_ROW_SOURCE = compile_row_getter(COLUMN_SPEC)
+hotel_row.__doc__ = "Строка выгрузки (кортеж в порядке COLUMNS) из сущности ТВИЛ"
+
+
+def row_to_dict(row, columns=COLUMNS):
+    """Словарь колонок из строки (для SnapshotStore и прежнего API extract_hotel_data)"""
+    return dict(zip(columns, row))
+
+
+def row_from_record(record, columns=COLUMNS):
+    """Строка из записи контрольной точки: список или словарь (записи до перехода на кортежи)"""
+    if isinstance(record, dict):
+        return tuple(record.get(column, MISSING) for column in columns)
+    return tuple(record)
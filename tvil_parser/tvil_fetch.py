@@ -0,0 +1,480 @@
+"""
+Запросы к API ТВИЛ из контекста уже авторизованной страницы Playwright.
+
+Один вызов page.evaluate может выполнить сразу несколько fetch с ограничением
+параллельности, поэтому после первого ответа (в нём есть общее число отелей)
+оставшиеся offset забираются окнами, а не по одному.
+"""
+import json
+import math
+import os
+import sys
+import time
+from pathlib import Path
+
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.browser_wait import PageWaiter
+from common.cassette import get_cassette
+from common.endpoints import site_url
+from common.rate_limit import get_host_limiters
+from common.session_cache import DEFAULT_SESSION_DIR
+
+REFERER = f"{site_url('tvil')}/city/irkutskaya-oblast/hotels/"
+
+# Фиксированная пауза прежнего последовательного режима, используется для оценки выигрыша
+SERIAL_DELAY = 0.5
+
+# Предельное ожидание антибота при открытии сессии без кэша, миллисекунды
+ANTIBOT_TIMEOUT_MS = 15000
+
+# Полный список include, который запрашивает сайт
+FULL_INCLUDE = ["params", "child_params", "photos_t2", "photos_t1", "tooltip", "services", "inflect", "characteristics"]
+
+# Какие include нужны для колонок экспорта. Остальные колонки берутся из attributes
+# и не требуют связанных ресурсов, поэтому фото, подсказки и склонения не запрашиваем.
+INCLUDE_BY_COLUMN = {
+    "params": ["params"],
+}
+
+# Кандидаты page[limit] для калибровки, по возрастанию
+PAGE_LIMIT_CANDIDATES = [20, 50, 100, 200, 500]
+
+# Подобранный page[limit] кэшируется рядом с сессиями, чтобы не калибровать на каждом прогоне
+PAGE_LIMIT_CACHE = DEFAULT_SESSION_DIR / "tvil_page_limit.json"
+PAGE_LIMIT_CACHE_TTL = 7 * 24 * 60 * 60
+
+FETCH_BATCH_JS = """
+async ({urls, concurrency, referer}) => {
+    const results = new Array(urls.length);
+    let next = 0;
+
+    // Окно у лимитера хоста берётся перед каждым запросом, а не на весь пакет сразу
+    async function paced(url) {
+        const wait = await window.tvilReserveSlot(url);
+        if (wait > 0) {
+            await new Promise(resolve => setTimeout(resolve, wait * 1000));
+        }
+        const result = await fetchOne(url);
+        await window.tvilRecordResponse(url, result.status, result.data !== null && result.data !== undefined);
+        return result;
+    }
+
+    async function fetchOne(url) {
+        const started = performance.now();
+        try {
+            const response = await fetch(url, {
+                method: 'GET',
+                credentials: 'same-origin',
+                headers: {
+                    'Referer': referer
+                }
+            });
+
+            // Пытаемся прочитать как текст сначала
+            const text = await response.text();
+            const elapsed_ms = performance.now() - started;
+            const bytes = new TextEncoder().encode(text).length;
+
+            // Пытаемся распарсить как JSON, даже если Content-Type не application/json
+            try {
+                return {
+                    status: response.status,
+                    statusText: response.statusText,
+                    data: JSON.parse(text),
+                    bytes: bytes,
+                    elapsed_ms: elapsed_ms
+                };
+            } catch (e) {
+                return {
+                    status: response.status,
+                    statusText: response.statusText,
+                    data: null,
+                    error: 'Not JSON response',
+                    text: text.substring(0, 1000),
+                    bytes: bytes,
+                    elapsed_ms: elapsed_ms
+                };
+            }
+        } catch (error) {
+            return {
+                status: 0,
+                statusText: 'Error',
+                error: error.toString(),
+                elapsed_ms: performance.now() - started
+            };
+        }
+    }
+
+    async function worker() {
+        while (next < urls.length) {
+            const index = next++;
+            results[index] = await paced(urls[index]);
+        }
+    }
+
+    const workers = [];
+    for (let i = 0; i < Math.min(concurrency, urls.length); i++) {
+        workers.push(worker());
+    }
+    await Promise.all(workers);
+    return results;
+}
+"""
+
+
+def build_include(columns):
+    """Список include для выгрузки заданных колонок, в порядке FULL_INCLUDE"""
+    needed = set()
+    for column in columns:
+        needed.update(INCLUDE_BY_COLUMN.get(column, []))
+    return ",".join([name for name in FULL_INCLUDE if name in needed])
+
+
+def build_url(base_url, params, offset):
+    """Собирает URL запроса для заданного offset"""
+    params = dict(params, **{"page[offset]": str(offset)})
+    query_string = "&".join([f"{k}={v}" for k, v in params.items()])
+    return f"{base_url}?{query_string}"
+
+
+def _record_response(url, status, has_json):
+    """Учитывает ответ на fetch из страницы в лимитере хоста"""
+    rate_limiters = get_host_limiters()
+    # status 0 - сетевая ошибка, хост не отвечал
+    if status:
+        content_type = "application/json" if has_json else ""
+        rate_limiters.record(url, status, content_type, expects_json=True)
+    else:
+        rate_limiters.record_timeout(url)
+
+
+def bind_rate_limiter(page):
+    """
+    Делает лимитер хоста доступным из страницы: window.tvilReserveSlot(url)
+    занимает окно и возвращает паузу до него в секундах, window.tvilRecordResponse
+    учитывает ответ. Привязки переживают навигации, поэтому ставятся один раз на страницу.
+    """
+    if page.evaluate("() => typeof window.tvilReserveSlot === 'function'"):
+        return
+    page.expose_function("tvilReserveSlot", get_host_limiters().reserve)
+    page.expose_function("tvilRecordResponse", _record_response)
+
+
+def fetch_batch(page, urls, concurrency=1):
+    """
+    Выполняет fetch для всех urls одним вызовом page.evaluate,
+    не более concurrency запросов одновременно.
+    Возвращает ответы в том же порядке, что и urls.
+    Каждый запрос прямо перед отправкой берёт окно у общего лимитера хоста,
+    а его ответ сразу учитывается, так что снижение частоты действует и внутри пакета.
+    С кассетой в режиме replay ответы берутся из неё, страница не используется.
+    """
+    cassette = get_cassette()
+    if cassette and cassette.replaying:
+        return [cassette.replay("fetch", "GET", url, None) for url in urls]
+    bind_rate_limiter(page)
+    responses = page.evaluate(FETCH_BATCH_JS, {"urls": urls, "concurrency": concurrency, "referer": REFERER})
+    if cassette:
+        for url, response_data in zip(urls, responses):
+            cassette.record("fetch", "GET", url, None, response_data)
+    return responses
+
+
+def fetch_json(page, url):
+    """Один запрос через fetch в контексте страницы"""
+    return fetch_batch(page, [url])[0]
+
+
+def open_session_page(browser, init_url, user_agent, probe_url, session_cache, blocker=None):
+    """
+    Открывает страницу ТВИЛ с рабочей сессией и возвращает (context, page).
+    blocker - профиль блокировки ресурсов, подключается к каждому контексту.
+
+    Сессия из кэша проверяется одним запросом probe_url из страницы; если она
+    принята, networkidle и ожидание антибота пропускаются. Иначе страница
+    открывается с чистым контекстом, антибот считается пройденным, когда
+    probe_url начинает отвечать 200, и полученная сессия сохраняется в кэш.
+    С кассетой в режиме replay сайт не открывается: запросы всё равно не идут в сеть.
+    """
+    cassette = get_cassette()
+    if cassette and cassette.replaying:
+        context = browser.new_context(user_agent=user_agent)
+        return context, context.new_page()
+
+    started_at = time.perf_counter()
+    storage_state = session_cache.load()
+    if storage_state is not None:
+        context = browser.new_context(user_agent=user_agent, storage_state=storage_state)
+        if blocker:
+            blocker.install(context)
+        page = context.new_page()
+        page.goto(init_url, wait_until="domcontentloaded")
+        error = response_error(fetch_json(page, probe_url))
+        if error is None:
+            print(f"Сессия {session_cache.source} взята из кэша за {time.perf_counter() - started_at:.2f} с")
+            return context, page
+        print(f"Сессия {session_cache.source} из кэша отклонена ({error}), проходим антибот заново")
+        context.close()
+        session_cache.invalidate()
+    
+    context = browser.new_context(user_agent=user_agent)
+    if blocker:
+        blocker.install(context)
+    page = context.new_page()
+    page.goto(init_url, wait_until="domcontentloaded")
+    waiter = PageWaiter(page)
+    waiter.for_network_idle("network_idle")
+    waiter.for_condition(
+        "antibot",
+        lambda: response_error(fetch_json(page, probe_url)) is None,
+        timeout=ANTIBOT_TIMEOUT_MS
+    )
+    waiter.print_summary()
+    session_cache.save(context.storage_state())
+    print(f"Новая сессия {session_cache.source} получена за {time.perf_counter() - started_at:.2f} с")
+    return context, page
+
+
+def extract_entities(data):
+    """Возвращает список отелей из ответа API (структура ответа может быть разной)"""
+    if isinstance(data, dict):
+        if "data" in data:
+            return data["data"]
+        if "entities" in data:
+            return data["entities"]
+        return []
+    if isinstance(data, list):
+        return data
+    return []
+
+
+def extract_total(data):
+    """Общее число отелей по фильтру из meta ответа, если API его вернул"""
+    if not isinstance(data, dict):
+        return None
+    meta = data.get("meta") or {}
+    for value in (meta.get("total"), meta.get("count"), (meta.get("pagination") or {}).get("total")):
+        if isinstance(value, int):
+            return value
+        if isinstance(value, str) and value.isdigit():
+            return int(value)
+    return None
+
+
+def response_error(response_data):
+    """Текст ошибки для неуспешного ответа или None"""
+    if "error" in response_data:
+        return response_data["error"]
+    if response_data["status"] != 200:
+        return f"сервер вернул статус {response_data['status']}"
+    if response_data.get("data") is None:
+        return "пустой ответ"
+    return None
+
+
+def fetch_offsets_parallel(page, base_url, params, start_offset, limit, concurrency, handle_page):
+    """
+    Забирает все страницы начиная со start_offset окнами по concurrency запросов.
+
+    Первая страница запрашивается отдельно, чтобы узнать общее число отелей.
+    handle_page(offset, data, hotels) вызывается строго в порядке offset.
+
+    Returns:
+        (completed, stats): completed=False, если обход прервался на ошибке
+        или API не вернул общее число отелей (тогда нужен последовательный режим)
+    """
+    started_at = time.perf_counter()
+    responses = []
+
+    first = fetch_json(page, build_url(base_url, params, start_offset))
+    responses.append(first)
+    error = response_error(first)
+    if error:
+        print(f"Ошибка для offset={start_offset}: {error}")
+        return False, _batch_stats(responses, started_at)
+
+    hotels = extract_entities(first["data"])
+    handle_page(start_offset, first["data"], hotels)
+    if len(hotels) < limit:
+        return True, _batch_stats(responses, started_at)
+
+    total = extract_total(first["data"])
+    if total is None:
+        print("API не вернул общее число отелей, параллельный режим недоступен")
+        return False, _batch_stats(responses, started_at)
+
+    offsets = list(range(start_offset + limit, total, limit))
+    print(f"Всего отелей: {total}, осталось запросить {len(offsets)} страниц по {concurrency} параллельно")
+
+    for window_start in range(0, len(offsets), concurrency):
+        window = offsets[window_start:window_start + concurrency]
+        urls = [build_url(base_url, params, offset) for offset in window]
+        batch = fetch_batch(page, urls, concurrency)
+        responses.extend(batch)
+
+        for offset, response_data in zip(window, batch):
+            error = response_error(response_data)
+            if error:
+                print(f"Ошибка для offset={offset}: {error}")
+                return False, _batch_stats(responses, started_at)
+
+            hotels = extract_entities(response_data["data"])
+            if not hotels:
+                return True, _batch_stats(responses, started_at)
+            handle_page(offset, response_data["data"], hotels)
+
+    return True, _batch_stats(responses, started_at)
+
+
+def _batch_stats(responses, started_at):
+    """
+    Сравнение фактического времени с оценкой последовательного цикла.
+    Последовательный цикл здесь не запускается: его время - оценка по сумме
+    длительностей ответов и паузам SERIAL_DELAY, а не замер.
+    """
+    wall = time.perf_counter() - started_at
+    serial = sum(r.get("elapsed_ms", 0) for r in responses) / 1000 + SERIAL_DELAY * max(len(responses) - 1, 0)
+    return {
+        "pages": len(responses),
+        "wall_s": wall,
+        "serial_estimate_s": serial,
+        "saved_estimate_s": serial - wall
+    }
+
+
+def print_batch_stats(stats):
+    print(
+        f"Страниц: {stats['pages']}, время: {stats['wall_s']:.1f} с, "
+        f"последовательно заняло бы ~{stats['serial_estimate_s']:.1f} с (оценка, не замер), "
+        f"оценка выигрыша ~{stats['saved_estimate_s']:.1f} с"
+    )
+    print("Для замера последовательного режима запустите обход с concurrency=None")
+
+
+def calibrate_page_limit(page, base_url, params, candidates=None):
+    """
+    Подбирает максимальный page[limit], который принимает API.
+
+    Кандидат считается принятым, если ответ успешный и в нём ровно limit отелей
+    (или все отели, если их меньше). Заодно сравнивает объём ответа с полным include
+    и с урезанным из params, чтобы показать экономию трафика.
+
+    Returns:
+        (limit, report)
+    """
+    candidates = candidates or PAGE_LIMIT_CANDIDATES
+    base_limit = candidates[0]
+
+    # Объём страницы с полным и урезанным include на одном и том же limit
+    full_params = dict(params, **{"page[limit]": str(base_limit), "include": ",".join(FULL_INCLUDE)})
+    projected_params = dict(params, **{"page[limit]": str(base_limit)})
+    full, projected = fetch_batch(page, [
+        build_url(base_url, full_params, 0),
+        build_url(base_url, projected_params, 0)
+    ], 2)
+    for response_data in (full, projected):
+        error = response_error(response_data)
+        if error:
+            print(f"Калибровка невозможна: {error}")
+            return base_limit, None
+
+    total = extract_total(projected["data"])
+    best_limit = base_limit
+    for limit in candidates[1:]:
+        if total is not None and best_limit >= total:
+            break
+        response_data = fetch_json(page, build_url(base_url, dict(params, **{"page[limit]": str(limit)}), 0))
+        if response_error(response_data):
+            break
+        expected = min(limit, total) if total is not None else limit
+        if len(extract_entities(response_data["data"])) < expected:
+            break
+        best_limit = limit
+
+    report = {
+        "total": total,
+        "page_limit": best_limit,
+        "full_bytes_per_page": full.get("bytes", 0),
+        "projected_bytes_per_page": projected.get("bytes", 0),
+        "round_trips_before": math.ceil(total / base_limit) if total else None,
+        "round_trips_after": math.ceil(total / best_limit) if total else None,
+    }
+    return best_limit, report
+
+
+def load_page_limit(include, path=None):
+    """Подобранный ранее page[limit] для набора include или None, если его нет или он просрочен"""
+    path = Path(path) if path else PAGE_LIMIT_CACHE
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f).get(include)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Не удалось прочитать {path.name}: {e}")
+        return None
+    if not cached or cached.get("expires_at", 0) <= time.time():
+        return None
+    return cached["page_limit"]
+
+
+def save_page_limit(include, limit, path=None):
+    """Атомарно сохраняет page[limit] для набора include со сроком годности PAGE_LIMIT_CACHE_TTL"""
+    path = Path(path) if path else PAGE_LIMIT_CACHE
+    cached = {}
+    if path.exists():
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except (json.JSONDecodeError, OSError):
+            cached = {}
+    saved_at = time.time()
+    cached[include] = {"page_limit": limit, "saved_at": saved_at, "expires_at": saved_at + PAGE_LIMIT_CACHE_TTL}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cached, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def choose_page_limit(page, base_url, params, calibrate=False, default=20):
+    """
+    page[limit] для обхода.
+
+    Без calibrate берётся значение из кэша (или default, если кэша нет), и лишних
+    запросов к API не делается. calibrate=True явно запускает калибровку и
+    обновляет кэш.
+    """
+    include = params.get("include", "")
+    if not calibrate:
+        cached = load_page_limit(include)
+        if cached:
+            print(f"page[limit]={cached} взят из кэша калибровки")
+            return cached
+        return default
+    try:
+        limit, report = calibrate_page_limit(page, base_url, params)
+    except Exception as e:
+        print(f"Ошибка калибровки page[limit]: {e}")
+        return default
+    print_calibration_report(report)
+    if report:
+        save_page_limit(include, limit)
+    return limit
+
+
+def print_calibration_report(report):
+    if not report:
+        return
+    full = report["full_bytes_per_page"]
+    projected = report["projected_bytes_per_page"]
+    saved = 100 * (1 - projected / full) if full else 0
+    print(f"Объём страницы: {full} байт с полным include, {projected} байт с урезанным (-{saved:.0f}%)")
+    if report["total"]:
+        print(
+            f"page[limit]={report['page_limit']}: запросов на регион "
+            f"{report['round_trips_before']} -> {report['round_trips_after']}"
+        )
+    else:
+        print(f"page[limit]={report['page_limit']} (API не вернул общее число отелей)")
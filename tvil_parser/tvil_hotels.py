@@ -1,28 +1,46 @@
-import json
 import csv
 import sys
 from pathlib import Path
 from playwright.sync_api import sync_playwright
-import time
+import tvil_fetch
+
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.checkpoint import CheckpointStore
+from common.columnar import ParquetWriter
+from common.endpoints import site_url
+from common.rate_limit import get_host_limiters
+from common.resource_blocking import ResourceBlocker
+from common.session_cache import SessionCache
+from common.snapshot_store import SnapshotStore
+from tvil_columns import COLUMNS, hotel_row, row_from_record, row_to_dict
 
 # Настройка stdout для корректного вывода Юникода
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8')
 
 class TvilHotelsParser:
-    def __init__(self):
-        self.base_url = "https://tvil.ru/api/entities"
-        self.init_url = "https://tvil.ru/city/irkutskaya-oblast/hotels/"
+    def __init__(self, db_path=None, site=None):
+        # site - адрес сайта вместо https://tvil.ru (например, локальной заглушки)
+        self.site = site_url("tvil", site)
+        self.base_url = f"{self.site}/api/entities"
+        self.init_url = f"{self.site}/city/irkutskaya-oblast/hotels/"
         self.all_hotels = []
         self.offset = 0
         self.limit = 20
         self.current_dir = Path(__file__).parent
+        self.checkpoint = CheckpointStore("tvil_hotels")
+        self.session_cache = SessionCache("tvil")
+        self.db_path = db_path
+        
+        # Все поля, которые выгружаются в CSV: общие с tvil_json_to_csv колонки и ссылка на отель
+        self.fieldnames = COLUMNS + ['url']
         
-        # Параметры запроса
+        # Параметры запроса; include ограничен тем, что нужно для выгружаемых колонок
         self.params = {
             "page[limit]": str(self.limit),
             "page[offset]": "0",
-            "include": "params,child_params,photos_t2,photos_t1,tooltip,services,inflect,characteristics",
+            "include": tvil_fetch.build_include(self.fieldnames),
             "filter[type]": "hotel",
             "filter[geo]": "251",
             "format[withNearEntities]": "1",
@@ -30,30 +48,57 @@ class TvilHotelsParser:
             "order[priceFrom]": "0"
         }
     
-    def get_all_hotels_list(self):
+    def get_all_hotels_list(self, concurrency=None, calibrate=False, storage="csv", parquet=False):
         """
         Парсит API ТВИЛ, получая отели с пагинацией через Playwright.
-        Сохраняет данные в CSV файл.
+        Сохраняет данные в CSV файл и/или в базу снимков SQLite.
+        concurrency=None - страницы по одной, N > 1 - окнами по N запросов из браузера.
+        calibrate=True - перед обходом подобрать максимальный page[limit] и сохранить его в кэш;
+        без него используется page[limit] из кэша прошлой калибровки или 20.
+        storage: "csv", "sqlite" или "both".
+        parquet=True - дополнительно выгрузить типизированный tvil_hotels.parquet.
         """
         with sync_playwright() as p:
             browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
+            blocker = ResourceBlocker("tvil")
             
-            # Инициализация сессии через главную страницу
+            # Инициализация сессии через главную страницу (или из кэша сессий)
             print("Инициализация сессии через главную страницу...")
-            page = context.new_page()
-            page.goto(self.init_url, wait_until="networkidle")
-            time.sleep(5)  # Даём время на обработку антибота
+            probe_url = tvil_fetch.build_url(self.base_url, dict(self.params, **{"page[limit]": "1"}), 0)
+            context, page = tvil_fetch.open_session_page(
+                browser,
+                self.init_url,
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+                probe_url,
+                self.session_cache,
+                blocker
+            )
+            
+            # Калиброванный page[limit] берётся из кэша; калибровка запускается только по calibrate=True
+            self._choose_page_limit(page, calibrate)
             
             # Парсим все страницы
-            self._parse_all_pages(page)
+            completed = None
+            if concurrency:
+                completed = self._parse_all_pages_parallel(page, concurrency)
+            if not completed:
+                completed = self._parse_all_pages(page)
             
+            blocker.print_report()
+            get_host_limiters().print_report()
             browser.close()
         
-        # Сохраняем данные в CSV
-        self._save_to_csv()
+        # Сохраняем данные в CSV и/или SQLite
+        if storage in ("csv", "both"):
+            self._save_to_csv()
+        if storage in ("sqlite", "both"):
+            self._save_to_db()
+        if parquet:
+            self._save_to_parquet()
+        
+        # После полного прохода контрольная точка больше не нужна
+        if completed:
+            self.checkpoint.clear()
         
         print(f"\nПарсинг завершён. Всего обработано {len(self.all_hotels)} отелей.")
         return self.all_hotels
@@ -61,9 +106,17 @@ class TvilHotelsParser:
     def _parse_all_pages(self, page):
         """
         Парсит все страницы с отелями через API запросы.
+        Продолжает с контрольной точки, если предыдущий прогон прервался.
+        Возвращает True, если обход дошёл до последней страницы.
         """
         self.offset = 0
         
+        state = self.checkpoint.load()
+        if state:
+            self.offset = state["offset"]
+            self.all_hotels = [row_from_record(record, self.fieldnames) for record in self.checkpoint.load_records()]
+            print(f"Продолжаем с контрольной точки: offset={self.offset}, уже собрано {len(self.all_hotels)} отелей")
+        
         while True:
             try:
                 # Обновляем offset в параметрах
@@ -80,83 +133,74 @@ class TvilHotelsParser:
                 
                 if not response_data:
                     print(f"Не удалось получить данные для offset={self.offset}")
-                    break
+                    return False
                 
                 # Извлекаем отели из ответа
                 hotels = self._extract_hotels_from_response(response_data)
                 
                 if not hotels or len(hotels) == 0:
                     print(f"Получен пустой список отелей для offset={self.offset}. Останавливаем парсинг.")
-                    break
+                    return True
                 
                 # Добавляем отели в общий список
                 self.all_hotels.extend(hotels)
                 print(f"Извлечено {len(hotels)} отелей. Всего: {len(self.all_hotels)}")
                 
+                # Фиксируем прогресс: при перезапуске начнём со следующего offset
+                self.checkpoint.commit(records=hotels, offset=self.offset + self.limit)
+                
                 # Если получили меньше отелей, чем limit, значит это последняя страница
                 if len(hotels) < self.limit:
                     print(f"Получено меньше отелей ({len(hotels)}), чем limit ({self.limit}). Это последняя страница.")
-                    break
+                    return True
                 
                 # Увеличиваем offset для следующей итерации
                 self.offset += self.limit
                 
-                # Небольшая задержка между запросами
-                time.sleep(0.5)
-                
             except Exception as e:
                 print(f"Ошибка при выполнении запроса для offset={self.offset}: {e}")
-                break
+                return False
+    
+    def _choose_page_limit(self, page, calibrate):
+        """Берёт page[limit] из кэша калибровки или подбирает его заново при calibrate=True"""
+        self.limit = tvil_fetch.choose_page_limit(page, self.base_url, self.params, calibrate, self.limit)
+        self.params["page[limit]"] = str(self.limit)
+    
+    def _parse_all_pages_parallel(self, page, concurrency):
+        """
+        Параллельный вариант _parse_all_pages: после первой страницы
+        оставшиеся offset запрашиваются окнами по concurrency штук.
+        Возвращает True при полном обходе, иначе обход продолжает последовательный режим.
+        """
+        state = self.checkpoint.load()
+        self.offset = state.get("offset", 0)
+        if state:
+            self.all_hotels = [row_from_record(record, self.fieldnames) for record in self.checkpoint.load_records()]
+            print(f"Продолжаем с контрольной точки: offset={self.offset}, уже собрано {len(self.all_hotels)} отелей")
+        
+        def handle_page(offset, data, entities):
+            hotels = self._extract_hotels_from_response(data)
+            self.all_hotels.extend(hotels)
+            self.checkpoint.commit(records=hotels, offset=offset + self.limit)
+            print(f"offset={offset}: извлечено {len(hotels)} отелей. Всего: {len(self.all_hotels)}")
+        
+        try:
+            completed, stats = tvil_fetch.fetch_offsets_parallel(
+                page, self.base_url, self.params, self.offset, self.limit, concurrency, handle_page
+            )
+        except Exception as e:
+            print(f"Ошибка параллельного обхода: {e}")
+            return False
+        
+        tvil_fetch.print_batch_stats(stats)
+        return completed
     
     def _make_api_request(self, page, url):
         """
         Выполняет API запрос через JavaScript fetch в контексте страницы.
         """
         try:
-            response_data = page.evaluate("""
-                async (url) => {
-                    try {
-                        const response = await fetch(url, {
-                            method: 'GET',
-                            credentials: 'same-origin',
-                            headers: {
-                                'Referer': 'https://tvil.ru/city/irkutskaya-oblast/hotels/'
-                            }
-                        });
-                        const contentType = response.headers.get('content-type') || '';
-                        let data;
-                        let text;
-                        
-                        // Пытаемся прочитать как текст сначала
-                        text = await response.text();
-                        
-                        // Пытаемся распарсить как JSON
-                        try {
-                            data = JSON.parse(text);
-                        } catch (e) {
-                            // Если не JSON, возвращаем ошибку
-                            return {
-                                status: response.status,
-                                statusText: response.statusText,
-                                error: 'Not JSON response',
-                                text: text.substring(0, 1000)
-                            };
-                        }
-                        
-                        return {
-                            status: response.status,
-                            statusText: response.statusText,
-                            data: data
-                        };
-                    } catch (error) {
-                        return {
-                            status: 0,
-                            statusText: 'Error',
-                            error: error.toString()
-                        };
-                    }
-                }
-            """, url)
+            response_data = tvil_fetch.fetch_json(page, url)
             
             print(f"Получен ответ со статусом {response_data['status']}")
             
@@ -178,7 +222,7 @@ class TvilHotelsParser:
     
     def _extract_hotels_from_response(self, data):
         """
-        Извлекает список отелей из ответа API.
+        Извлекает список отелей из ответа API: строки-кортежи в порядке self.fieldnames.
         """
         hotels = []
         
@@ -198,110 +242,11 @@ class TvilHotelsParser:
         else:
             return hotels
         
-        # Извлекаем информацию об отелях
+        # Строки в порядке self.fieldnames: колонки COLUMN_SPEC и ссылка на отель
         for hotel_item in hotels_data:
-            try:
-                hotel = {}
-                
-                # Извлекаем данные из структуры API
-                if isinstance(hotel_item, dict):
-                    # ID отеля
-                    hotel['id'] = hotel_item.get('id', '')
-                    
-                    # Атрибуты
-                    attributes = hotel_item.get('attributes', {})
-                    
-                    hotel['title'] = attributes.get('title', '')
-                    hotel['cabinet_title'] = attributes.get('cabinet_title', '')
-                    hotel['full_title'] = attributes.get('full_title', '')
-                    hotel['list_title'] = attributes.get('list_title', '')
-                    hotel['entity_type'] = attributes.get('entity_type', '')
-                    hotel['subtype'] = attributes.get('subtype', '')
-                    hotel['address'] = attributes.get('address', '')
-                    hotel['short_address'] = attributes.get('short_address', '')
-                    hotel['full_address'] = attributes.get('full_address', '')
-                    hotel['map_address'] = attributes.get('map_address', '')
-                    hotel['city_address'] = attributes.get('city_address', '')
-                    hotel['latitude'] = attributes.get('latitude', '')
-                    hotel['longitude'] = attributes.get('longitude', '')
-                    hotel['description'] = attributes.get('description', '')
-                    hotel['conditions'] = attributes.get('conditions', '')
-                    
-                    # Цены
-                    price = attributes.get('price', [])
-                    if isinstance(price, list) and len(price) >= 2:
-                        hotel['price_min'] = price[0]
-                        hotel['price_max'] = price[1]
-                    else:
-                        hotel['price_min'] = ''
-                        hotel['price_max'] = ''
-                    
-                    daily_price = attributes.get('daily_rubles_price', [])
-                    if isinstance(daily_price, list) and len(daily_price) >= 2:
-                        hotel['daily_price_min'] = daily_price[0]
-                        hotel['daily_price_max'] = daily_price[1]
-                    else:
-                        hotel['daily_price_min'] = ''
-                        hotel['daily_price_max'] = ''
-                    
-                    # Валюта
-                    currency = attributes.get('currency', {})
-                    hotel['currency_id'] = currency.get('id', '')
-                    hotel['currency_title'] = currency.get('title', '')
-                    hotel['currency_symbol'] = currency.get('symbol', '')
-                    
-                    hotel['prepayment'] = attributes.get('prepayment', '')
-                    hotel['rooms_total'] = attributes.get('rooms_total', '')
-                    hotel['bedroom_total'] = attributes.get('bedroom_total', '')
-                    hotel['count_rooms'] = attributes.get('count_rooms', '')
-                    hotel['count_reviews'] = attributes.get('count_reviews', '')
-                    hotel['count_real_reviews'] = attributes.get('count_real_reviews', '')
-                    hotel['rating_overall'] = attributes.get('rating_overall', '')
-                    hotel['entity_rating'] = attributes.get('entity_rating', '')
-                    hotel['total_rating'] = attributes.get('total_rating', '')
-                    hotel['user_rating'] = attributes.get('user_rating', '')
-                    hotel['stars'] = attributes.get('stars', '')
-                    hotel['country_id'] = attributes.get('country_id', '')
-                    hotel['region_id'] = attributes.get('region_id', '')
-                    hotel['city_id'] = attributes.get('city_id', '')
-                    hotel['aria_id'] = attributes.get('aria_id', '')
-                    hotel['count_photos'] = attributes.get('count_photos', '')
-                    hotel['count_guest'] = attributes.get('count_guest', '')
-                    hotel['count_guest_max'] = attributes.get('count_guest_max', '')
-                    hotel['categories_count'] = attributes.get('categories_count', '')
-                    hotel['occupied_categories'] = attributes.get('occupied_categories', '')
-                    hotel['last_reserve'] = attributes.get('last_reserve', '')
-                    hotel['last_reserve_label'] = attributes.get('last_reserve_label', '')
-                    hotel['is_new'] = attributes.get('is_new', False)
-                    hotel['is_instant_reserve'] = attributes.get('is_instant_reserve', False)
-                    hotel['is_searchable_and_has_prices'] = attributes.get('is_searchable_and_has_prices', False)
-                    hotel['allow_quota'] = attributes.get('allow_quota', False)
-                    hotel['food_type_label'] = attributes.get('food_type_label', '')
-                    hotel['food_type_text_short'] = attributes.get('food_type_text_short', '')
-                    hotel['food_type_text_full'] = attributes.get('food_type_text_full', '')
-                    hotel['status_enabled'] = attributes.get('status_enabled', '')
-                    hotel['status_checked'] = attributes.get('status_checked', '')
-                    hotel['status_deleted'] = attributes.get('status_deleted', '')
-                    hotel['owner_first_time'] = attributes.get('owner_first_time', '')
-                    hotel['owner_update_time'] = attributes.get('owner_update_time', '')
-                    hotel['ros_accreditation_code'] = attributes.get('ros_accreditation_code', '')
-                    hotel['ros_accreditation_url'] = attributes.get('ros_accreditation_url', '')
-                    hotel['ics_export_link'] = attributes.get('ics_export_link', '')
-                    hotel['more_often'] = attributes.get('more_often', '')
-                    hotel['more_often_type'] = attributes.get('more_often_type', '')
-                    
-                    # Параметры (params) - сохраняем как JSON строку
-                    params = attributes.get('params', {})
-                    hotel['params'] = json.dumps(params, ensure_ascii=False) if params else ''
-                    
-                    # URL отеля
-                    hotel['url'] = f"https://tvil.ru/entity/{hotel['id']}"
-                    
-                    hotels.append(hotel)
-                    
-            except Exception as e:
-                print(f"Error extracting hotel data: {e}")
-                continue
+            if isinstance(hotel_item, dict):
+                row = hotel_row(hotel_item)
+                hotels.append(row + (f"{self.site}/entity/{row[0]}",))
         
         return hotels
     
@@ -315,36 +260,42 @@ class TvilHotelsParser:
         
         csv_filename = self.current_dir / 'tvil_hotels.csv'
         
-        # Определяем все возможные поля
-        fieldnames = [
-            'id', 'title', 'cabinet_title', 'full_title', 'list_title', 'entity_type', 'subtype',
-            'address', 'short_address', 'full_address', 'map_address', 'city_address',
-            'latitude', 'longitude', 'description', 'conditions',
-            'price_min', 'price_max', 'daily_price_min', 'daily_price_max',
-            'currency_id', 'currency_title', 'currency_symbol',
-            'prepayment', 'rooms_total', 'bedroom_total', 'count_rooms',
-            'count_reviews', 'count_real_reviews', 'rating_overall', 'entity_rating',
-            'total_rating', 'user_rating', 'stars',
-            'country_id', 'region_id', 'city_id', 'aria_id',
-            'count_photos', 'count_guest', 'count_guest_max', 'categories_count',
-            'occupied_categories', 'last_reserve', 'last_reserve_label',
-            'is_new', 'is_instant_reserve', 'is_searchable_and_has_prices', 'allow_quota',
-            'food_type_label', 'food_type_text_short', 'food_type_text_full',
-            'status_enabled', 'status_checked', 'status_deleted',
-            'owner_first_time', 'owner_update_time',
-            'ros_accreditation_code', 'ros_accreditation_url', 'ics_export_link',
-            'more_often', 'more_often_type', 'params', 'url'
-        ]
         
         with open(csv_filename, 'w', encoding='utf-8-sig', newline='') as csv_file:
-            writer = csv.DictWriter(csv_file, fieldnames=fieldnames, delimiter=',', quoting=csv.QUOTE_MINIMAL)
-            writer.writeheader()
-            
-            for hotel in self.all_hotels:
-                writer.writerow(hotel)
+            writer = csv.writer(csv_file, delimiter=',', quoting=csv.QUOTE_MINIMAL)
+            writer.writerow(self.fieldnames)
+            writer.writerows(self.all_hotels)
         
         print(f"Сохранено {len(self.all_hotels)} отелей в {csv_filename.name}")
 
+    def _save_to_parquet(self):
+        """
+        Сохраняет данные отелей в Parquet файл с типизированными колонками.
+        """
+        if not self.all_hotels:
+            print("Нет данных для сохранения.")
+            return
+        
+        parquet_filename = self.current_dir / 'tvil_hotels.parquet'
+        
+        with ParquetWriter(parquet_filename, "tvil", self.fieldnames) as writer:
+            writer.write_tuples(self.all_hotels)
+        
+        print(f"Сохранено {writer.count} отелей в {parquet_filename.name}")
+
+    def _save_to_db(self):
+        """
+        Сохраняет снимок отелей за сегодня в SQLite (upsert по id отеля).
+        """
+        if not self.all_hotels:
+            print("Нет данных для сохранения.")
+            return
+        
+        with SnapshotStore(self.db_path) as store:
+            count = store.upsert("tvil", (row_to_dict(hotel, self.fieldnames) for hotel in self.all_hotels))
+        
+        print(f"Сохранено {count} отелей в {store.db_path.name}")
+
 if __name__ == "__main__":
     parser = TvilHotelsParser()
     parser.get_all_hotels_list()
\ No newline at end of file
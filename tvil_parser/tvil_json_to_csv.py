@@ -1,12 +1,21 @@
 import json
 import csv
+import sys
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.columnar import ParquetWriter, parquet_path_for
+from common.raw_archive import iter_archive, latest_archive
+from common.snapshot_store import SnapshotStore
+from tvil_columns import COLUMNS, hotel_row, row_to_dict
 
 
 def extract_hotel_data(hotel: Dict[str, Any]) -> Dict[str, Any]:
     """
-    Извлекает данные об отеле из JSON структуры.
+    Извлекает данные об отеле из JSON структуры в виде словаря колонок.
+    Для потоковой обработки дешевле строка-кортеж hotel_row (см. tvil_columns.py).
     
     Args:
         hotel: Словарь с данными об отеле из JSON
@@ -14,161 +23,7 @@ def extract_hotel_data(hotel: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Словарь с извлеченными данными для CSV
     """
-    hotel_id = hotel.get("id", "")
-    attributes = hotel.get("attributes", {})
-    
-    # Извлекаем базовую информацию
-    row = {
-        "id": hotel_id,
-        "title": attributes.get("title", ""),
-        "cabinet_title": attributes.get("cabinet_title", ""),
-        "full_title": attributes.get("full_title", ""),
-        "list_title": attributes.get("list_title", ""),
-        "entity_type": attributes.get("entity_type", ""),
-        "subtype": attributes.get("subtype", ""),
-    }
-    
-    # Адреса
-    row["address"] = attributes.get("address", "")
-    row["short_address"] = attributes.get("short_address", "")
-    row["full_address"] = attributes.get("full_address", "")
-    row["map_address"] = attributes.get("map_address", "")
-    row["city_address"] = attributes.get("city_address", "")
-    
-    # Координаты
-    row["latitude"] = attributes.get("latitude", "")
-    row["longitude"] = attributes.get("longitude", "")
-    
-    # Описание
-    row["description"] = attributes.get("description", "")
-    row["conditions"] = attributes.get("conditions", "")
-    
-    # Цены
-    price = attributes.get("price", [])
-    if isinstance(price, list) and len(price) > 0:
-        row["price_min"] = price[0] if len(price) > 0 else ""
-        row["price_max"] = price[-1] if len(price) > 1 else price[0] if len(price) > 0 else ""
-    else:
-        row["price_min"] = ""
-        row["price_max"] = ""
-    
-    daily_price = attributes.get("daily_rubles_price", [])
-    if isinstance(daily_price, list) and len(daily_price) > 0:
-        row["daily_price_min"] = daily_price[0] if len(daily_price) > 0 else ""
-        row["daily_price_max"] = daily_price[-1] if len(daily_price) > 1 else daily_price[0] if len(daily_price) > 0 else ""
-    else:
-        row["daily_price_min"] = ""
-        row["daily_price_max"] = ""
-    
-    year_price = attributes.get("year_price", [])
-    if isinstance(year_price, list) and len(year_price) > 0:
-        row["year_price_min"] = year_price[0] if len(year_price) > 0 else ""
-        row["year_price_max"] = year_price[-1] if len(year_price) > 1 else year_price[0] if len(year_price) > 0 else ""
-    else:
-        row["year_price_min"] = ""
-        row["year_price_max"] = ""
-    
-    # Валюта
-    currency = attributes.get("currency", {})
-    if isinstance(currency, dict):
-        row["currency_id"] = currency.get("id", "")
-        row["currency_title"] = currency.get("title", "")
-        row["currency_symbol"] = currency.get("symbol", "")
-    else:
-        row["currency_id"] = ""
-        row["currency_title"] = ""
-        row["currency_symbol"] = ""
-    
-    # Предоплата
-    row["prepayment"] = attributes.get("prepayment", "")
-    
-    # Номера
-    row["rooms_total"] = attributes.get("rooms_total", "")
-    row["bedroom_total"] = attributes.get("bedroom_total", "")
-    row["count_rooms"] = attributes.get("count_rooms", "")
-    
-    # Рейтинги и отзывы
-    row["count_reviews"] = attributes.get("count_reviews", "")
-    row["count_real_reviews"] = attributes.get("count_real_reviews", "")
-    row["rating_overall"] = attributes.get("rating_overall", "")
-    row["entity_rating"] = attributes.get("entity_rating", "")
-    row["total_rating"] = attributes.get("total_rating", "")
-    row["user_rating"] = attributes.get("user_rating", "")
-    row["stars"] = attributes.get("stars", "")
-    
-    # Географические ID
-    row["country_id"] = attributes.get("country_id", "")
-    row["region_id"] = attributes.get("region_id", "")
-    row["city_id"] = attributes.get("city_id", "")
-    row["aria_id"] = attributes.get("aria_id", "")
-    
-    # Дополнительная информация
-    row["count_photos"] = attributes.get("count_photos", "")
-    row["count_guest"] = attributes.get("count_guest", "")
-    row["count_guest_max"] = attributes.get("count_guest_max", "")
-    row["categories_count"] = attributes.get("categories_count", "")
-    row["occupied_categories"] = attributes.get("occupied_categories", "")
-    
-    # Временные метки
-    row["last_reserve"] = attributes.get("last_reserve", "")
-    row["last_reserve_label"] = attributes.get("last_reserve_label", "")
-    
-    # Флаги и статусы
-    row["is_new"] = attributes.get("is_new", "")
-    row["is_instant_reserve"] = attributes.get("is_instant_reserve", "")
-    row["is_searchable_and_has_prices"] = attributes.get("is_searchable_and_has_prices", "")
-    row["allow_quota"] = attributes.get("allow_quota", "")
-    
-    # Питание
-    food_type = attributes.get("food_type", {})
-    if isinstance(food_type, dict):
-        row["food_type_label"] = food_type.get("label", "")
-        row["food_type_text_short"] = food_type.get("text_short", "")
-        row["food_type_text_full"] = food_type.get("text_full", "")
-    else:
-        row["food_type_label"] = ""
-        row["food_type_text_short"] = ""
-        row["food_type_text_full"] = ""
-    
-    # Статус
-    status = attributes.get("status", {})
-    if isinstance(status, dict):
-        row["status_enabled"] = status.get("enabled", "")
-        row["status_checked"] = status.get("checked", "")
-        row["status_deleted"] = status.get("deleted", "")
-    else:
-        row["status_enabled"] = ""
-        row["status_checked"] = ""
-        row["status_deleted"] = ""
-    
-    # Владелец
-    owner = attributes.get("owner", {})
-    if isinstance(owner, dict):
-        row["owner_first_time"] = owner.get("first_time", "")
-        row["owner_update_time"] = owner.get("update_time", "")
-    else:
-        row["owner_first_time"] = ""
-        row["owner_update_time"] = ""
-    
-    # Аккредитация
-    row["ros_accreditation_code"] = attributes.get("ros_accreditation_code", "")
-    row["ros_accreditation_url"] = attributes.get("ros_accreditation_url", "")
-    
-    # Ссылки
-    row["ics_export_link"] = attributes.get("ics_export_link", "")
-    
-    # Популярность
-    row["more_often"] = attributes.get("more_often", "")
-    row["more_often_type"] = attributes.get("more_often_type", "")
-    
-    # Параметры (сериализуем в JSON строку)
-    params = attributes.get("params", {})
-    if isinstance(params, dict):
-        row["params"] = json.dumps(params, ensure_ascii=False)
-    else:
-        row["params"] = ""
-    
-    return row
+    return row_to_dict(hotel_row(hotel))
 
 
 def get_csv_columns() -> List[str]:
@@ -178,82 +33,29 @@ def get_csv_columns() -> List[str]:
     Returns:
         Список названий колонок
     """
-    return [
-        "id",
-        "title",
-        "cabinet_title",
-        "full_title",
-        "list_title",
-        "entity_type",
-        "subtype",
-        "address",
-        "short_address",
-        "full_address",
-        "map_address",
-        "city_address",
-        "latitude",
-        "longitude",
-        "description",
-        "conditions",
-        "price_min",
-        "price_max",
-        "daily_price_min",
-        "daily_price_max",
-        "year_price_min",
-        "year_price_max",
-        "currency_id",
-        "currency_title",
-        "currency_symbol",
-        "prepayment",
-        "rooms_total",
-        "bedroom_total",
-        "count_rooms",
-        "count_reviews",
-        "count_real_reviews",
-        "rating_overall",
-        "entity_rating",
-        "total_rating",
-        "user_rating",
-        "stars",
-        "country_id",
-        "region_id",
-        "city_id",
-        "aria_id",
-        "count_photos",
-        "count_guest",
-        "count_guest_max",
-        "categories_count",
-        "occupied_categories",
-        "last_reserve",
-        "last_reserve_label",
-        "is_new",
-        "is_instant_reserve",
-        "is_searchable_and_has_prices",
-        "allow_quota",
-        "food_type_label",
-        "food_type_text_short",
-        "food_type_text_full",
-        "status_enabled",
-        "status_checked",
-        "status_deleted",
-        "owner_first_time",
-        "owner_update_time",
-        "ros_accreditation_code",
-        "ros_accreditation_url",
-        "ics_export_link",
-        "more_often",
-        "more_often_type",
-        "params",
-    ]
+    return list(COLUMNS)
 
 
-def convert_json_to_csv(json_dir: Optional[Path] = None, output_file: Optional[Path] = None) -> None:
+def convert_json_to_csv(
+    json_dir: Optional[Path] = None,
+    output_file: Optional[Path] = None,
+    storage: str = "csv",
+    db_path: Optional[Path] = None,
+    parquet: bool = False,
+    run_id: Optional[str] = None,
+) -> None:
     """
-    Конвертирует JSON файлы с отелями в CSV таблицу.
+    Конвертирует JSON файлы с отелями в CSV таблицу и/или в базу снимков SQLite.
+    Читает архив одного прогона raw/tvil_<run_id>.ndjson.gz (по умолчанию - самый свежий),
+    а если архивов нет - старые постраничные tvil_irko_*.json.
     
     Args:
         json_dir: Директория с JSON файлами (по умолчанию - директория скрипта)
         output_file: Путь к выходному CSV файлу (по умолчанию - tvil_hotels.csv в директории скрипта)
+        storage: "csv", "sqlite" или "both"
+        db_path: Путь к базе SQLite (по умолчанию - hotels.sqlite3 в корне репозитория)
+        parquet: Дополнительно выгрузить типизированный Parquet рядом с CSV (tvil_hotels.parquet)
+        run_id: Прогон, архив которого конвертировать (по умолчанию - последний)
     """
     if json_dir is None:
         json_dir = Path(__file__).parent
@@ -261,8 +63,16 @@ def convert_json_to_csv(json_dir: Optional[Path] = None, output_file: Optional[P
     if output_file is None:
         output_file = json_dir / "tvil_hotels.csv"
     
-    # Находим все JSON файлы с паттерном tvil_irko_*.json
-    json_files = sorted(json_dir.glob("tvil_irko_*.json"))
+    # Один прогон: архив сырых ответов, иначе старые файлы tvil_irko_*.json.
+    # Архивы разных дней не смешиваем, чтобы в выгрузку не попали старые снимки
+    archive = latest_archive(json_dir / "raw", "tvil_", run_id)
+    if archive is not None:
+        json_files = [archive]
+    elif run_id is not None:
+        print(f"Не найден архив прогона {run_id} в директории {json_dir / 'raw'}")
+        return
+    else:
+        json_files = sorted(json_dir.glob("tvil_irko_*.json"))
     
     if not json_files:
         print(f"Не найдено JSON файлов в директории {json_dir}")
@@ -277,20 +87,23 @@ def convert_json_to_csv(json_dir: Optional[Path] = None, output_file: Optional[P
     for json_file in json_files:
         try:
             print(f"Обработка файла: {json_file.name}")
-            with open(json_file, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            
-            # Извлекаем массив отелей
-            hotels = data.get("data", [])
+            if json_file.name.endswith(".ndjson.gz"):
+                # В архиве по одному отелю на строку
+                hotels = list(iter_archive(json_file))
+            else:
+                with open(json_file, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                
+                # Извлекаем массив отелей
+                hotels = data.get("data", [])
             
             if not hotels:
                 print(f"  Предупреждение: файл {json_file.name} не содержит данных об отелях")
                 continue
             
-            # Обрабатываем каждый отель
+            # Обрабатываем каждый отель: строка - кортеж в порядке колонок
             for hotel in hotels:
-                hotel_data = extract_hotel_data(hotel)
-                all_hotels.append(hotel_data)
+                all_hotels.append(hotel_row(hotel))
             
             processed_files += 1
             print(f"  Извлечено {len(hotels)} отелей из {json_file.name}")
@@ -306,22 +119,33 @@ def convert_json_to_csv(json_dir: Optional[Path] = None, output_file: Optional[P
         print("Не найдено отелей для записи в CSV")
         return
     
-    # Удаляем дубликаты по ID (если один отель встречается в нескольких файлах)
-    seen_ids = set()
-    unique_hotels = []
+    # Удаляем дубликаты по ID (после возобновления прогона отель может быть записан
+    # повторно) - остаётся последняя, самая свежая запись, на месте первой
+    latest_by_id = {}
     duplicates_count = 0
     
     for hotel in all_hotels:
-        hotel_id = hotel.get("id", "")
-        if hotel_id and hotel_id not in seen_ids:
-            seen_ids.add(hotel_id)
-            unique_hotels.append(hotel)
-        elif hotel_id:
+        hotel_id = hotel[0]
+        if not hotel_id:
+            continue
+        if hotel_id in latest_by_id:
             duplicates_count += 1
+        latest_by_id[hotel_id] = hotel
+    
+    unique_hotels = list(latest_by_id.values())
     
     if duplicates_count > 0:
         print(f"Удалено {duplicates_count} дубликатов отелей")
     
+    if storage in ("sqlite", "both"):
+        save_to_db(unique_hotels, db_path)
+    
+    if parquet:
+        save_to_parquet(unique_hotels, parquet_path_for(output_file))
+    
+    if storage not in ("csv", "both"):
+        return
+    
     # Записываем в CSV
     columns = get_csv_columns()
     
@@ -329,8 +153,8 @@ def convert_json_to_csv(json_dir: Optional[Path] = None, output_file: Optional[P
     
     try:
         with open(output_file, "w", encoding="utf-8", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=columns, extrasaction="ignore")
-            writer.writeheader()
+            writer = csv.writer(f)
+            writer.writerow(columns)
             writer.writerows(unique_hotels)
         
         print(f"✓ Успешно создан CSV файл: {output_file}")
@@ -342,5 +166,33 @@ def convert_json_to_csv(json_dir: Optional[Path] = None, output_file: Optional[P
         raise
 
 
+def save_to_parquet(hotels: List[Tuple], output_file: Path) -> None:
+    """
+    Сохраняет отели в Parquet с типизированными колонками (цены, рейтинги, координаты - числами).
+    
+    Args:
+        hotels: Список строк, полученных из hotel_row
+        output_file: Путь к выходному Parquet файлу
+    """
+    with ParquetWriter(output_file, "tvil", get_csv_columns()) as writer:
+        writer.write_tuples(hotels)
+    
+    print(f"✓ Сохранено {writer.count} отелей в Parquet файл: {output_file}")
+
+
+def save_to_db(hotels: List[Tuple], db_path: Optional[Path] = None) -> None:
+    """
+    Сохраняет снимок отелей за сегодня в SQLite (upsert по id отеля).
+    
+    Args:
+        hotels: Список строк, полученных из hotel_row
+        db_path: Путь к базе SQLite (по умолчанию - hotels.sqlite3 в корне репозитория)
+    """
+    with SnapshotStore(db_path) as store:
+        count = store.upsert("tvil", (row_to_dict(hotel) for hotel in hotels))
+    
+    print(f"✓ Сохранено {count} отелей в базу {store.db_path}")
+
+
 if __name__ == "__main__":
     convert_json_to_csv()
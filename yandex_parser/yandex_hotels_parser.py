@@ -1,42 +1,72 @@
-import requests
 import json
 import os
+import sys
+import time
 import asyncio
+from pathlib import Path
+import httpx
 from playwright.async_api import async_playwright
 
-async def get_unauthenticated_cookies():
-    """Получение cookies неавторизированного пользователя через playwright"""
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.http_client import get_shared_client
+from common.checkpoint import CheckpointStore
+from common.endpoints import site_url
+from common.raw_archive import RawArchiveWriter
+from common.request_executor import RequestExecutor
+from common.resource_blocking import ResourceBlocker
+from common.session_cache import SessionCache
+
+# Адрес сайта: боевой или, через YANDEX_BASE_URL, локальная заглушка
+SITE_URL = site_url('yandex')
+
+async def get_unauthenticated_session():
+    """Получение storage state (cookies и localStorage) неавторизированного пользователя через playwright"""
     async with async_playwright() as p:
         # Запускаем браузер и создаем новый контекст без сохраненных данных (чистый профиль)
         browser = await p.chromium.launch(headless=True)
         context = await browser.new_context()
+        blocker = ResourceBlocker('yandex', bootstrap=True)
+        await blocker.install_async(context)
 
         try:
             page = await context.new_page()
 
             # Переходим на сайт Яндекс.Путешествий
-            await page.goto('https://travel.yandex.ru/hotels/irkutsk-oblast/?adults=2&bbox=104.13056255102043%2C51.5404668592517~107.37870529166668%2C53.507196730491884&checkinDate=2026-01-25&checkoutDate=2026-01-26&childrenAges=&filterAtoms=rubric_id%3AHOTEL&flexibleDatesType&geoId=11266&navigationToken=0&oneNightChecked=false&onlyCurrentGeoId=1&roomCount=1&searchPagePollingId=fa259bdc3150c804ade3acb89f40bce-2-newsearch&selectedSortId=relevant-first', timeout=30000)
+            await page.goto(f'{SITE_URL}/hotels/irkutsk-oblast/?adults=2&bbox=104.13056255102043%2C51.5404668592517~107.37870529166668%2C53.507196730491884&checkinDate=2026-01-25&checkoutDate=2026-01-26&childrenAges=&filterAtoms=rubric_id%3AHOTEL&flexibleDatesType&geoId=11266&navigationToken=0&oneNightChecked=false&onlyCurrentGeoId=1&roomCount=1&searchPagePollingId=fa259bdc3150c804ade3acb89f40bce-2-newsearch&selectedSortId=relevant-first', timeout=30000)
             await page.wait_for_selector('body', timeout=10000)  # Ждем загрузки body элемента
 
             # Получаем cookies из чистого сеанса
-            cookies_raw = await context.cookies()
-            cookies = {cookie['name']: cookie['value'] for cookie in cookies_raw}
+            storage_state = await context.storage_state()
 
-            print(f"Получено {len(cookies)} cookies для неавторизированного пользователя")
-            return cookies
+            print(f"Получено {len(storage_state['cookies'])} cookies для неавторизированного пользователя")
+            blocker.print_report()
+            return storage_state
 
         finally:
             await context.close()
 
-# Получаем cookies для неавторизированного пользователя
-cookies = asyncio.run(get_unauthenticated_cookies())
+# Все страницы идут через один пул соединений с общим cookie jar
+http = get_shared_client(http2=True)
+
+# Сессия берётся из кэша, браузер запускается только если её нет или её не принимают
+session_cache = SessionCache('yandex')
+
+def probe_session(storage_state):
+    """Пробный запрос с cookies из кэша: отклонённую сессию Яндекс перенаправляет на капчу"""
+    session_cache.apply(http, storage_state)
+    response = http.get(f'{SITE_URL}/hotels/', headers={'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}, timeout=10)
+    return response.status_code == 200
+
+session = session_cache.get_or_create(lambda: asyncio.run(get_unauthenticated_session()), probe_session)
+session_cache.apply(http, session)
 
 headers = {
     'accept': 'application/json, text/plain, */*',
     'accept-language': 'en-US,en;q=0.9',
     'pragma': 'no-cache',
     'priority': 'u=1, i',
-    'referer': 'https://travel.yandex.ru/hotels/irkutsk-oblast/?adults=2&bbox=104.13056255102043%2C51.54264369120642~107.37870529166668%2C53.505019898537164&checkinDate=2026-01-25&checkoutDate=2026-01-26&childrenAges=&filterAtoms=rubric_id%3AHOTEL&flexibleDatesType&geoId=11266&lastSearchTimeMarker=1769238200213&navigationToken=0&oneNightChecked=false&onlyCurrentGeoId=1&roomCount=1&searchPagePollingId=b7dd8df58d9c6c1fbcec79fc7d495925-1-newsearch&selectedSortId=relevant-first',
+    'referer': SITE_URL + '/hotels/irkutsk-oblast/?adults=2&bbox=104.13056255102043%2C51.54264369120642~107.37870529166668%2C53.505019898537164&checkinDate=2026-01-25&checkoutDate=2026-01-26&childrenAges=&filterAtoms=rubric_id%3AHOTEL&flexibleDatesType&geoId=11266&lastSearchTimeMarker=1769238200213&navigationToken=0&oneNightChecked=false&onlyCurrentGeoId=1&roomCount=1&searchPagePollingId=b7dd8df58d9c6c1fbcec79fc7d495925-1-newsearch&selectedSortId=relevant-first',
     'sec-ch-ua': '"Google Chrome";v="143", "Chromium";v="143", "Not A(Brand";v="24"',
     'sec-ch-ua-mobile': '?0',
     'sec-ch-ua-platform': '"Windows"',
@@ -46,54 +76,432 @@ headers = {
     'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/143.0.0.0 Safari/537.36',
     'x-csrf-token': 'xxx',
     'x-requested-with': 'XMLHttpRequest',
-    'x-retpath-y': 'https://travel.yandex.ru/hotels/irkutsk-oblast/?adults=2&bbox=104.13056255102043%2C51.54264369120642~107.37870529166668%2C53.505019898537164&checkinDate=2026-01-25&checkoutDate=2026-01-26&childrenAges=&filterAtoms=rubric_id%3AHOTEL&flexibleDatesType&geoId=11266&lastSearchTimeMarker=1769238200213&navigationToken=0&oneNightChecked=false&onlyCurrentGeoId=1&roomCount=1&searchPagePollingId=b7dd8df58d9c6c1fbcec79fc7d495925-1-newsearch&selectedSortId=relevant-first',
+    'x-retpath-y': SITE_URL + '/hotels/irkutsk-oblast/?adults=2&bbox=104.13056255102043%2C51.54264369120642~107.37870529166668%2C53.505019898537164&checkinDate=2026-01-25&checkoutDate=2026-01-26&childrenAges=&filterAtoms=rubric_id%3AHOTEL&flexibleDatesType&geoId=11266&lastSearchTimeMarker=1769238200213&navigationToken=0&oneNightChecked=false&onlyCurrentGeoId=1&roomCount=1&searchPagePollingId=b7dd8df58d9c6c1fbcec79fc7d495925-1-newsearch&selectedSortId=relevant-first',
     'x-ya-travel-page-token': '',
 }
 
             # Базовый URL для запросов
-base_url = 'https://travel.yandex.ru/api/hotels/searchHotels?startSearchReason=mount&mapAspectRatio=0.5184705017352793&pollIteration=0&pollEpoch=0&roomCount=1&adults=2&checkinDate=2026-01-25&checkoutDate=2026-01-26&geoId=11266&bbox=104.13056255102043,51.54264369120642~107.37870529166668,53.505019898537164&navigationToken={}&filterAtoms[]=rubric_id:HOTEL&onlyCurrentGeoId=true&selectedSortId=relevant-first&geoLocationStatus=unknown&geoSlug=irkutsk-oblast&pageHotelCount=50&pricedHotelLimit=50&totalHotelLimit=50&totalHotelPointLimit=800&searchPagePollingId=b7dd8df58d9c6c1fbcec79fc7d495925-1-newsearch&seoMode=search&searchOriginType=SEARCH&imageLimit=10'
+base_url = SITE_URL + '/api/hotels/searchHotels?startSearchReason=mount&mapAspectRatio=0.5184705017352793&pollIteration={poll_iteration}&pollEpoch={poll_epoch}&roomCount=1&adults=2&checkinDate=2026-01-25&checkoutDate=2026-01-26&geoId=11266&bbox={bbox}&navigationToken={navigation_token}&filterAtoms[]=rubric_id:HOTEL&onlyCurrentGeoId=true&selectedSortId=relevant-first&geoLocationStatus=unknown&geoSlug=irkutsk-oblast&pageHotelCount=50&pricedHotelLimit=50&totalHotelLimit=50&totalHotelPointLimit=800&searchPagePollingId=b7dd8df58d9c6c1fbcec79fc7d495925-1-newsearch&seoMode=search&searchOriginType=SEARCH&imageLimit=10'
 
-# Начальный navigationToken
-navigation_token = '0'
-page_counter = 1
+# Повторы и дедлайны запросов страниц по наблюдаемым задержкам
+executor = RequestExecutor('yandex')
 
-while navigation_token:
-    print(f"Парсим страницу {page_counter} с navigationToken: {navigation_token}")
+# Опрос поиска предложений: сервер отдаёт прогресс и рекомендуемую паузу до следующего опроса
+MAX_POLLS_PER_PAGE = 10
+DEFAULT_POLL_DELAY_MS = 1000
 
-    # Формируем URL с текущим токеном
-    url = base_url.format(navigation_token)
+# Область поиска (долгота, широта юго-западного угла, долгота, широта северо-восточного)
+REGION_BBOX = (104.13056255102043, 51.54264369120642, 107.37870529166668, 53.505019898537164)
 
-    try:
-        response = requests.get(url, cookies=cookies, headers=headers)
+# Тайл делится на четыре, пока найденных в нём отелей больше, чем API отдаёт
+# по одной области (totalHotelPointLimit в запросе)
+TILE_HOTEL_LIMIT = 800
+MAX_TILE_DEPTH = 6
+
+def format_bbox(bbox):
+    """bbox в формате параметра запроса: lon,lat~lon,lat"""
+    return f"{bbox[0]},{bbox[1]}~{bbox[2]},{bbox[3]}"
+
+def split_bbox(bbox):
+    """Делит bbox на четыре равных квадранта"""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    mid_lon = (min_lon + max_lon) / 2
+    mid_lat = (min_lat + max_lat) / 2
+    return [
+        (min_lon, min_lat, mid_lon, mid_lat),
+        (mid_lon, min_lat, max_lon, mid_lat),
+        (min_lon, mid_lat, mid_lon, max_lat),
+        (mid_lon, mid_lat, max_lon, max_lat),
+    ]
+
+def page_url(navigation_token, poll_iteration=0, poll_epoch=0, bbox=REGION_BBOX):
+    return base_url.format(
+        navigation_token=navigation_token,
+        poll_iteration=poll_iteration,
+        poll_epoch=poll_epoch,
+        bbox=format_bbox(bbox)
+    )
+
+def is_search_finished(page_data):
+    """Поиск предложений завершён: по общему прогрессу или по всем отелям страницы"""
+    progress = page_data.get('offerSearchProgress') or {}
+    if progress.get('finished'):
+        return True
+    hotels = page_data.get('hotels', [])
+    return bool(hotels) and all(hotel_item.get('searchIsFinished') for hotel_item in hotels)
+
+def next_poll(page_data, poll_iteration, poll_epoch):
+    """Пауза до следующего опроса (мс) и его pollIteration, pollEpoch"""
+    unfinished = sum(1 for hotel_item in page_data.get('hotels', []) if not hotel_item.get('searchIsFinished'))
+    delay_ms = page_data.get('nextPollingRequestDelayMs') or DEFAULT_POLL_DELAY_MS
+    print(f"  Поиск не завершён ({unfinished} отелей ждут предложений), повтор через {delay_ms} мс")
+    return delay_ms, page_data.get('pollIteration', poll_iteration) + 1, page_data.get('pollEpoch', poll_epoch)
+
+def next_navigation_token(data, navigation_token):
+    """Токен следующей страницы или None, если страниц больше нет"""
+    next_token = ((data.get('data') or {}).get('navigationTokens') or {}).get('nextPage')
+    if next_token and str(next_token) != str(navigation_token):
+        return str(next_token)
+    return None
+
+def current_page_token(data):
+    return str(((data.get('data') or {}).get('navigationTokens') or {}).get('currentPage', ''))
+
+def predicted_tokens(data):
+    """
+    Токены всех страниц после первой, если navigationToken - числовое смещение
+    ("0" -> "50" -> ...) и известен foundHotelCount; иначе None
+    """
+    page_data = data.get('data') or {}
+    tokens = page_data.get('navigationTokens') or {}
+    current = str(tokens.get('currentPage', ''))
+    next_page = str(tokens.get('nextPage', ''))
+    found = page_data.get('foundHotelCount')
+    if not (current.isdigit() and next_page.isdigit() and isinstance(found, int)):
+        return None
+    step = int(next_page) - int(current)
+    if step <= 0:
+        return []
+    return [str(offset) for offset in range(int(next_page), found, step)]
+
+def fetch_page(navigation_token, bbox=REGION_BBOX):
+    """
+    Запрашивает страницу выдачи и переопрашивает её, пока партнёры не вернут все предложения.
+    Пауза между опросами берётся из nextPollingRequestDelayMs.
+    Возвращает (data, stats) с числом опросов и временем до завершения поиска.
+    """
+    poll_iteration = 0
+    poll_epoch = 0
+    polls = 0
+    started_at = time.perf_counter()
+
+    while True:
+        url = page_url(navigation_token, poll_iteration, poll_epoch, bbox)
+        response = executor.run(lambda timeout: http.get(url, headers=headers, timeout=timeout))
         response.raise_for_status()
+        data = response.json()
+        polls += 1
+
+        page_data = data.get('data') or {}
+        finished = is_search_finished(page_data)
+        if finished or polls >= MAX_POLLS_PER_PAGE:
+            break
+
+        delay_ms, poll_iteration, poll_epoch = next_poll(page_data, poll_iteration, poll_epoch)
+        time.sleep(delay_ms / 1000)
+
+    stats = {
+        'polls': polls,
+        'seconds': time.perf_counter() - started_at,
+        'finished': finished
+    }
+    return data, stats
 
+async def fetch_page_async(navigation_token, bbox, max_polls=MAX_POLLS_PER_PAGE, resume=None):
+    """
+    То же, что fetch_page, но через асинхронный клиент.
+    max_polls=1 - только первый опрос (foundHotelCount в нём уже есть, поиск
+    предложений может быть не завершён). resume - (data, stats) такого опроса:
+    опрос продолжается с него, а не начинается заново.
+    """
+    poll_iteration = 0
+    poll_epoch = 0
+    polls = 0
+    started_at = time.perf_counter()
+    data = None
+    finished = False
+
+    if resume:
+        data, resume_stats = resume
+        polls = resume_stats['polls']
+        started_at -= resume_stats['seconds']
+        finished = is_search_finished(data.get('data') or {})
+
+    while not finished and polls < max_polls:
+        if data is not None:
+            delay_ms, poll_iteration, poll_epoch = next_poll(data.get('data') or {}, poll_iteration, poll_epoch)
+            await asyncio.sleep(delay_ms / 1000)
+
+        url = page_url(navigation_token, poll_iteration, poll_epoch, bbox)
+        response = await executor.arun(lambda timeout: http.aget(url, headers=headers, timeout=timeout))
+        response.raise_for_status()
         data = response.json()
+        polls += 1
+        finished = is_search_finished(data.get('data') or {})
+
+    stats = {
+        'polls': polls,
+        'seconds': time.perf_counter() - started_at,
+        'finished': finished
+    }
+    return data, stats
+
+def print_poll_stats(poll_stats):
+    if poll_stats:
+        total_polls = sum(stats['polls'] for stats in poll_stats)
+        total_seconds = sum(stats['seconds'] for stats in poll_stats)
+        unfinished_pages = sum(1 for stats in poll_stats if not stats['finished'])
+        print(f"Опросов: {total_polls} на {len(poll_stats)} страниц, до завершения поиска {total_seconds:.1f} с, незавершённых страниц: {unfinished_pages}")
 
-        # Сохраняем результат в файл
-        filename = f'yandex_parser/yandex_json/page_{page_counter}.json'
-        with open(filename, 'w', encoding='utf-8') as file:
-            json.dump(data, file, ensure_ascii=False, indent=4)
+def crawl_serial():
+    """
+    Обход всей области по navigationToken, страница за страницей, с контрольной точкой.
+    Токены здесь не предсказываются: параллельные запросы страниц по смещениям
+    включаются только ключами --predict и --tiles (TileCrawler).
+    """
+    # Начальный navigationToken
+    navigation_token = '0'
+    page_counter = 1
+    completed = False
 
-        print(f"Страница {page_counter} сохранена в {filename}")
+    # Страницы уже лежат в файлах, в контрольной точке достаточно токена и номера страницы
+    checkpoint = CheckpointStore("yandex_hotels")
+    state = checkpoint.load()
+    if state:
+        navigation_token = state['navigation_token']
+        page_counter = state['page_counter']
+        print(f"Продолжаем с контрольной точки: страница {page_counter}, navigationToken: {navigation_token}")
 
-        # Извлекаем следующий navigationToken
-        if 'data' in data and 'navigationTokens' in data['data'] and 'nextPage' in data['data']['navigationTokens']:
-            next_token = data['data']['navigationTokens']['nextPage']
-            if next_token and str(next_token) != str(navigation_token):
-                navigation_token = str(next_token)
+    # Отели всех страниц пишутся в один сжатый NDJSON-архив с индексом по permalink
+    archive = RawArchiveWriter(f'yandex_parser/raw/yandex_{checkpoint.run_id}.ndjson.gz')
+    poll_stats = []
+
+    while navigation_token:
+        print(f"Парсим страницу {page_counter} с navigationToken: {navigation_token}")
+
+        try:
+            # Запрашиваем страницу и дожидаемся завершения поиска предложений
+            data, stats = fetch_page(navigation_token)
+            poll_stats.append(stats)
+            status = "поиск завершён" if stats['finished'] else "поиск НЕ завершён"
+            print(f"Страница {page_counter}: {stats['polls']} опросов, {stats['seconds']:.1f} с, {status}")
+
+            # Сохраняем отели страницы в архив
+            hotels = data.get('data', {}).get('hotels', [])
+            for hotel_item in hotels:
+                archive.write(hotel_item.get('hotel', {}).get('permalink', ''), hotel_item)
+            archive.flush()
+
+            print(f"Страница {page_counter}: {len(hotels)} отелей сохранено в {archive.path.name}")
+
+            # Извлекаем следующий navigationToken
+            next_token = next_navigation_token(data, navigation_token)
+            if next_token:
+                navigation_token = next_token
                 page_counter += 1
+                checkpoint.commit(navigation_token=navigation_token, page_counter=page_counter)
             else:
                 print("Больше страниц нет")
+                completed = True
                 break
-        else:
-            print("navigationToken не найден в ответе")
+
+        except httpx.HTTPError as e:
+            print(f"Ошибка при запросе страницы {page_counter}: {e}")
             break
+        except json.JSONDecodeError as e:
+            print(f"Ошибка при парсинге JSON страницы {page_counter}: {e}")
+            break
+
+    archive.close()
+    if completed:
+        checkpoint.clear()
+    print_poll_stats(poll_stats)
+    print(f"Парсинг завершен. Обработано {page_counter - 1} страниц.")
+
+class TileCrawler:
+    """
+    Обход области тайлами: bbox рекурсивно делится на квадранты, пока найденных
+    в тайле отелей (foundHotelCount из первого опроса) больше TILE_HOTEL_LIMIT.
+    До завершения поиска предложений опрашиваются и пролистываются параллельно
+    только листовые тайлы; частоту всех запросов вместе держит общий
+    лимитер хоста сайта.
+    max_depth=0 - вся область одним тайлом, параллельно только её страницы.
+    Отели на границах тайлов приходят дважды, при слиянии они схлопываются по permalink
+    (отели без permalink не схлопываются - сравнить их не по чему).
+    """
+    def __init__(self, archive, tile_limit=TILE_HOTEL_LIMIT, max_depth=MAX_TILE_DEPTH):
+        self.archive = archive
+        self.tile_limit = tile_limit
+        self.max_depth = max_depth
+        self.seen_permalinks = set()
+        self.unique_hotels = 0
+        self.duplicates = 0
+        self.poll_stats = []
+        self.tiles = []
+        self.failed_tiles = []
+        self.predicted_pages = 0
+        self.fallbacks = 0
+        # Опросы первых страниц тайлов, которые потом были разделены
+        self.split_polls = 0
+
+    def merge(self, hotels):
+        """Пишет в архив отели, которых ещё не было; возвращает число новых"""
+        added = 0
+        for hotel_item in hotels:
+            permalink = hotel_item.get('hotel', {}).get('permalink', '')
+            if permalink:
+                if permalink in self.seen_permalinks:
+                    self.duplicates += 1
+                    continue
+                self.seen_permalinks.add(permalink)
+            self.archive.write(permalink, hotel_item)
+            added += 1
+        self.unique_hotels += added
+        self.archive.flush()
+        return added
+
+    async def crawl(self, bbox, depth=0):
+        """Обходит тайл: делит его, если отелей слишком много, иначе листает все страницы"""
+        name = format_bbox(bbox)
+        try:
+            # Для решения о делении хватает foundHotelCount из первого опроса,
+            # дожидаться предложений партнёров по тайлу, который будет разделён, незачем
+            first_poll = await fetch_page_async('0', bbox, max_polls=1)
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            print(f"Тайл {name}: ошибка первой страницы: {e}")
+            self.failed_tiles.append(bbox)
+            return
+
+        found = (first_poll[0].get('data') or {}).get('foundHotelCount') or 0
+        if found > self.tile_limit and depth < self.max_depth:
+            print(f"Тайл {name}: {found} отелей больше {self.tile_limit}, делим на 4")
+            self.split_polls += first_poll[1]['polls']
+            await asyncio.gather(*(self.crawl(tile, depth + 1) for tile in split_bbox(bbox)))
+            return
+        if found > self.tile_limit:
+            print(f"Тайл {name}: {found} отелей, но глубина {depth} предельная, часть отелей может не попасть")
+
+        # Листовой тайл: первую страницу опрашиваем до завершения поиска, продолжая с первого опроса
+        try:
+            data, stats = await fetch_page_async('0', bbox, resume=first_poll)
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            print(f"Тайл {name}: ошибка первой страницы: {e}")
+            self.failed_tiles.append(bbox)
+            return
+
+        self.tiles.append({'bbox': bbox, 'depth': depth, 'found': found})
+        self.save_page(name, 1, data, stats)
+        try:
+            # Страницы архивируются по мере получения, поэтому при ошибке уже
+            # полученные страницы тайла не теряются
+            await self.fetch_remaining_pages(name, data, bbox)
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            print(f"Тайл {name}: ошибка при листании: {e}")
+            self.failed_tiles.append(bbox)
+
+    def save_page(self, name, page_counter, data, stats):
+        self.poll_stats.append(stats)
+        hotels = (data.get('data') or {}).get('hotels', [])
+        added = self.merge(hotels)
+        print(f"Тайл {name}, страница {page_counter}: {len(hotels)} отелей, новых {added}")
+
+    async def fetch_remaining_pages(self, name, data, bbox):
+        """
+        Листает страницы тайла после первой и сохраняет их в архив по порядку
+        смещений; возвращает число сохранённых страниц.
+        Если токены - числовые смещения, все остальные страницы запрашиваются
+        сразу, а ответы собираются по мере прихода: страница сохраняется, как
+        только получены и проверены все страницы перед ней (ответ принимается,
+        только если его currentPage совпал с запрошенным токеном).
+        С первой ошибки или расхождения (или если токены непрозрачные) страницы
+        дочитываются по цепочке nextPage, как в последовательном обходе; уже
+        полученные и проверенные страницы дальше по цепочке повторно не запрашиваются.
+        Ошибка в цепочке пробрасывается, но уже полученные страницы к этому
+        моменту сохранены.
+        """
+        page_counter = 1
+        navigation_token = '0'
+        # Проверенные страницы, полученные вне очереди: токен -> (data, stats)
+        verified = {}
+        tokens = predicted_tokens(data)
+        if tokens:
+            async def fetch_token(token):
+                try:
+                    return token, await fetch_page_async(token, bbox)
+                except (httpx.HTTPError, json.JSONDecodeError) as e:
+                    return token, e
+
+            # Буфер ответов, пришедших раньше предыдущих страниц
+            received = {}
+            next_index = 0
+            chain_broken = False
+            for completed in asyncio.as_completed([fetch_token(token) for token in tokens]):
+                token, result = await completed
+                if isinstance(result, Exception):
+                    print(f"Тайл {name}: ошибка страницы с токеном {token}: {result}")
+                    received[token] = None
+                elif current_page_token(result[0]) != token:
+                    print(f"Тайл {name}: на токен {token} пришла страница {current_page_token(result[0])}")
+                    received[token] = None
+                else:
+                    received[token] = result
+                    verified[token] = result
+
+                # Сохраняем непрерывный по смещениям префикс, пока в нём нет пропусков
+                while not chain_broken and next_index < len(tokens) and tokens[next_index] in received:
+                    token = tokens[next_index]
+                    result = received.pop(token)
+                    if result is None:
+                        print(f"Тайл {name}: со страницы с токеном {token} дальше по цепочке")
+                        self.fallbacks += 1
+                        chain_broken = True
+                        break
+                    page, page_stats = result
+                    verified.pop(token)
+                    page_counter += 1
+                    self.save_page(name, page_counter, page, page_stats)
+                    self.predicted_pages += 1
+                    data = page
+                    navigation_token = token
+                    next_index += 1
+        elif next_navigation_token(data, navigation_token):
+            print(f"Тайл {name}: токены не похожи на смещения, листаем по цепочке")
+            self.fallbacks += 1
+
+        while True:
+            next_token = next_navigation_token(data, navigation_token)
+            if not next_token:
+                break
+            if next_token in verified:
+                data, page_stats = verified.pop(next_token)
+                self.predicted_pages += 1
+            else:
+                data, page_stats = await fetch_page_async(next_token, bbox)
+            page_counter += 1
+            self.save_page(name, page_counter, data, page_stats)
+            navigation_token = next_token
+        return page_counter - 1
+
+async def crawl_tiled(bbox=REGION_BBOX, max_depth=MAX_TILE_DEPTH):
+    """Обход области тайлами с дедупликацией по permalink"""
+    run_id = time.strftime("%Y-%m-%d")
+    archive = RawArchiveWriter(f'yandex_parser/raw/yandex_tiles_{run_id}.ndjson.gz')
+    crawler = TileCrawler(archive, max_depth=max_depth)
+    started_at = time.perf_counter()
+    try:
+        await crawler.crawl(bbox)
+    finally:
+        await http.aclose()
+        archive.close()
 
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка при запросе страницы {page_counter}: {e}")
-        break
-    except json.JSONDecodeError as e:
-        print(f"Ошибка при парсинге JSON страницы {page_counter}: {e}")
-        break
+    print_poll_stats(crawler.poll_stats)
+    print(
+        f"Тайлов: {len(crawler.tiles)} (ошибок: {len(crawler.failed_tiles)}), "
+        f"уникальных отелей: {crawler.unique_hotels}, дублей на границах: {crawler.duplicates}, "
+        f"{time.perf_counter() - started_at:.1f} с"
+    )
+    print(f"Страниц по предсказанным токенам: {crawler.predicted_pages}, переходов на цепочку: {crawler.fallbacks}")
+    print(f"Опросов на разделённые тайлы: {crawler.split_polls}")
 
-print(f"Парсинг завершен. Обработано {page_counter - 1} страниц.")
\ No newline at end of file
+# По умолчанию - последовательный обход с контрольной точкой.
+# --tiles - обход тайлами, --predict - вся область одним тайлом с параллельными
+# запросами страниц по предсказанным смещениям (без контрольной точки)
+if '--tiles' in sys.argv:
+    asyncio.run(crawl_tiled())
+elif '--predict' in sys.argv:
+    asyncio.run(crawl_tiled(max_depth=0))
+else:
+    crawl_serial()
+http.close()
+http.rate_limiters.print_report()
+executor.print_report()
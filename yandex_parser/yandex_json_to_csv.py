@@ -1,7 +1,16 @@
-import json
 import csv
 import os
+import sys
 import glob
+from contextlib import ExitStack
+import ijson
+from pathlib import Path
+
+# Корень репозитория в sys.path, чтобы импортировать общие модули из common/
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+from common.columnar import ParquetWriter
+from common.raw_archive import iter_archive, latest_archive
+from common.snapshot_store import SnapshotStore
 
 def extract_hotel_info(hotel_data):
     """Извлекает информацию об отеле из данных hotel"""
@@ -23,77 +32,151 @@ def extract_hotel_info(hotel_data):
         'phone_available': hotel.get('isPhoneCallAvailable', False)
     }
 
-def parse_json_files():
-    """Парсит все JSON файлы и извлекает информацию об отелях"""
+def iter_hotels_from_file(json_file):
+    """
+    Потоково читает один файл страницы и по одному отдаёт элементы data.hotels.
+    Файл целиком в память не загружается: filterInfo, seoInfo и прочие
+    разделы ответа пропускаются парсером без построения объектов.
+    """
+    with open(json_file, 'rb') as f:
+        for hotel_item in ijson.items(f, 'data.hotels.item', use_float=True):
+            yield hotel_item
+
+def iter_json_files(run_id=None, tiles=False):
+    """
+    Потоково отдаёт информацию об отелях по одному отелю.
+    Читает архив одного прогона raw/yandex_<run_id>.ndjson.gz (по умолчанию - самый свежий),
+    при tiles=True - архив обхода тайлами raw/yandex_tiles_<run_id>.ndjson.gz,
+    а если архивов нет - старые постраничные page_*.json.
+    Повторы одного отеля (по permalink) пропускаются.
+    """
     json_dir = 'yandex_parser/yandex_json'
-    all_hotels = []
-
-    # Находим все JSON файлы
-    json_files = glob.glob(os.path.join(json_dir, 'page_*.json'))
+    archive_dir = 'yandex_parser/raw'
+
+    # Архивы разных прогонов не смешиваем, чтобы в выгрузку не попали старые снимки
+    # Архивы последовательного обхода и обхода тайлами ищутся раздельно
+    if tiles:
+        archive = latest_archive(archive_dir, 'yandex_tiles_', run_id)
+    else:
+        archive = latest_archive(archive_dir, 'yandex_', run_id, exclude_prefix='yandex_tiles_')
+    if archive is not None:
+        json_files = [str(archive)]
+    elif run_id is not None:
+        print(f"Не найден архив прогона {run_id} в папке {archive_dir}")
+        return
+    else:
+        json_files = sorted(glob.glob(os.path.join(json_dir, 'page_*.json')))
 
     if not json_files:
-        print(f"Не найдены JSON файлы в папке {json_dir}")
-        return []
+        print(f"Не найдены JSON файлы в папках {json_dir} и {archive_dir}")
+        return
 
     print(f"Найдено {len(json_files)} JSON файлов")
 
-    for json_file in sorted(json_files):
+    seen_permalinks = set()
+    duplicates_count = 0
+
+    for json_file in json_files:
         print(f"Парсим файл: {json_file}")
 
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Извлекаем отели из data.hotels
-            hotels_data = data.get('data', {}).get('hotels', [])
-
-            for hotel_item in hotels_data:
-                hotel_info = extract_hotel_info(hotel_item)
-                all_hotels.append(hotel_info)
+            # Извлекаем отели из data.hotels или по строке из архива
+            if json_file.endswith('.ndjson.gz'):
+                hotel_items = iter_archive(json_file)
+            else:
+                hotel_items = iter_hotels_from_file(json_file)
+            for hotel_item in hotel_items:
+                hotel = extract_hotel_info(hotel_item)
+                # Отели без permalink не склеиваем - сравнить их не по чему
+                permalink = hotel['id']
+                if permalink:
+                    if permalink in seen_permalinks:
+                        duplicates_count += 1
+                        continue
+                    seen_permalinks.add(permalink)
+                yield hotel
 
         except Exception as e:
             print(f"Ошибка при парсинге файла {json_file}: {e}")
 
+    if duplicates_count:
+        print(f"Пропущено {duplicates_count} дубликатов отелей")
+
+def parse_json_files():
+    """Парсит все JSON файлы и извлекает информацию об отелях"""
+    all_hotels = list(iter_json_files())
     print(f"Всего извлечено {len(all_hotels)} отелей")
     return all_hotels
 
-def save_to_csv(hotels, filename='yandex_hotels.csv'):
-    """Сохраняет данные об отелях в CSV файл"""
-    if not hotels:
-        print("Нет данных для сохранения")
-        return
-
-    fieldnames = [
-        'id', 'name', 'address', 'address_en', 'stars', 'rating',
-        'review_count', 'image_count', 'latitude', 'longitude',
-        'category', 'has_verified_owner', 'phone_available'
-    ]
-
+FIELDNAMES = [
+    'id', 'name', 'address', 'address_en', 'stars', 'rating',
+    'review_count', 'image_count', 'latitude', 'longitude',
+    'category', 'has_verified_owner', 'phone_available'
+]
+
+def fan_out(hotels, sinks):
+    """Передаёт каждый отель во все sinks и отдаёт его дальше"""
+    for hotel in hotels:
+        for sink in sinks:
+            sink(hotel)
+        yield hotel
+
+def save_hotels(hotels, storage='csv', parquet=False, csv_filename='yandex_hotels.csv',
+                parquet_filename='yandex_hotels.parquet', db_path=None):
+    """
+    Сохраняет отели во все выбранные выгрузки за один проход по hotels.
+    hotels может быть генератором: архив разбирается один раз, и каждый отель
+    сразу уходит в CSV, Parquet и SQLite (снимок за сегодня, upsert по permalink).
+    """
     try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            for hotel in hotels:
-                writer.writerow(hotel)
-
-        print(f"Данные сохранены в файл {filename}")
-        print(f"Всего записей: {len(hotels)}")
+        with ExitStack() as stack:
+            sinks = []
+            if storage in ('csv', 'both'):
+                csvfile = stack.enter_context(open(csv_filename, 'w', newline='', encoding='utf-8'))
+                csv_writer = csv.DictWriter(csvfile, fieldnames=FIELDNAMES)
+                csv_writer.writeheader()
+                sinks.append(csv_writer.writerow)
+            if parquet:
+                parquet_writer = stack.enter_context(ParquetWriter(parquet_filename, 'yandex', FIELDNAMES))
+                sinks.append(parquet_writer.write_row)
+
+            # SQLite пишет весь поток одной транзакцией, остальные выгрузки получают отели по пути
+            hotels = fan_out(hotels, sinks)
+            if storage in ('sqlite', 'both'):
+                store = stack.enter_context(SnapshotStore(db_path))
+                count = store.upsert('yandex', hotels)
+            else:
+                count = sum(1 for _ in hotels)
 
     except Exception as e:
-        print(f"Ошибка при сохранении CSV файла: {e}")
+        print(f"Ошибка при сохранении данных: {e}")
+        return
 
-def main():
-    """Основная функция"""
+    if not count:
+        print("Нет данных для сохранения")
+        return
+    if storage in ('csv', 'both'):
+        print(f"Данные сохранены в файл {csv_filename}")
+    if parquet:
+        print(f"Данные сохранены в файл {parquet_filename}")
+    if storage in ('sqlite', 'both'):
+        print(f"Данные сохранены в базу {store.db_path}")
+    print(f"Всего записей: {count}")
+
+def main(storage='csv', parquet=False, run_id=None, tiles=False):
+    """
+    Основная функция.
+    storage: 'csv', 'sqlite' или 'both'
+    parquet: дополнительно выгрузить типизированный yandex_hotels.parquet
+    run_id: прогон, архив которого конвертировать (по умолчанию - последний)
+    tiles: конвертировать архив обхода тайлами (yandex_tiles_<дата>)
+    """
     print("Начинаем парсинг JSON файлов...")
 
-    # Парсим все JSON файлы
-    hotels = parse_json_files()
-
-    # Сохраняем в CSV
-    save_to_csv(hotels)
+    # Отели читаются потоково и за один проход попадают во все выгрузки, не копясь в памяти
+    save_hotels(iter_json_files(run_id, tiles), storage, parquet)
 
     print("Парсинг завершен!")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(tiles='--tiles' in sys.argv)